@@ -451,91 +451,5374 @@ print_hash_table(ht)
 nb.cells.append(new_code_cell(data_code_test2))
 
 
+s2_2 = r"""
+## Section 2-2: Load Factor and Incremental Resizing
+
+### Problem
+
+`HashTable(10)` keeps 10 buckets forever. After inserting 50,000 student records every chain holds about 5,000 nodes, so `insert` walks 5,000 nodes to reach the tail and `search` becomes a linear scan.
+
+### Load Factor
+
+The load factor measures how full the table is:
+
+$$
+\alpha = \frac{n}{m}
+$$
+
+where \( n \) is the number of stored entries and \( m \) is the number of buckets. With separate chaining the expected chain length is \( \alpha \), so keeping \( \alpha \) bounded keeps `insert` and `search` at O(1) on average.
+
+### Solution: Grow and Shrink by Load Factor
+
+1. **Grow**: when \( \alpha \) exceeds `max_load_factor` (default 0.75), double the number of buckets.
+2. **Shrink**: when \( \alpha \) drops below `min_load_factor` (default 0.1) after `delete`, halve the number of buckets (never below the initial size).
+
+### Incremental Rehash
+
+Moving every node into the new bucket array at once makes a single `insert` pause for the whole table. Instead we keep two arrays while resizing:
+
+- `table`: the old buckets, still being drained.
+- `new_table`: the target buckets.
+- `rehash_index`: the next old bucket to move.
+
+Every `insert`, `search` and `delete` first moves `rehash_step` old buckets into `new_table`. New entries go straight into `new_table`. A lookup checks the old bucket (if it has not been moved yet) and then the new one. When `rehash_index` reaches the end, `new_table` becomes `table`.
+
+Because each operation moves only a few buckets, the cost of moving the entries is spread across the following operations, and no single `insert` rehashes the whole table. One O(m) step remains: the `insert` that starts a resize allocates `new_table` with `[None] * new_size`. That is a single C-level fill, not per-entry work, and costs roughly 4 ms per million buckets.
+
+To see this in the example below, measure with the garbage collector disabled and look at p99 as well as the maximum. Otherwise a collection pass lands on an arbitrary insert and dominates the worst case.
+
+### Tuning
+
+- `ht.load_factor`: the current \( \alpha \).
+- `ht.resize_count`: how many resizes have started so far.
+- `ht.size`: the current number of buckets.
+
+**Complexity**:
+- Time: O(1) amortized per operation, O(`rehash_step`) extra work per operation during a resize.
+- Space: O(n + m), and up to 3m buckets while a resize is in progress.
+
+"""
+nb.cells.append(new_markdown_cell(s2_2))
+
+
+data_code_test2_2 = r"""
+import gc
+import time
+import numpy as np
+
+# hash(n) == n for ints strictly between -(2**61 - 1) and 2**61 - 1, except hash(-1) == -2
+INT_HASH_LIMIT = 2**61 - 1
+
+def batch_hash(keys, hashes=None, hash_func=hash):
+    # Hash values of a whole batch as an int64 array; vectorized for pre-hashed and integer keys
+    # and for hash functions that provide hash_many (Section 2-10)
+    if hashes is not None:
+        return np.asarray(hashes, dtype=np.int64)
+    if hash_func is not hash:
+        # NumPy scalars would reach the hash function as np.int64 instead of int
+        if isinstance(keys, np.ndarray):
+            keys = keys.tolist()
+        if hasattr(hash_func, "hash_many"):
+            return np.asarray(hash_func.hash_many(keys), dtype=np.int64)
+        return np.fromiter((hash_func(k) for k in keys), dtype=np.int64, count=len(keys))
+    if isinstance(keys, np.ndarray) and keys.dtype.kind == "i":
+        values = keys.astype(np.int64)
+    elif isinstance(keys, np.ndarray) and keys.dtype.kind == "u":
+        # Check before the cast: uint64 keys >= 2**63 would wrap to negative int64 values
+        values = keys.astype(np.int64) if len(keys) > 0 and keys.max() < INT_HASH_LIMIT else None
+    elif len(keys) > 0 and all(type(k) is int and -INT_HASH_LIMIT < k < INT_HASH_LIMIT for k in keys):
+        values = np.fromiter(keys, dtype=np.int64, count=len(keys))
+    else:
+        values = None
+    if values is not None and len(values) > 0 and values.min() > -INT_HASH_LIMIT \
+            and values.max() < INT_HASH_LIMIT and not (values == -1).any():
+        return values
+    if isinstance(keys, np.ndarray):
+        keys = keys.tolist()
+    return np.fromiter((hash(k) for k in keys), dtype=np.int64, count=len(keys))
+
+def prepare_batch(keys, hashes=None, hash_func=hash):
+    # Returns the keys as a Python list and their hash values as an int64 array
+    if not isinstance(keys, np.ndarray):
+        keys = list(keys)
+    hash_values = batch_hash(keys, hashes, hash_func)
+    if len(hash_values) != len(keys):
+        raise ValueError("hashes must have one entry per key")
+    if isinstance(keys, np.ndarray):
+        keys = keys.tolist()
+    return keys, hash_values
+
+def group_by_bucket(bucket_keys):
+    # Yields (bucket, positions) with positions in their original order inside each bucket
+    if len(bucket_keys) == 0:
+        return
+    order = np.argsort(bucket_keys, kind="stable")
+    sorted_keys = bucket_keys[order]
+    bounds = (np.flatnonzero(np.diff(sorted_keys)) + 1).tolist()
+    starts = [0] + bounds
+    ends = bounds + [len(order)]
+    order = order.tolist()
+    sorted_keys = sorted_keys.tolist()
+    for start, end in zip(starts, ends):
+        yield sorted_keys[start], order[start:end]
+
+class TableStats:
+    # Cumulative counters; a probe is one node compared (chaining) or one slot examined (open addressing)
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.inserts = 0
+        self.updates = 0
+        self.searches = 0
+        self.deletes = 0
+        self.hits = 0
+        self.misses = 0
+        self.hit_probes = 0
+        self.miss_probes = 0
+        self.max_hit_probes = 0
+        self.max_miss_probes = 0
+        self.insert_probes = 0
+        self.collisions = 0
+        self.batch_inserts = 0
+        self.batch_searches = 0
+
+    def record_search(self, probes, hit):
+        self.searches += 1
+        if hit:
+            self.hits += 1
+            self.hit_probes += probes
+            if probes > self.max_hit_probes:
+                self.max_hit_probes = probes
+        else:
+            self.misses += 1
+            self.miss_probes += probes
+            if probes > self.max_miss_probes:
+                self.max_miss_probes = probes
+
+    def record_insert(self, probes, collision, updated=False):
+        # updated: the key was already present and its value was replaced in place
+        self.insert_probes += probes
+        if updated:
+            self.updates += 1
+            return
+        self.inserts += 1
+        if collision:
+            self.collisions += 1
+
+    def counters(self):
+        counters = dict(vars(self))
+        counters["operations"] = self.inserts + self.updates + self.searches + self.deletes
+        counters["probes"] = self.hit_probes + self.miss_probes + self.insert_probes
+        counters["mean_hit_probes"] = self.hit_probes / self.hits if self.hits else 0.0
+        counters["mean_miss_probes"] = self.miss_probes / self.misses if self.misses else 0.0
+        return counters
+
+INSTRUMENTED_METHODS = ("insert", "search", "delete", "insert_many", "search_many")
+
+class Node:
+    def __init__(self, key, value):
+        self.key = key
+        self.value = value
+        self.next = None
+
+class SlotNode:
+    # No per-instance __dict__: three pointers per node instead of a dict
+    __slots__ = ("key", "value", "next")
+
+    def __init__(self, key, value):
+        self.key = key
+        self.value = value
+        self.next = None
+
+class HashTable:
+    def __init__(self, size, max_load_factor=0.75, min_load_factor=0.1, rehash_step=4, lean=False,
+                 track_stats=False, hash_func=hash):
+        self.size = size
+        self.table = [None] * size
+        self.count = 0
+        # Any callable returning a signed 64-bit int; see Section 2-10 for process-stable ones
+        self.hash_func = hash_func
+        # lean=True: SlotNode chains, update-in-place for existing keys, insert at the head
+        self.lean = lean
+        self.initial_size = size
+        self.max_load_factor = max_load_factor
+        self.min_load_factor = min_load_factor
+        self.rehash_step = rehash_step
+        self.resize_count = 0
+        # Incremental rehash state: target buckets and the next old bucket to move
+        self.new_table = None
+        self.new_size = 0
+        self.rehash_index = 0
+        self.stats = None
+        if track_stats:
+            self.enable_stats()
+
+    def hash_function(self, key):
+        return self.hash_func(key) % self.size
+
+    @property
+    def load_factor(self):
+        size = self.new_size if self.new_table is not None else self.size
+        return self.count / size
+
+    def is_rehashing(self):
+        return self.new_table is not None
+
+    def __len__(self):
+        return self.count
+
+    def insert(self, key, value):
+        # Returns (probes, updated): the nodes this insert compared or walked past, and whether
+        # an existing key was updated in place. The stats wrapper records exactly this
+        if self.new_table is not None:
+            self._rehash_some()
+        probes = 0
+        if self.lean:
+            node, probes = self._find_node_counting(key)
+            if node is not None:
+                node.value = value
+                return probes, True
+        # During a resize new entries go straight into the target buckets
+        if self.new_table is not None:
+            table = self.new_table
+            hash_key = self.hash_func(key) % self.new_size
+        else:
+            table = self.table
+            hash_key = self.hash_function(key)
+        if self.lean:
+            new_node = SlotNode(key, value)
+            new_node.next = table[hash_key]
+            table[hash_key] = new_node
+        elif table[hash_key] is None:
+            table[hash_key] = Node(key, value)
+        else:
+            current = table[hash_key]
+            probes = 1
+            while current.next:
+                current = current.next
+                probes += 1
+            current.next = Node(key, value)
+        self.count += 1
+        self._check_load_factor()
+        return probes, False
+
+    def search(self, key):
+        if self.new_table is not None:
+            self._rehash_some()
+        node = self._find_node(key)
+        if node is None:
+            return None
+        return node.value
+
+    def _find_node(self, key):
+        hash_key = self.hash_function(key)
+        # Buckets before rehash_index have already been moved to new_table
+        if self.new_table is None or hash_key >= self.rehash_index:
+            current = self.table[hash_key]
+            while current:
+                if current.key == key:
+                    return current
+                current = current.next
+        if self.new_table is not None:
+            current = self.new_table[self.hash_func(key) % self.new_size]
+            while current:
+                if current.key == key:
+                    return current
+                current = current.next
+        return None
+
+    # Instrumentation: enable_stats() shadows the public methods on this instance only,
+    # so a table without stats runs the plain class methods with no extra work
+
+    def enable_stats(self):
+        self.stats = TableStats()
+        for name in INSTRUMENTED_METHODS:
+            setattr(self, name, getattr(self, "_" + name + "_with_stats"))
+
+    def disable_stats(self):
+        for name in INSTRUMENTED_METHODS:
+            self.__dict__.pop(name, None)
+        self.stats = None
+
+    def _insert_with_stats(self, key, value):
+        probes, updated = type(self).insert(self, key, value)
+        # A new key collided if it had to walk past at least one node
+        self.stats.record_insert(probes, probes > 0, updated)
+        return probes, updated
+
+    def _search_with_stats(self, key):
+        if self.new_table is not None:
+            self._rehash_some()
+        node, probes = self._find_node_counting(key)
+        self.stats.record_search(probes, node is not None)
+        return None if node is None else node.value
+
+    def _delete_with_stats(self, key):
+        self.stats.deletes += 1
+        return type(self).delete(self, key)
+
+    def _insert_many_with_stats(self, keys, values, hashes=None):
+        values = list(values)
+        self.stats.batch_inserts += len(values)
+        type(self).insert_many(self, keys, values, hashes)
+
+    def _search_many_with_stats(self, keys, hashes=None):
+        results = type(self).search_many(self, keys, hashes)
+        self.stats.batch_searches += len(results)
+        return results
+
+    def _find_node_counting(self, key):
+        probes = 0
+        hash_key = self.hash_function(key)
+        if self.new_table is None or hash_key >= self.rehash_index:
+            current = self.table[hash_key]
+            while current:
+                probes += 1
+                if current.key == key:
+                    return current, probes
+                current = current.next
+        if self.new_table is not None:
+            current = self.new_table[self.hash_func(key) % self.new_size]
+            while current:
+                probes += 1
+                if current.key == key:
+                    return current, probes
+                current = current.next
+        return None, probes
+
+    def items(self):
+        tables = [self.table] if self.new_table is None else [self.table[self.rehash_index:], self.new_table]
+        for table in tables:
+            for node in table:
+                while node:
+                    yield node.key, node.value
+                    node = node.next
+
+    def freeze(self, seed=0):
+        # Read-only minimal-perfect-hash copy (Section 2-16); duplicates resolve as search() does
+        return FrozenHashTable({key: self.search(key) for key, _ in self.items()}, seed=seed)
+
+    def table_stats(self):
+        # Chain-length histogram over every bucket (both arrays during a resize) plus the counters
+        histogram = {}
+        tables = [self.table] if self.new_table is None else [self.table[self.rehash_index:], self.new_table]
+        for table in tables:
+            for node in table:
+                length = 0
+                while node:
+                    length += 1
+                    node = node.next
+                histogram[length] = histogram.get(length, 0) + 1
+        return {
+            "entries": self.count,
+            "buckets": sum(histogram.values()),
+            "load_factor": self.load_factor,
+            "chain_length_histogram": dict(sorted(histogram.items())),
+            "max_chain_length": max(histogram) if histogram else 0,
+            "counters": self.stats.counters() if self.stats else None,
+        }
+
+    def delete(self, key):
+        if self.new_table is not None:
+            self._rehash_some()
+        hash_key = self.hash_function(key)
+        removed = False
+        if self.new_table is None or hash_key >= self.rehash_index:
+            removed = self._unlink(self.table, hash_key, key)
+        if not removed and self.new_table is not None:
+            removed = self._unlink(self.new_table, self.hash_func(key) % self.new_size, key)
+        if removed:
+            self.count -= 1
+            self._check_load_factor()
+        return removed
+
+    def _unlink(self, table, hash_key, key):
+        prev = None
+        current = table[hash_key]
+        while current:
+            if current.key == key:
+                if prev is None:
+                    table[hash_key] = current.next
+                else:
+                    prev.next = current.next
+                return True
+            prev = current
+            current = current.next
+        return False
+
+    def insert_many(self, keys, values, hashes=None):
+        # hashes, if given, must be the self.hash_func(key) values of keys
+        keys, hash_values = prepare_batch(keys, hashes, self.hash_func)
+        values = list(values)
+        if len(values) != len(keys):
+            raise ValueError("keys and values must have the same length")
+        if not keys:
+            return
+        # Size the table for the whole batch up front so it is hashed against the final size
+        self._reserve(self.count + len(keys))
+        for hash_key, group in group_by_bucket(hash_values % self.size):
+            if self.lean:
+                existing = {}
+                current = self.table[hash_key]
+                while current:
+                    existing[current.key] = current
+                    current = current.next
+                for pos in group:
+                    node = existing.get(keys[pos])
+                    if node is not None:
+                        node.value = values[pos]
+                        continue
+                    node = SlotNode(keys[pos], values[pos])
+                    node.next = self.table[hash_key]
+                    self.table[hash_key] = node
+                    existing[node.key] = node
+                    self.count += 1
+            else:
+                # One tail walk per bucket instead of one per key
+                tail = self.table[hash_key]
+                while tail and tail.next:
+                    tail = tail.next
+                for pos in group:
+                    node = Node(keys[pos], values[pos])
+                    if tail is None:
+                        self.table[hash_key] = node
+                    else:
+                        tail.next = node
+                    tail = node
+                    self.count += 1
+        self._check_load_factor()
+
+    def search_many(self, keys, hashes=None):
+        keys, hash_values = prepare_batch(keys, hashes, self.hash_func)
+        results = np.empty(len(keys), dtype=object)
+        if not keys:
+            return results
+        if self.new_table is not None:
+            self._rehash_some()
+        old_buckets = hash_values % self.size
+        if self.new_table is None:
+            self._search_buckets(self.table, old_buckets, list(range(len(keys))), keys, results)
+            return results
+        # During a resize look in both arrays, as _find_node does, instead of finishing the resize here
+        not_moved = np.flatnonzero(old_buckets >= self.rehash_index)
+        missing = self._search_buckets(self.table, old_buckets[not_moved], not_moved.tolist(), keys, results)
+        rest = np.union1d(np.flatnonzero(old_buckets < self.rehash_index), np.array(missing, dtype=np.int64))
+        self._search_buckets(self.new_table, hash_values[rest] % self.new_size, rest.tolist(), keys, results)
+        return results
+
+    def _search_buckets(self, table, buckets, positions, keys, results):
+        # Looks up keys[positions[i]] in table[buckets[i]]; returns the positions that were not found
+        missing = []
+        for hash_key, group in group_by_bucket(buckets):
+            if len(group) == 1:
+                pos = positions[group[0]]
+                key = keys[pos]
+                current = table[hash_key]
+                while current and current.key != key:
+                    current = current.next
+                if current:
+                    results[pos] = current.value
+                else:
+                    missing.append(pos)
+                continue
+            # Several lookups in the same bucket share one walk of the chain
+            found = {}
+            current = table[hash_key]
+            while current:
+                found.setdefault(current.key, current.value)
+                current = current.next
+            for i in group:
+                pos = positions[i]
+                if keys[pos] in found:
+                    results[pos] = found[keys[pos]]
+                else:
+                    missing.append(pos)
+        return missing
+
+    def _reserve(self, expected_count):
+        self._finish_rehash()
+        new_size = self.size
+        while expected_count > self.max_load_factor * new_size:
+            new_size *= 2
+        if new_size != self.size:
+            self._start_resize(new_size)
+            self._finish_rehash()
+
+    def _finish_rehash(self):
+        while self.new_table is not None:
+            self._rehash_some()
+
+    def _check_load_factor(self):
+        if self.new_table is not None:
+            return
+        if self.count > self.max_load_factor * self.size:
+            self._start_resize(self.size * 2)
+        elif self.size > self.initial_size and self.count < self.min_load_factor * self.size:
+            self._start_resize(max(self.initial_size, self.size // 2))
+
+    def _start_resize(self, new_size):
+        self.new_table = [None] * new_size
+        self.new_size = new_size
+        self.rehash_index = 0
+        self.resize_count += 1
+
+    def _rehash_some(self):
+        # Move up to rehash_step non-empty buckets, visiting at most 10x as many empty ones
+        moved = 0
+        visits = self.rehash_step * 10
+        while moved < self.rehash_step and visits > 0 and self.rehash_index < self.size:
+            if self.table[self.rehash_index] is not None:
+                self._move_bucket(self.rehash_index)
+                moved += 1
+            self.rehash_index += 1
+            visits -= 1
+        if self.rehash_index >= self.size:
+            self.table = self.new_table
+            self.size = self.new_size
+            self.new_table = None
+            self.new_size = 0
+            self.rehash_index = 0
+
+    def _move_bucket(self, i):
+        # Split the old chain by target bucket, keeping the original node order,
+        # then put each piece in front of the target chain
+        heads = {}
+        tails = {}
+        current = self.table[i]
+        self.table[i] = None
+        while current:
+            next_node = current.next
+            current.next = None
+            j = self.hash_func(current.key) % self.new_size
+            if j in tails:
+                tails[j].next = current
+            else:
+                heads[j] = current
+            tails[j] = current
+            current = next_node
+        for j, head in heads.items():
+            tails[j].next = self.new_table[j]
+            self.new_table[j] = head
+
+
+# Example usage: load 50,000 records into a table that starts with 10 buckets
+ht = HashTable(10)
+latencies = []
+gc.disable()   # otherwise a garbage-collection pass is charged to whichever insert triggers it
+for n in range(50000):
+    start = time.perf_counter()
+    ht.insert(f"Student {n}", f"Math: {n % 100}, English: {(n * 7) % 100}, Science: {(n * 13) % 100}")
+    latencies.append(time.perf_counter() - start)
+gc.enable()
+latencies.sort()
+
+print("Entries:", len(ht))
+print("Buckets:", ht.size)
+print("Load factor:", round(ht.load_factor, 3))
+print("Resize count:", ht.resize_count)
+print("p99 insert (us):", round(latencies[len(latencies) * 99 // 100] * 1e6, 1))
+print("Worst single insert (ms):", round(latencies[-1] * 1000, 3))
+print(ht.search("Student 12345"))  # Output: Math: 45, English: 15, Science: 85
+
+# Shrink back after deleting most of the records
+for n in range(49000):
+    ht.delete(f"Student {n}")
+print("Buckets after delete:", ht.size, "Resize count:", ht.resize_count)
+print(ht.search("Student 49999"))  # Output: Math: 99, English: 93, Science: 87
+
+# Batch and scalar paths agree, including uint64 keys above the int64 range
+ids = HashTable(16)
+ids.insert_many(np.array([2**64 - 5, 7], dtype=np.uint64), ["a", "b"])
+print(ids.search(2**64 - 5), ids.search(7), ids.search_many([2**64 - 5, 7]))  # Output: a b ['a' 'b']
+
+"""
+nb.cells.append(new_code_cell(data_code_test2_2))
+
+
+s2_3 = r"""
+## Section 2-3: Robin Hood Probing and Backward-Shift Deletion
+
+### Problem
+
+`HashTableOpenAddressing` uses linear probing: on a collision it tries `hash_key + 1`, `hash_key + 2`, ... until it finds an empty slot. Occupied slots cluster into long runs (primary clustering), and every key that lands inside a run has to probe to its end. At 85–90% occupancy some lookups probe hundreds of slots. The class also has no `delete`, so removing a key means rebuilding the table.
+
+### Probe Distance
+
+The probe distance of an entry is how far it sits from its home slot:
+
+$$
+d = (\text{slot} - \text{hash\_key}) \bmod m
+$$
+
+### Solution: Robin Hood Insertion
+
+Robin Hood hashing "takes from the rich and gives to the poor". While inserting, we carry an entry with probe distance \( d \). At each occupied slot we compare it with the resident's distance \( d_r \):
+
+- If \( d_r < d \), the resident is "richer": swap them and keep inserting the resident.
+- Otherwise move to the next slot and increment \( d \).
+
+Entries end up sorted by home slot inside each run, and probe distances stay close to each other. The mean stays the same as linear probing, but the variance and the maximum drop sharply.
+
+### Early-Exit Search
+
+Because of this ordering, `search` can stop as soon as its own probe distance exceeds the resident's distance: the key would have been placed before that slot. Misses no longer scan to the end of a run.
+
+### Backward-Shift Deletion
+
+Removing an entry leaves a hole that would cut probe sequences. Instead of a tombstone marker, we shift the following entries back by one slot until we reach an empty slot or an entry already at its home slot (\( d = 0 \)). The table is left exactly as if the deleted key had never been inserted, so probe lengths do not degrade over time.
+
+In `linear` mode, `delete` uses Knuth's Algorithm R: it moves back each following entry whose home slot is not between the hole and its current slot.
+
+### Usage
+
+```python
+ht_open = HashTableOpenAddressing(10, mode="robin_hood")
+```
+
+`mode="linear"` (the default) keeps the original behaviour.
+
+### Inserting a Key That Is Already Present
+
+The two modes differ here:
+
+| Mode | `insert` of an existing key | Effect |
+|------|-----------------------------|--------|
+| `"linear"` | appends another entry, like the original class | `search` returns the **first** (older) value, `delete` removes one copy at a time, `len()` counts both copies |
+| `"robin_hood"` | updates the value in place | one entry per key; `search` returns the newest value |
+
+Robin Hood insertion looks the key up first: the early-exit search makes that lookup cheap, and keeping one entry per key keeps probe distances short. Call `delete` before re-inserting a key if you need the same result in both modes.
+
+**Complexity**:
+- Time: O(1) expected for `insert`, `search` and `delete`, with O(log n) expected maximum probe distance in Robin Hood mode.
+- Space: O(m), no tombstones.
+
+"""
+nb.cells.append(new_markdown_cell(s2_3))
+
+
+data_code_test2_3 = r"""
+import time
+from array import array
+import numpy as np
+
+class HashTableOpenAddressing:
+    def __init__(self, size, mode="linear", compact=False, track_stats=False, hash_func=hash):
+        if mode not in ("linear", "robin_hood"):
+            raise ValueError("mode must be 'linear' or 'robin_hood'")
+        self.size = size
+        self.hash_func = hash_func
+        self.mode = mode
+        self.compact = compact
+        self.count = 0
+        if compact:
+            # Parallel arrays: cached hash, key and value per slot (keys[i] is None marks an empty slot)
+            self.table = None
+            self.hashes = array("q", bytes(8 * size))
+            self.keys = [None] * size
+            self.values = [None] * size
+        else:
+            self.table = [None] * size
+        self.stats = None
+        if track_stats:
+            self.enable_stats()
+
+    def hash_function(self, key):
+        return self.hash_func(key) % self.size
+
+    def probe_distance(self, key, slot):
+        return (slot - self.hash_function(key)) % self.size
+
+    @property
+    def load_factor(self):
+        return self.count / self.size
+
+    def __len__(self):
+        return self.count
+
+    # Slot access shared by both storage layouts
+
+    def is_empty(self, slot):
+        if self.compact:
+            return self.keys[slot] is None
+        return self.table[slot] is None
+
+    def slot_distance(self, slot):
+        # Compact mode reads the cached hash instead of hashing the resident key again
+        if self.compact:
+            return (slot - self.hashes[slot] % self.size) % self.size
+        return self.probe_distance(self.table[slot][0], slot)
+
+    def slot_home(self, slot):
+        if self.compact:
+            return self.hashes[slot] % self.size
+        return self.hash_function(self.table[slot][0])
+
+    def _matches(self, slot, key, hash_value):
+        # Compact mode compares the cached hash before calling the key's __eq__
+        if self.compact:
+            return self.hashes[slot] == hash_value and self.keys[slot] == key
+        return self.table[slot][0] == key
+
+    def _get_entry(self, slot):
+        if self.compact:
+            return (self.keys[slot], self.values[slot], self.hashes[slot])
+        key, value = self.table[slot]
+        return (key, value, 0)
+
+    def _set_entry(self, slot, entry):
+        if self.compact:
+            self.keys[slot], self.values[slot], self.hashes[slot] = entry
+        else:
+            self.table[slot] = (entry[0], entry[1])
+
+    def _clear_slot(self, slot):
+        if self.compact:
+            self.keys[slot] = None
+            self.values[slot] = None
+            self.hashes[slot] = 0
+        else:
+            self.table[slot] = None
+
+    def _move_slot(self, dst, src):
+        if self.compact:
+            self.keys[dst] = self.keys[src]
+            self.values[dst] = self.values[src]
+            self.hashes[dst] = self.hashes[src]
+        else:
+            self.table[dst] = self.table[src]
+        self._clear_slot(src)
+
+    # Public operations
+
+    def insert(self, key, value):
+        # Returns (probes, updated) as HashTable.insert does; a probe is one slot examined
+        return self._insert_hashed(key, value, self.hash_func(key))
+
+    def _insert_hashed(self, key, value, hash_value):
+        if self.mode == "robin_hood":
+            return self._insert_robin_hood(key, value, hash_value)
+        hash_key = hash_value % self.size
+        original_hash_key = hash_key
+        probes = 1
+        while not self.is_empty(hash_key):
+            hash_key = (hash_key + 1) % self.size
+            probes += 1
+            if hash_key == original_hash_key:
+                raise Exception("Hash table is full")
+        self._set_entry(hash_key, (key, value, hash_value))
+        self.count += 1
+        return probes, False
+
+    def _insert_robin_hood(self, key, value, hash_value):
+        slot, probes = self._find_slot_counting(key, hash_value)
+        if slot != -1:
+            self._set_entry(slot, (key, value, hash_value))
+            return probes, True
+        if self.count == self.size:
+            raise Exception("Hash table is full")
+        # The placement walk below starts at the home slot again and covers the slots the
+        # lookup examined, so only its own slots are counted
+        hash_key = hash_value % self.size
+        entry = (key, value, hash_value)
+        distance = 0
+        probes = 1
+        while True:
+            if self.is_empty(hash_key):
+                self._set_entry(hash_key, entry)
+                self.count += 1
+                return probes, False
+            resident_distance = self.slot_distance(hash_key)
+            if resident_distance < distance:
+                # Take the slot from the richer resident and keep inserting it
+                resident = self._get_entry(hash_key)
+                self._set_entry(hash_key, entry)
+                entry = resident
+                distance = resident_distance
+            hash_key = (hash_key + 1) % self.size
+            distance += 1
+            probes += 1
+
+    def _find_slot(self, key, hash_value=None):
+        if hash_value is None:
+            hash_value = self.hash_func(key)
+        hash_key = hash_value % self.size
+        if self.mode == "robin_hood":
+            distance = 0
+            while distance < self.size:
+                if self.is_empty(hash_key) or distance > self.slot_distance(hash_key):
+                    return -1
+                if self._matches(hash_key, key, hash_value):
+                    return hash_key
+                hash_key = (hash_key + 1) % self.size
+                distance += 1
+            return -1
+        original_hash_key = hash_key
+        while not self.is_empty(hash_key):
+            if self._matches(hash_key, key, hash_value):
+                return hash_key
+            hash_key = (hash_key + 1) % self.size
+            if hash_key == original_hash_key:
+                return -1
+        return -1
+
+    def search(self, key):
+        slot = self._find_slot(key)
+        if slot == -1:
+            return None
+        return self._value_at(slot)
+
+    # Instrumentation, installed per instance as in HashTable
+
+    def enable_stats(self):
+        self.stats = TableStats()
+        for name in INSTRUMENTED_METHODS:
+            setattr(self, name, getattr(self, "_" + name + "_with_stats"))
+
+    def disable_stats(self):
+        for name in INSTRUMENTED_METHODS:
+            self.__dict__.pop(name, None)
+        self.stats = None
+
+    def _insert_with_stats(self, key, value):
+        probes, updated = type(self).insert(self, key, value)
+        # A new key collided if its home slot was occupied
+        self.stats.record_insert(probes, probes > 1, updated)
+        return probes, updated
+
+    def _search_with_stats(self, key):
+        slot, probes = self._find_slot_counting(key, self.hash_func(key))
+        self.stats.record_search(probes, slot != -1)
+        return None if slot == -1 else self._value_at(slot)
+
+    def _delete_with_stats(self, key):
+        self.stats.deletes += 1
+        return type(self).delete(self, key)
+
+    def _insert_many_with_stats(self, keys, values, hashes=None):
+        values = list(values)
+        self.stats.batch_inserts += len(values)
+        type(self).insert_many(self, keys, values, hashes)
+
+    def _search_many_with_stats(self, keys, hashes=None):
+        results = type(self).search_many(self, keys, hashes)
+        self.stats.batch_searches += len(results)
+        return results
+
+    def _find_slot_counting(self, key, hash_value):
+        hash_key = hash_value % self.size
+        probes = 0
+        if self.mode == "robin_hood":
+            distance = 0
+            while distance < self.size:
+                probes += 1
+                if self.is_empty(hash_key) or distance > self.slot_distance(hash_key):
+                    return -1, probes
+                if self._matches(hash_key, key, hash_value):
+                    return hash_key, probes
+                hash_key = (hash_key + 1) % self.size
+                distance += 1
+            return -1, probes
+        original_hash_key = hash_key
+        while True:
+            probes += 1
+            if self.is_empty(hash_key):
+                return -1, probes
+            if self._matches(hash_key, key, hash_value):
+                return hash_key, probes
+            hash_key = (hash_key + 1) % self.size
+            if hash_key == original_hash_key:
+                return -1, probes
+
+    def table_stats(self):
+        # Probe-distance histogram over the occupied slots plus the counters
+        histogram = {}
+        for slot in range(self.size):
+            if not self.is_empty(slot):
+                distance = self.slot_distance(slot)
+                histogram[distance] = histogram.get(distance, 0) + 1
+        return {
+            "entries": self.count,
+            "slots": self.size,
+            "load_factor": self.load_factor,
+            "probe_distance_histogram": dict(sorted(histogram.items())),
+            "max_probe_distance": max(histogram) if histogram else 0,
+            "mean_probe_distance": sum(d * n for d, n in histogram.items()) / self.count if self.count else 0.0,
+            "counters": self.stats.counters() if self.stats else None,
+        }
+
+    def _value_at(self, slot):
+        if self.compact:
+            return self.values[slot]
+        return self.table[slot][1]
+
+    def items(self):
+        for slot in range(self.size):
+            if not self.is_empty(slot):
+                key, value, _ = self._get_entry(slot)
+                yield key, value
+
+    def freeze(self, seed=0):
+        # Read-only minimal-perfect-hash copy (Section 2-16); duplicates resolve as search() does
+        return FrozenHashTable({key: self.search(key) for key, _ in self.items()}, seed=seed)
+
+    def insert_many(self, keys, values, hashes=None):
+        # hashes, if given, must be the self.hash_func(key) values of keys
+        keys, hash_values = prepare_batch(keys, hashes, self.hash_func)
+        values = list(values)
+        if len(values) != len(keys):
+            raise ValueError("keys and values must have the same length")
+        hash_list = hash_values.tolist()
+        # Insert in home-slot order so consecutive probes touch neighbouring slots
+        for _, group in group_by_bucket(hash_values % self.size):
+            for pos in group:
+                self._insert_hashed(keys[pos], values[pos], hash_list[pos])
+
+    def search_many(self, keys, hashes=None):
+        keys, hash_values = prepare_batch(keys, hashes, self.hash_func)
+        results = np.empty(len(keys), dtype=object)
+        hash_list = hash_values.tolist()
+        for _, group in group_by_bucket(hash_values % self.size):
+            for pos in group:
+                slot = self._find_slot(keys[pos], hash_list[pos])
+                if slot != -1:
+                    results[pos] = self._value_at(slot)
+        return results
+
+    def delete(self, key):
+        slot = self._find_slot(key)
+        if slot == -1:
+            return False
+        if self.mode == "robin_hood":
+            self._backward_shift(slot)
+        else:
+            self._delete_linear(slot)
+        self.count -= 1
+        return True
+
+    def _backward_shift(self, slot):
+        self._clear_slot(slot)
+        next_slot = (slot + 1) % self.size
+        while not self.is_empty(next_slot) and self.slot_distance(next_slot) > 0:
+            self._move_slot(slot, next_slot)
+            slot = next_slot
+            next_slot = (next_slot + 1) % self.size
+
+    def _delete_linear(self, hole):
+        # Knuth's Algorithm R: refill the hole with any later entry of the run
+        # whose home slot is not cyclically inside (hole, j]
+        self._clear_slot(hole)
+        j = hole
+        while True:
+            j = (j + 1) % self.size
+            if self.is_empty(j):
+                break
+            home = self.slot_home(j)
+            if hole <= j:
+                stays = hole < home <= j
+            else:
+                stays = home > hole or home <= j
+            if not stays:
+                self._move_slot(hole, j)
+                hole = j
+
+
+def probe_distance_summary(ht):
+    distances = [ht.slot_distance(i) for i in range(ht.size) if not ht.is_empty(i)]
+    mean = sum(distances) / len(distances)
+    variance = sum((d - mean) ** 2 for d in distances) / len(distances)
+    return {"mean": round(mean, 2), "variance": round(variance, 2), "max": max(distances)}
+
+
+# Example usage
+ht_open = HashTableOpenAddressing(10, mode="robin_hood")
+ht_open.insert("Alice Johnson", "Math: 85, English: 92, Science: 78")
+ht_open.insert("Bob Smith", "Math: 88, English: 75, Science: 90")
+print(ht_open.search("Alice Johnson"))  # Output: Math: 85, English: 92, Science: 78
+print(ht_open.delete("Alice Johnson"))  # Output: True
+print(ht_open.search("Alice Johnson"))  # Output: None
+print(ht_open.search("Bob Smith"))      # Output: Math: 88, English: 75, Science: 90
+
+# Compare both modes at 90% occupancy
+for mode in ("linear", "robin_hood"):
+    table = HashTableOpenAddressing(20000, mode=mode)
+    for n in range(18000):
+        table.insert(f"Student {n}", n)
+    start = time.perf_counter()
+    for n in range(18000, 28000):
+        table.search(f"Student {n}")
+    miss_time = time.perf_counter() - start
+    print(mode, probe_distance_summary(table), "10k misses (ms):", round(miss_time * 1000, 1))
+
+"""
+nb.cells.append(new_code_cell(data_code_test2_3))
+
+
+s2_4 = r"""
+## Section 2-4: Compact Storage Mode for Open Addressing
+
+### Problem
+
+Every occupied slot of `HashTableOpenAddressing.table` holds a freshly allocated `(key, value)` tuple: 56 bytes for the tuple object plus the 8-byte list pointer. The table never stores the hash, so each probe compares keys with `__eq__`, and a long key such as "Alice Johnson" is compared character by character against every resident it passes.
+
+### Solution: Parallel Arrays
+
+With `compact=True` the table keeps three parallel arrays instead of a list of tuples:
+
+| Array | Type | Content |
+|-------|------|---------|
+| `hashes` | `array("q")` | the full 64-bit `hash(key)`, stored inline |
+| `keys` | `list` | the key object (`None` marks an empty slot) |
+| `values` | `list` | the value object |
+
+A slot costs 8 + 8 + 8 = 24 bytes and no per-entry allocation.
+
+### Cached-Hash Probing
+
+While probing, the cached hash is compared first:
+
+```python
+self.hashes[slot] == hash_value and self.keys[slot] == key
+```
+
+Two different keys almost never share the full 64-bit hash, so `__eq__` runs about once per successful lookup instead of once per probed slot. Robin Hood mode also reads the home slot of a resident from `hashes` (`hashes[slot] % size`) instead of hashing its key again.
+
+### Usage
+
+```python
+ht_open = HashTableOpenAddressing(10, mode="robin_hood", compact=True)
+```
+
+Both `linear` and `robin_hood` modes work with either layout. `print_hash_table_open` reads `ht.table`, so it only works on the default layout.
+
+**Complexity**:
+- Time: unchanged, O(1) expected; fewer key comparisons per probe.
+- Space: 24 bytes per slot instead of 8 bytes per slot plus 56 bytes per entry.
+
+"""
+nb.cells.append(new_markdown_cell(s2_4))
+
+
+data_code_test2_4 = r"""
+import time
+import tracemalloc
+
+def bytes_per_entry(compact, keys, values):
+    tracemalloc.start()
+    table = HashTableOpenAddressing(len(keys) * 10 // 9, mode="robin_hood", compact=compact)
+    for key, value in zip(keys, values):
+        table.insert(key, value)
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return table, used / len(keys)
+
+# Long string keys sharing a common prefix make __eq__ expensive
+keys = [f"Alice Johnson of the Silicon Valley Camp, student number {n:06d}" for n in range(50000)]
+values = [f"Math: {n % 100}, English: {(n * 7) % 100}, Science: {(n * 13) % 100}" for n in range(50000)]
+
+for compact in (False, True):
+    table, per_entry = bytes_per_entry(compact, keys, values)
+    # Lookup keys are equal to, but not the same objects as, the stored keys
+    lookups = [f"Alice Johnson of the Silicon Valley Camp, student number {n:06d}" for n in range(0, 100000, 2)]
+    start = time.perf_counter()
+    hits = sum(1 for key in lookups if table.search(key) is not None)
+    elapsed = time.perf_counter() - start
+    print(f"compact={compact}: {per_entry:.1f} bytes/entry, {hits} hits, 50k lookups (ms): {elapsed * 1000:.1f}")
+
+ht_open = HashTableOpenAddressing(10, mode="robin_hood", compact=True)
+ht_open.insert("Alice Johnson", "Math: 85, English: 92, Science: 78")
+ht_open.insert("Bob Smith", "Math: 88, English: 75, Science: 90")
+print(ht_open.search("Alice Johnson"))  # Output: Math: 85, English: 92, Science: 78
+print(ht_open.hashes[ht_open._find_slot("Bob Smith")] == hash("Bob Smith"))  # Output: True
+
+"""
+nb.cells.append(new_code_cell(data_code_test2_4))
+
+
+s2_5 = r"""
+## Section 2-5: Memory-Lean Chaining with `__slots__` Nodes and Upsert
+
+### Problem
+
+1. `Node` is a regular class, so every node carries its own `__dict__` on top of the object header. Three attributes cost far more memory than three pointers.
+2. `HashTable.insert` always allocates a new `Node` and appends it at the tail of the chain, even if the key is already there. Re-inserting "Alice Johnson" with new grades leaves the old node in front; `search` keeps returning the old grades, and the duplicate nodes are never freed.
+3. Appending at the tail walks the whole chain on every insert.
+
+### Solution: `lean=True`
+
+```python
+ht = HashTable(10, lean=True)
+```
+
+- **`SlotNode`**: declares `__slots__ = ("key", "value", "next")`. Attributes are stored in fixed slots inside the object, and there is no per-instance `__dict__`.
+- **Update in place (upsert)**: `insert` first looks for the key. If it exists, only `node.value` is replaced and no node is allocated.
+- **Insert at the head**: a new key becomes the first node of its chain, so no tail walk is needed. The key is not in the chain yet (the upsert check just proved it), so the order of the chain does not matter.
+
+`count` now equals the number of distinct keys, so the load factor from Section 2-2 is exact. `print_hash_table` and the incremental rehash work unchanged, because `SlotNode` has the same `key`, `value` and `next` fields as `Node`.
+
+**Complexity**:
+- Time: O(1) expected per `insert`; an insert walks the chain once (the upsert lookup) and never twice.
+- Space: one `SlotNode` per distinct key, without a `__dict__`.
+
+"""
+nb.cells.append(new_markdown_cell(s2_5))
+
+
+data_code_test2_5 = r"""
+import time
+import tracemalloc
+
+def load_grades(lean, rounds, students):
+    tracemalloc.start()
+    start = time.perf_counter()
+    table = HashTable(1024, lean=lean)
+    # Each round re-inserts every student with new grades
+    for r in range(rounds):
+        for n in range(students):
+            table.insert(f"Student {n}", r)
+    elapsed = time.perf_counter() - start
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return table, elapsed, used
+
+for lean in (False, True):
+    table, elapsed, used = load_grades(lean, rounds=3, students=20000)
+    print(f"lean={lean}: nodes={len(table)}, memory (KB)={used // 1024}, time (ms)={elapsed * 1000:.1f}, "
+          f"Student 7 -> {table.search('Student 7')}")
+# Output: the default table keeps 60000 nodes and returns the first round (0);
+# the lean table keeps 20000 nodes and returns the latest round (2)
+
+ht = HashTable(10, lean=True)
+ht.insert("Alice Johnson", "Math: 85, English: 92, Science: 78")
+ht.insert("Bob Smith", "Math: 88, English: 75, Science: 90")
+ht.insert("Alice Johnson", "Math: 95, English: 92, Science: 88")
+print(ht.search("Alice Johnson"))  # Output: Math: 95, English: 92, Science: 88
+print(len(ht))                     # Output: 2
+
+"""
+nb.cells.append(new_code_cell(data_code_test2_5))
+
+
+s2_6 = r"""
+## Section 2-6: Batched `insert_many` and `search_many`
+
+### Problem
+
+Loading a roster calls `insert` once per record. Each call computes `hash(key) % self.size` on its own, may trigger a resize step, and (in the default chaining mode) walks the chain to its tail again, even when the previous record went to the same bucket.
+
+### Solution: Batch API
+
+Both `HashTable` and `HashTableOpenAddressing` provide:
+
+```python
+ht.insert_many(keys, values, hashes=None)
+results = ht.search_many(keys, hashes=None)   # NumPy object array, None for misses
+```
+
+1. **Hash the whole batch at once** (`batch_hash`):
+   - Pre-hashed keys: pass `hashes` (the `hash(key)` values, e.g. stored alongside the data) and they are used as one `int64` array.
+   - Integer keys: Python defines `hash(n) == n` for \( |n| < 2^{61} - 1 \) (except `hash(-1) == -2`), so a NumPy integer array is used directly as its own hash values.
+   - Other keys: `hash()` is called once per key and collected into an `int64` array.
+2. **Compute all bucket indexes in one vectorized step**: `hash_values % self.size`.
+3. **Group the work by bucket** (`group_by_bucket`): a stable `argsort` orders the batch by bucket, and keys in the same bucket keep their original order.
+   - Chaining, default mode: one tail walk per bucket appends every node of the group.
+   - Chaining, `lean=True`: one chain walk per bucket builds a key → node map used for the upserts of the whole group.
+   - Open addressing: inserts and lookups run in home-slot order, so neighbouring probes touch neighbouring slots.
+4. **Resize once**: `HashTable.insert_many` grows the table to fit the whole batch before hashing it, instead of resizing incrementally in the middle of the load. `search_many` never finishes a resize: during one it looks in the old and the new bucket array, like `search`, so a read-only batch costs the same as its lookups.
+
+`search_many` returns results in the same order as the input keys.
+
+**Complexity**:
+- Time: O(n log n) for the sort, then O(1) expected per key; the per-key Python overhead shrinks to the chain or probe work itself.
+- Space: O(n) for the hash, index and result arrays.
+
+"""
+nb.cells.append(new_markdown_cell(s2_6))
+
+
+data_code_test2_6 = r"""
+import time
+import numpy as np
+
+students = [f"Student {n}" for n in range(100000)]
+grades = [f"Math: {n % 100}, English: {(n * 7) % 100}, Science: {(n * 13) % 100}" for n in range(100000)]
+
+start = time.perf_counter()
+ht = HashTable(10)
+for key, value in zip(students, grades):
+    ht.insert(key, value)
+print("insert loop (ms):", round((time.perf_counter() - start) * 1000, 1))
+
+start = time.perf_counter()
+ht_batch = HashTable(10)
+ht_batch.insert_many(students, grades)
+print("insert_many (ms):", round((time.perf_counter() - start) * 1000, 1))
+
+start = time.perf_counter()
+results = ht_batch.search_many(students[:5] + ["Nobody"])
+print("search_many (ms):", round((time.perf_counter() - start) * 1000, 3))
+print(results[0])   # Output: Math: 0, English: 0, Science: 0
+print(results[-1])  # Output: None
+
+# Integer keys are hashed by NumPy in one vectorized step
+student_ids = np.arange(1000000, 1100000)
+ht_ids = HashTableOpenAddressing(200000, mode="robin_hood", compact=True)
+start = time.perf_counter()
+ht_ids.insert_many(student_ids, grades)
+print("open addressing insert_many with int keys (ms):", round((time.perf_counter() - start) * 1000, 1))
+print(ht_ids.search_many(np.array([1000001, 999999])))  # Output: ['Math: 1, English: 7, Science: 13' None]
+
+"""
+nb.cells.append(new_code_cell(data_code_test2_6))
+
+
+s2_7 = r"""
+## Section 2-7: Memory-Mapped On-Disk Format with Instant Open
+
+### Problem
+
+Every worker process rebuilds its table with thousands of `insert` calls at start-up. The work is identical in every process, and each process keeps its own private copy of the same data.
+
+### Solution: A Fixed-Layout Binary File Opened with `mmap`
+
+`save_hash_table(ht, path)` writes any table that provides `items()` (for example `HashTableOpenAddressing`) into one file. `MappedHashTable(path)` maps the file read-only with `mmap` and answers `search` directly from the mapped bytes. Opening costs one `mmap` call and a 64-byte header read, whatever the table size. Every process that maps the same file shares one copy in the operating system's page cache.
+
+### File Layout (little-endian)
+
+```
++----------------------+  offset 0
+| Header (64 bytes)    |  magic "SVHT0001", version, hash id, slot count,
+|                      |  entry count, heap offset, heap size, seed
++----------------------+  offset 64
+| Slot array           |  slot_count x 24 bytes:
+|                      |  hash (u64) | heap offset (u64) | key length (u32) | value length (u32)
++----------------------+  heap offset
+| Key/value heap       |  key bytes followed by value bytes for each entry
++----------------------+
+```
+
+- **Stable hash**: Python's `hash()` changes on every run (PYTHONHASHSEED), so the file uses an 8-byte BLAKE2b digest of the encoded key. The header records the hash id, so a reader can reject a file it cannot probe.
+- **Encoded fields**: a 1-byte type tag (`str`, `bytes`, `int`, or pickled object) followed by the payload, so `"1"` and `1` stay different keys.
+- **Robin Hood layout**: the writer places slots with Robin Hood insertion at `load_factor` 0.8. The reader gets each resident's home slot from the stored hash, so a miss stops as soon as its probe distance exceeds the resident's.
+- **Empty slot**: key length 0 (an encoded key always has at least its tag byte).
+- **Atomic replace**: the writer writes `path + ".tmp"` and renames it, so workers never map a half-written file.
+
+**Complexity**:
+- Open: O(1).
+- Search: O(1) expected, one stable hash plus a few 24-byte slot reads.
+- Space on disk: 24 bytes per slot plus the encoded keys and values.
+
+"""
+nb.cells.append(new_markdown_cell(s2_7))
+
+
+data_code_test2_7 = r"""
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import time
+
+MAGIC = b"SVHT0001"
+FORMAT_VERSION = 1
+HASH_BLAKE2B_64 = 1
+HEADER = struct.Struct("<8sIIQQQQQ")   # padded to HEADER_SIZE bytes
+HEADER_SIZE = 64
+SLOT = struct.Struct("<QQII")         # hash, heap offset, key length, value length
+
+TAG_STR, TAG_BYTES, TAG_INT, TAG_PICKLE = 0, 1, 2, 3
+
+def encode_field(obj):
+    if type(obj) is str:
+        return bytes([TAG_STR]) + obj.encode("utf-8")
+    if type(obj) is bytes:
+        return bytes([TAG_BYTES]) + obj
+    if type(obj) is int:
+        return bytes([TAG_INT]) + str(obj).encode("ascii")
+    return bytes([TAG_PICKLE]) + pickle.dumps(obj)
+
+def decode_field(data):
+    tag = data[0]
+    payload = bytes(data[1:])
+    if tag == TAG_STR:
+        return payload.decode("utf-8")
+    if tag == TAG_BYTES:
+        return payload
+    if tag == TAG_INT:
+        return int(payload)
+    return pickle.loads(payload)
+
+def stable_hash(data, seed=0):
+    # Same value in every process, unlike hash()
+    key = seed.to_bytes(8, "little") if seed else b""
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8, key=key).digest(), "little")
+
+def save_hash_table(ht, path, load_factor=0.8, seed=0):
+    records = [(encode_field(key), encode_field(value)) for key, value in ht.items()]
+    slot_count = max(1, int(len(records) / load_factor) + 1)
+    slots = [None] * slot_count
+    heap = bytearray()
+    for key_bytes, value_bytes in records:
+        entry = (stable_hash(key_bytes, seed), len(heap), len(key_bytes), len(value_bytes))
+        heap += key_bytes
+        heap += value_bytes
+        # Robin Hood placement by probe distance, as in Section 2-3
+        slot = entry[0] % slot_count
+        distance = 0
+        while slots[slot] is not None:
+            resident_distance = (slot - slots[slot][0] % slot_count) % slot_count
+            if resident_distance < distance:
+                slots[slot], entry = entry, slots[slot]
+                distance = resident_distance
+            slot = (slot + 1) % slot_count
+            distance += 1
+        slots[slot] = entry
+    slot_bytes = bytearray(slot_count * SLOT.size)
+    for i, entry in enumerate(slots):
+        if entry is not None:
+            SLOT.pack_into(slot_bytes, i * SLOT.size, *entry)
+    heap_offset = HEADER_SIZE + len(slot_bytes)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, HASH_BLAKE2B_64, slot_count, len(records),
+                         heap_offset, len(heap), seed)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        f.write(slot_bytes)
+        f.write(heap)
+    os.replace(tmp_path, path)
+
+class MappedHashTable:
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.data = None
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            if len(self.data) < HEADER_SIZE:
+                raise ValueError("not a hash table file: " + path)
+            magic, version, hash_id, slot_count, count, heap_offset, heap_size, seed = HEADER.unpack_from(self.data, 0)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise ValueError("not a hash table file: " + path)
+            if hash_id != HASH_BLAKE2B_64:
+                raise ValueError("unsupported hash function id %d" % hash_id)
+        except BaseException:
+            # Nobody holds this object yet, so close() could never be called on it
+            if self.data is not None:
+                self.data.close()
+            self.file.close()
+            raise
+        self.size = slot_count
+        self.count = count
+        self.heap_offset = heap_offset
+        self.seed = seed
+
+    def __len__(self):
+        return self.count
+
+    def search(self, key):
+        key_bytes = encode_field(key)
+        hash_value = stable_hash(key_bytes, self.seed)
+        size = self.size
+        data = self.data
+        slot = hash_value % size
+        distance = 0
+        while distance < size:
+            resident_hash, offset, key_len, value_len = SLOT.unpack_from(data, HEADER_SIZE + slot * SLOT.size)
+            if key_len == 0 or distance > (slot - resident_hash % size) % size:
+                return None
+            if resident_hash == hash_value and key_len == len(key_bytes):
+                start = self.heap_offset + offset
+                if data[start:start + key_len] == key_bytes:
+                    value_start = start + key_len
+                    return decode_field(data[value_start:value_start + value_len])
+            slot = (slot + 1) % size
+            distance += 1
+        return None
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Example usage: build once, then every worker maps the same file
+students = [f"Student {n}" for n in range(100000)]
+grades = [f"Math: {n % 100}, English: {(n * 7) % 100}, Science: {(n * 13) % 100}" for n in range(100000)]
+
+start = time.perf_counter()
+ht_open = HashTableOpenAddressing(125000, mode="robin_hood", compact=True)
+ht_open.insert_many(students, grades)
+print("rebuild from scratch (ms):", round((time.perf_counter() - start) * 1000, 1))
+
+save_hash_table(ht_open, "student_grades.svht")
+print("file size (KB):", os.path.getsize("student_grades.svht") // 1024)
+
+start = time.perf_counter()
+with MappedHashTable("student_grades.svht") as mapped:
+    print("open (ms):", round((time.perf_counter() - start) * 1000, 3))
+    print(len(mapped))                      # Output: 100000
+    print(mapped.search("Student 12345"))   # Output: Math: 45, English: 15, Science: 85
+    print(mapped.search("Nobody"))          # Output: None
+os.remove("student_grades.svht")
+
+"""
+nb.cells.append(new_code_cell(data_code_test2_7))
+
+
+s2_8 = r"""
+## Section 2-8: Thread-Safe Hash Table with Lock Striping
+
+### Problem
+
+Neither `HashTable` nor `HashTableOpenAddressing` is safe to share between threads. In `HashTable.insert`, two threads can walk to the same tail node and both run `current.next = new_node`: one node is lost. Guarding every call with one global lock is correct, but then every reader waits for every writer and throughput stops growing with the number of threads.
+
+### Solution: `ConcurrentHashTable`
+
+1. **Lock striping**: the buckets are split into `stripes` contiguous ranges, and each range has its own lock. Bucket `i` of `m` belongs to stripe `i * stripes // m`. Writers to different ranges never wait for each other.
+2. **Immutable chain snapshots**: a bucket holds a tuple of `(key, value)` pairs instead of a linked list. A writer never modifies a tuple: under the stripe lock it builds a new tuple and stores it into the bucket with one list assignment.
+3. **Lock-free reads**: `search` reads the bucket array reference, then one bucket tuple, and scans it without taking any lock. A reader always sees either the old tuple or the new one, never a half-updated chain.
+4. **Resizing**: when the load factor passes `max_load_factor`, the resizing thread takes all stripe locks in order, builds a new bucket array and publishes it with one attribute assignment. A writer that took its stripe lock on the old array notices that the array changed and retries.
+
+`insert` updates an existing key in place (upsert), like `lean=True` in Section 2-5.
+
+### Benchmark
+
+`benchmark_read_heavy` runs 95% `search` / 5% `insert` from 1, 2, 4 and 8 threads and reports total operations per second for `ConcurrentHashTable` and for `HashTable` behind one global lock (`GlobalLockHashTable`).
+
+On a standard CPython build the GIL still runs one thread's Python bytecode at a time, so neither table can go faster than one core. The benchmark shows how much each design loses to lock contention as threads are added. On a free-threaded build (`python3.13t`) the lock-free read path is what lets read throughput grow with the thread count.
+
+**Complexity**:
+- `search`: O(1) expected, no locks.
+- `insert` / `delete`: O(1) expected plus a copy of one short bucket tuple, under one stripe lock.
+- Resize: O(n) under all stripe locks.
+
+"""
+nb.cells.append(new_markdown_cell(s2_8))
+
+
+data_code_test2_8 = r"""
+import random
+import threading
+import time
+
+class ConcurrentHashTable:
+    def __init__(self, size, stripes=16, max_load_factor=0.75):
+        self.size = size
+        self.table = [()] * size
+        self.stripes = stripes
+        self.locks = [threading.Lock() for _ in range(stripes)]
+        self.counts = [0] * stripes
+        self.max_load_factor = max_load_factor
+        self.resize_count = 0
+
+    def hash_function(self, key):
+        return hash(key) % self.size
+
+    def _stripe(self, hash_key, size):
+        return hash_key * self.stripes // size
+
+    def __len__(self):
+        return sum(self.counts)
+
+    @property
+    def load_factor(self):
+        return len(self) / self.size
+
+    def search(self, key):
+        # Lock-free: one read of the bucket array, one read of an immutable bucket tuple
+        table = self.table
+        for item_key, item_value in table[hash(key) % len(table)]:
+            if item_key == key:
+                return item_value
+        return None
+
+    def insert(self, key, value):
+        while True:
+            table = self.table
+            hash_key = hash(key) % len(table)
+            stripe = self._stripe(hash_key, len(table))
+            with self.locks[stripe]:
+                if table is not self.table:
+                    continue  # resized while we were waiting, retry on the new array
+                bucket = table[hash_key]
+                for i, (item_key, _) in enumerate(bucket):
+                    if item_key == key:
+                        table[hash_key] = bucket[:i] + ((key, value),) + bucket[i + 1:]
+                        return
+                table[hash_key] = bucket + ((key, value),)
+                self.counts[stripe] += 1
+            break
+        if len(self) > self.max_load_factor * self.size:
+            self._resize(self.size * 2)
+
+    def delete(self, key):
+        while True:
+            table = self.table
+            hash_key = hash(key) % len(table)
+            stripe = self._stripe(hash_key, len(table))
+            with self.locks[stripe]:
+                if table is not self.table:
+                    continue
+                bucket = table[hash_key]
+                for i, (item_key, _) in enumerate(bucket):
+                    if item_key == key:
+                        table[hash_key] = bucket[:i] + bucket[i + 1:]
+                        self.counts[stripe] -= 1
+                        return True
+                return False
+
+    def _resize(self, new_size):
+        # Always take the stripe locks in the same order to avoid deadlocks
+        for lock in self.locks:
+            lock.acquire()
+        try:
+            if len(self) <= self.max_load_factor * self.size:
+                return  # another thread already resized
+            new_table = [[] for _ in range(new_size)]
+            for bucket in self.table:
+                for item in bucket:
+                    new_table[hash(item[0]) % new_size].append(item)
+            new_table = [tuple(bucket) for bucket in new_table]
+            counts = [0] * self.stripes
+            for hash_key, bucket in enumerate(new_table):
+                counts[self._stripe(hash_key, new_size)] += len(bucket)
+            self.counts = counts
+            self.size = new_size
+            self.table = new_table
+            self.resize_count += 1
+        finally:
+            for lock in self.locks:
+                lock.release()
+
+class GlobalLockHashTable:
+    # Today's workaround: the lean HashTable behind one lock
+    def __init__(self, size):
+        self.lock = threading.Lock()
+        self.ht = HashTable(size, lean=True)
+
+    def search(self, key):
+        with self.lock:
+            return self.ht.search(key)
+
+    def insert(self, key, value):
+        with self.lock:
+            self.ht.insert(key, value)
+
+def benchmark_read_heavy(make_table, thread_counts=(1, 2, 4, 8), ops_per_thread=50000, read_ratio=0.95, keys=20000):
+    results = {}
+    for threads in thread_counts:
+        table = make_table()
+        for n in range(keys):
+            table.insert(f"Student {n}", n)
+        barrier = threading.Barrier(threads + 1)
+
+        def worker(seed):
+            rng = random.Random(seed)
+            names = [f"Student {rng.randrange(keys)}" for _ in range(1000)]
+            reads = [rng.random() < read_ratio for _ in range(1000)]
+            barrier.wait()
+            for i in range(ops_per_thread):
+                if reads[i % 1000]:
+                    table.search(names[i % 1000])
+                else:
+                    table.insert(names[i % 1000], i)
+
+        workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+        for w in workers:
+            w.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - start
+        results[threads] = threads * ops_per_thread / elapsed
+    return results
+
+
+# Example usage
+cht = ConcurrentHashTable(10)
+cht.insert("Alice Johnson", "Math: 85, English: 92, Science: 78")
+cht.insert("Bob Smith", "Math: 88, English: 75, Science: 90")
+print(cht.search("Bob Smith"))  # Output: Math: 88, English: 75, Science: 90
+
+# Concurrent writers: no lost updates
+writers = [threading.Thread(target=lambda t=t: [cht.insert(f"Student {t}-{n}", n) for n in range(5000)]) for t in range(4)]
+for w in writers:
+    w.start()
+for w in writers:
+    w.join()
+print(len(cht), "resizes:", cht.resize_count)  # Output: 20002 resizes: 12
+
+for name, make_table in (("global lock", lambda: GlobalLockHashTable(1024)),
+                         ("lock striping", lambda: ConcurrentHashTable(1024))):
+    throughput = benchmark_read_heavy(make_table)
+    print(name, {threads: f"{ops / 1e6:.2f} Mops/s" for threads, ops in throughput.items()})
+
+"""
+nb.cells.append(new_code_cell(data_code_test2_8))
+
+
+s2_9 = r"""
+## Section 2-9: Chain-Length and Probe-Length Instrumentation
+
+### Problem
+
+`print_hash_table` and `print_hash_table_open` print every bucket. That works for 10 buckets and is useless at a million entries. We need numbers that describe the health of the table: how long the chains or probe sequences are, how often keys collide, and how much work each lookup does.
+
+### Solution: `table_stats()` and `TableStats`
+
+Both `HashTable` and `HashTableOpenAddressing` provide:
+
+```python
+ht = HashTable(10, track_stats=True)   # or ht.enable_stats() later
+ht.table_stats()                       # structural histogram + counters
+ht.stats.counters()                    # counters only, O(1)
+ht.disable_stats()
+```
+
+**Structural view** (`table_stats()`, one pass over the buckets):
+
+| Table | Histogram | Summary |
+|-------|-----------|---------|
+| `HashTable` | `chain_length_histogram`: chain length → number of buckets | `max_chain_length` |
+| `HashTableOpenAddressing` | `probe_distance_histogram`: probe distance → number of entries | `max_probe_distance`, `mean_probe_distance` |
+
+**Cumulative counters** (`TableStats`, updated on every operation):
+
+- `inserts`, `updates`, `searches`, `deletes`, `operations`: operation counts. `inserts` counts new entries; `updates` counts inserts of a key that was already present and was updated in place (`lean=True`, Robin Hood mode).
+- `hits`, `misses`, `mean_hit_probes`, `mean_miss_probes`, `max_hit_probes`, `max_miss_probes`: the work done by lookups. A probe is one node compared (chaining) or one slot examined (open addressing).
+- `collisions`: new entries whose insert had to pass another entry: a non-empty chain, or an occupied home slot.
+- `insert_probes`: the work the inserts actually did, as reported by `insert` itself. It returns `(probes, updated)`: the nodes compared or walked past (chaining) or slots examined (open addressing), and whether the key was updated in place. So a re-inserted key in linear mode is measured where its new copy lands, and a chain is measured after any incremental rehash step.
+- `probes`: total probes, handy as a single cost counter.
+- `batch_inserts`, `batch_searches`: keys handled by `insert_many` / `search_many` (their probes are not counted).
+
+Reading `ht.stats.counters()` only copies a few integers, so a monitoring thread can sample it as often as needed and compute rates from the differences.
+
+### Zero Overhead When Off
+
+`enable_stats()` stores instrumented versions of `insert`, `search`, `delete`, `insert_many` and `search_many` as attributes of this one instance. Attribute lookup finds them before the class methods. `disable_stats()` deletes them again, so a table without stats runs exactly the original class methods: there is no `if stats_enabled:` check on the hot path.
+
+"""
+nb.cells.append(new_markdown_cell(s2_9))
+
+
+data_code_test2_9 = r"""
+import random
+import time
+
+students = [f"Student {n}" for n in range(200000)]
+absent = [f"Visitor {n}" for n in range(20000)]
+
+ht = HashTable(10, lean=True, track_stats=True)
+for n, name in enumerate(students):
+    ht.insert(name, n)
+for name in random.sample(students, 20000) + absent:
+    ht.search(name)
+report = ht.table_stats()
+print("chain lengths:", report["chain_length_histogram"], "max:", report["max_chain_length"])
+counters = report["counters"]
+print("collisions:", counters["collisions"], "mean hit probes:", round(counters["mean_hit_probes"], 2),
+      "mean miss probes:", round(counters["mean_miss_probes"], 2))
+
+for mode in ("linear", "robin_hood"):
+    table = HashTableOpenAddressing(250000, mode=mode, compact=True, track_stats=True)
+    for n, name in enumerate(students):
+        table.insert(name, n)
+    for name in random.sample(students, 20000) + absent:
+        table.search(name)
+    report = table.table_stats()
+    counters = report["counters"]
+    print(mode, "max probe distance:", report["max_probe_distance"],
+          "mean/max hit probes:", round(counters["mean_hit_probes"], 2), counters["max_hit_probes"],
+          "mean/max miss probes:", round(counters["mean_miss_probes"], 2), counters["max_miss_probes"])
+
+# Sampling the counters is cheap, and turning stats off restores the plain methods
+before = ht.stats.counters()["operations"]
+for name in students[:1000]:
+    ht.search(name)
+print("operations since last sample:", ht.stats.counters()["operations"] - before)  # Output: 1000
+
+for enabled in (True, False):
+    if enabled:
+        ht.enable_stats()
+    else:
+        ht.disable_stats()
+    start = time.perf_counter()
+    for name in students[:100000]:
+        ht.search(name)
+    print("stats" if enabled else "no stats", "100k searches (ms):", round((time.perf_counter() - start) * 1000, 1))
+
+"""
+nb.cells.append(new_code_cell(data_code_test2_9))
+
+
+s2_10 = r"""
+## Section 2-10: Pluggable, Seeded, Process-Stable Hash Functions
+
+### Problem
+
+Section 1 shows "Alice Johnson" hashing to `3303733913283304066`, but run the code again and you get a different number. Since Python 3.3, `hash()` of `str` and `bytes` is randomized per process (`PYTHONHASHSEED`) to protect dictionaries against collision attacks. As a result, bucket indexes computed in one process mean nothing in another: a layout cannot be saved, shared between workers, or used to pick a shard.
+
+### Solution: `hash_func`
+
+Both table classes accept any hash function:
+
+```python
+ht = HashTable(10, hash_func=FNV1aHash(seed=42))
+ht_open = HashTableOpenAddressing(10, mode="robin_hood", hash_func=XXStyleHash(seed=42))
+```
+
+A hash function is any callable that returns an `int` in the signed 64-bit range (the compact layout of Section 2-4 stores it in an `array("q")`). The default is the built-in `hash`. If the object also has a `hash_many(keys)` method, `insert_many` and `search_many` (Section 2-6) call it once for the whole batch.
+
+### Built-in Stable Hash Functions
+
+Keys are turned into bytes first (`key_to_bytes`): `str` as UTF-8, `bytes` unchanged, integers as 8 little-endian bytes (wider if needed), tuples as their length-prefixed parts. Keys that compare equal must hash equally, so `True`, `1.0` and `np.int64(1)` are all encoded as the integer `1`; a float with a fractional part is encoded as its 8 IEEE bytes. Any other type raises `TypeError`: falling back to `repr` would not be stable, since the default `repr` contains the object's memory address.
+
+1. **`FNV1aHash(seed=0)`**: 64-bit FNV-1a. For each byte: `h = (h ^ byte) * 0x100000001b3`. The seed is folded into the offset basis. Very simple and good for short keys.
+2. **`XXStyleHash(seed=0)`**: an xxHash64-style hash. It consumes 8 bytes per round (multiply, rotate, multiply with the xxHash primes) and finishes with the xxHash64 avalanche. It uses the same constants and round structure, but is not output-compatible with the real xxHash library. There are 8x fewer rounds than FNV-1a, so it is faster on long keys.
+
+Both give the same value for the same key and seed in every process, on every machine. Different seeds give independent layouts (useful for Cuckoo hashing and for shard rings).
+
+### Vectorized Batch Path
+
+`hash_many(keys)` packs the encoded keys into one NumPy matrix, one row per key padded with zeros (`pack_bytes`). It then runs the hash rounds column by column over all rows at once in `uint64` arithmetic, which wraps modulo \( 2^{64} \) like the scalar version. Rows that are already finished are masked out with `np.where`, so the result is identical to calling the hash function on each key.
+
+**Complexity**:
+- `FNV1aHash`: O(len(key)) rounds per key; `XXStyleHash`: O(len(key) / 8).
+- `hash_many`: the same number of rounds, each one a NumPy operation over the whole batch.
+
+"""
+nb.cells.append(new_markdown_cell(s2_10))
+
+
+data_code_test2_10 = r"""
+import math
+import numbers
+import operator
+import struct
+import time
+import numpy as np
+
+MASK64 = (1 << 64) - 1
+FNV_OFFSET = 0xCBF29CE484222325
+FNV_PRIME = 0x100000001B3
+XX_P1 = 0x9E3779B185EBCA87
+XX_P2 = 0xC2B2AE3D27D4EB4F
+XX_P3 = 0x165667B19E3779F9
+XX_P4 = 0x85EBCA77C2B2AE63
+XX_P5 = 0x27D4EB2F165667C5
+
+def key_to_bytes(key):
+    # Keys that compare equal must give equal bytes: 1, True, 1.0 and np.int64(1) all encode as the int 1
+    if isinstance(key, str):
+        return key.encode("utf-8")
+    if isinstance(key, (bytes, bytearray, memoryview)):
+        return bytes(key)
+    if isinstance(key, numbers.Real) and not isinstance(key, numbers.Integral):
+        if math.isfinite(key) and key == int(key):
+            key = int(key)
+        else:
+            value = float(key)
+            if value != key and value == value:
+                raise TypeError(f"no stable encoding for {key!r}")
+            return struct.pack("<d", value)
+    if isinstance(key, numbers.Integral):
+        key = operator.index(key)
+        if -(1 << 63) <= key < (1 << 63):
+            return key.to_bytes(8, "little", signed=True)
+        return key.to_bytes((key.bit_length() + 8) // 8, "little", signed=True)
+    if isinstance(key, tuple):
+        # Length-prefixed parts, so ("ab", "c") and ("a", "bc") stay apart
+        parts = [key_to_bytes(part) for part in key]
+        return b"".join(len(part).to_bytes(4, "little") + part for part in parts)
+    raise TypeError(f"no stable encoding for key of type {type(key).__name__}")
+
+def to_signed64(h):
+    return h - (1 << 64) if h >= (1 << 63) else h
+
+def pack_bytes(data, word=1):
+    # One zero-padded row per key; the width is rounded up to a multiple of word bytes
+    lengths = np.fromiter((len(d) for d in data), dtype=np.int64, count=len(data))
+    width = int(lengths.max()) if len(data) else 0
+    width = -(-width // word) * word
+    buffer = b"".join(d.ljust(width, b"\0") for d in data)
+    return np.frombuffer(buffer, dtype=np.uint8).reshape(len(data), width), lengths
+
+def rotl64(x, r):
+    return ((x << r) | (x >> (64 - r))) & MASK64
+
+class FNV1aHash:
+    def __init__(self, seed=0):
+        self.seed = seed
+        # Fold the seed into the offset basis
+        self.basis = self._fnv(FNV_OFFSET, (seed & MASK64).to_bytes(8, "little")) if seed else FNV_OFFSET
+
+    @staticmethod
+    def _fnv(h, data):
+        for byte in data:
+            h = ((h ^ byte) * FNV_PRIME) & MASK64
+        return h
+
+    def __call__(self, key):
+        return to_signed64(self._fnv(self.basis, key_to_bytes(key)))
+
+    def hash_many(self, keys):
+        matrix, lengths = pack_bytes([key_to_bytes(k) for k in keys])
+        h = np.full(len(lengths), self.basis, dtype=np.uint64)
+        prime = np.uint64(FNV_PRIME)
+        for col in range(matrix.shape[1]):
+            h = np.where(lengths > col, (h ^ matrix[:, col]) * prime, h)
+        return h.view(np.int64)
+
+class XXStyleHash:
+    def __init__(self, seed=0):
+        self.seed = seed & MASK64
+
+    def __call__(self, key):
+        data = key_to_bytes(key)
+        h = (self.seed + XX_P5 + len(data)) & MASK64
+        for start in range(0, len(data), 8):
+            word = int.from_bytes(data[start:start + 8], "little")
+            h ^= (rotl64((word * XX_P2) & MASK64, 31) * XX_P1) & MASK64
+            h = (rotl64(h, 27) * XX_P1 + XX_P4) & MASK64
+        h ^= h >> 33
+        h = (h * XX_P2) & MASK64
+        h ^= h >> 29
+        h = (h * XX_P3) & MASK64
+        h ^= h >> 32
+        return to_signed64(h)
+
+    def hash_many(self, keys):
+        matrix, lengths = pack_bytes([key_to_bytes(k) for k in keys], word=8)
+        words = matrix.view("<u8")
+        h = np.uint64((self.seed + XX_P5) & MASK64) + lengths.astype(np.uint64)
+        p1, p2, p3, p4 = np.uint64(XX_P1), np.uint64(XX_P2), np.uint64(XX_P3), np.uint64(XX_P4)
+        for col in range(words.shape[1]):
+            k = words[:, col] * p2
+            k = ((k << np.uint64(31)) | (k >> np.uint64(33))) * p1
+            mixed = h ^ k
+            mixed = ((mixed << np.uint64(27)) | (mixed >> np.uint64(37))) * p1 + p4
+            h = np.where(lengths > col * 8, mixed, h)
+        h ^= h >> np.uint64(33)
+        h *= p2
+        h ^= h >> np.uint64(29)
+        h *= p3
+        h ^= h >> np.uint64(32)
+        return h.view(np.int64)
+
+
+# Example usage: the same bucket in every process and on every run
+fnv = FNV1aHash()
+print(fnv("Alice Johnson"), fnv("Alice Johnson") % 10)  # Output: 6175383586807177384 4
+print(FNV1aHash(seed=42)("Alice Johnson") != fnv("Alice Johnson"))  # Output: True
+
+ht = HashTable(10, hash_func=fnv)
+ht.insert("Alice Johnson", "Math: 85, English: 92, Science: 78")
+ht.insert("Bob Smith", "Math: 88, English: 75, Science: 90")
+print_hash_table(ht)
+
+ht_open = HashTableOpenAddressing(10, mode="robin_hood", compact=True, hash_func=XXStyleHash(seed=42))
+ht_open.insert_many(["Alice Johnson", "Bob Smith"], ["Math: 85, English: 92, Science: 78", "Math: 88, English: 75, Science: 90"])
+print(ht_open.search("Bob Smith"))  # Output: Math: 88, English: 75, Science: 90
+
+# Keys that compare equal hash equally, including the NumPy integers of a batch
+squares = HashTable(8, hash_func=fnv)
+squares.insert_many(np.arange(100), [n * n for n in range(100)])
+print(squares.search(5), squares.search(5.0), fnv(True) == fnv(1))  # Output: 25 25 True
+
+# Vectorized batch path versus one call per key
+names = [f"Alice Johnson of the Silicon Valley Camp {n}" for n in range(50000)]
+for hasher in (FNV1aHash(seed=7), XXStyleHash(seed=7)):
+    start = time.perf_counter()
+    scalar = [hasher(name) for name in names]
+    scalar_time = time.perf_counter() - start
+    start = time.perf_counter()
+    batch = hasher.hash_many(names)
+    batch_time = time.perf_counter() - start
+    print(type(hasher).__name__, "identical:", batch.tolist() == scalar,
+          "scalar (ms):", round(scalar_time * 1000, 1), "hash_many (ms):", round(batch_time * 1000, 1))
+
+"""
+nb.cells.append(new_code_cell(data_code_test2_10))
+
+
+s2_11 = r"""
+## Section 2-11: Sharding Across Worker Processes with Consistent Hashing
+
+### Problem
+
+One `HashTable` lives in one process: one core does all the hashing and probing, and all the data sits in one heap. To use every core of the machine, the keys must be split across several processes, and each key must always be sent to the same one.
+
+### Naive Partitioning and Its Problem
+
+The simplest rule is `shard = hash(key) % N`. Changing the number of shards from \( N \) to \( N + 1 \) changes the result for almost every key, so nearly all the data has to move.
+
+### Solution: Consistent Hash Ring
+
+1. Map the hash space onto a ring. Each shard owns `vnodes` points on the ring (virtual nodes), at positions `hash_func("shard#v")`.
+2. A key belongs to the first shard point clockwise from `hash_func(key)`.
+3. Adding a shard inserts its points: only keys that fall just before the new points move, about \( 1 / (N + 1) \) of them, and they all move to the new shard. Removing a shard moves only that shard's keys.
+4. Virtual nodes spread each shard over many small arcs, which balances the load.
+
+The ring uses a process-stable hash from Section 2-10 (`XXStyleHash`), so every process computes the same owner for a key.
+
+### `ShardedHashTable`
+
+```python
+with ShardedHashTable(shards=4) as sht:
+    sht.insert_many(keys, values)
+    results = sht.search_many(keys)
+    sht.add_shard()
+```
+
+- Each shard is a worker process holding a `HashTable(lean=True)` or a `HashTableOpenAddressing(mode="robin_hood", compact=True)` (`table="open_addressing"`), connected to the front-end by a `multiprocessing` pipe. `shard_size` is only the starting size: `HashTable` resizes itself, and an open-addressing shard is rebuilt at double size before a batch would push it past a 0.75 load factor.
+- **Errors**: a failed command in a worker is sent back as a reply. The front-end reads the replies of every shard it sent to before it raises one `RuntimeError` naming the failed shards, so no stale reply is left in a pipe for the next call.
+- **Batching per shard**: `insert_many` / `search_many` compute all owners with one vectorized `hash_many` and `np.searchsorted` over the ring. They then send one message per shard, and send every request before reading any reply, so all shards work at the same time.
+- **Rebalancing**: `add_shard()` starts a worker and sends the new ring to the existing workers. Each worker returns and deletes only the keys it no longer owns. `remove_shard(shard_id)` drains the leaving worker and routes its keys to their new owners. Only the moving keys cross a pipe. Removing the last shard raises `ValueError` before anything changes, since its keys would have no owner.
+- Workers are started with the `fork` start method, so they can run functions and classes defined in this notebook.
+
+**Complexity**:
+- Routing: O(log(N · vnodes)) per key (binary search on the ring).
+- Adding or removing a shard: moves O(n / N) keys.
+
+"""
+nb.cells.append(new_markdown_cell(s2_11))
+
+
+data_code_test2_11 = r"""
+import bisect
+import multiprocessing
+import time
+import numpy as np
+
+class ConsistentHashRing:
+    def __init__(self, vnodes=64, hash_func=None):
+        self.vnodes = vnodes
+        self.hash_func = hash_func if hash_func is not None else XXStyleHash(seed=0x5EED)
+        self.points = []   # sorted ring positions
+        self.owners = []   # shard id of each position
+
+    def add_shard(self, shard_id):
+        for v in range(self.vnodes):
+            point = self.hash_func(f"{shard_id}#{v}")
+            i = bisect.bisect_left(self.points, point)
+            self.points.insert(i, point)
+            self.owners.insert(i, shard_id)
+
+    def remove_shard(self, shard_id):
+        kept = [(p, o) for p, o in zip(self.points, self.owners) if o != shard_id]
+        self.points = [p for p, _ in kept]
+        self.owners = [o for _, o in kept]
+
+    def shard_for(self, key):
+        i = bisect.bisect_right(self.points, self.hash_func(key))
+        return self.owners[i % len(self.points)]
+
+    def shards_for_many(self, keys):
+        positions = np.searchsorted(np.array(self.points, dtype=np.int64), self.hash_func.hash_many(keys), side="right")
+        return np.array(self.owners)[positions % len(self.points)]
+
+SHARD_MAX_LOAD_FACTOR = 0.75   # open-addressing shards double before passing this load
+
+def grow_open_addressing(table, incoming):
+    # HashTableOpenAddressing has a fixed size, so a shard rebuilds it at double size before it fills up
+    new_size = table.size
+    while len(table) + incoming > SHARD_MAX_LOAD_FACTOR * new_size:
+        new_size *= 2
+    if new_size == table.size:
+        return table
+    grown = HashTableOpenAddressing(new_size, mode="robin_hood", compact=True)
+    entries = list(table.items())
+    if entries:
+        grown.insert_many([key for key, _ in entries], [value for _, value in entries])
+    return grown
+
+def shard_worker(conn, table_kind, size):
+    if table_kind == "open_addressing":
+        table = HashTableOpenAddressing(size, mode="robin_hood", compact=True)
+    else:
+        table = HashTable(size, lean=True)
+    while True:
+        command, args = conn.recv()
+        try:
+            if command == "insert_many":
+                if table_kind == "open_addressing":
+                    table = grow_open_addressing(table, len(args[0]))
+                table.insert_many(*args)
+                result = len(table)
+            elif command == "search_many":
+                result = table.search_many(args[0]).tolist()
+            elif command == "rebalance":
+                # Return and delete every entry this shard no longer owns
+                ring, shard_id = args
+                result = {}
+                for key, value in list(table.items()):
+                    owner = ring.shard_for(key)
+                    if owner != shard_id:
+                        keys, values = result.setdefault(owner, ([], []))
+                        keys.append(key)
+                        values.append(value)
+                for keys, _ in result.values():
+                    for key in keys:
+                        table.delete(key)
+            elif command == "drain":
+                result = list(table.items())
+            elif command == "len":
+                result = len(table)
+            elif command == "stop":
+                conn.send((True, None))
+                break
+            else:
+                raise ValueError("unknown command " + command)
+            conn.send((True, result))
+        except Exception as e:
+            conn.send((False, repr(e)))
+    conn.close()
+
+class ShardedHashTable:
+    def __init__(self, shards=4, table="chaining", shard_size=1 << 16, vnodes=64):
+        self.table_kind = table
+        self.shard_size = shard_size
+        self.ring = ConsistentHashRing(vnodes)
+        # fork lets the workers use the classes defined in this notebook
+        self.context = multiprocessing.get_context("fork")
+        self.workers = {}
+        self.next_shard_id = 0
+        for _ in range(shards):
+            self._start_worker()
+
+    def _start_worker(self):
+        shard_id = self.next_shard_id
+        self.next_shard_id += 1
+        parent_conn, child_conn = self.context.Pipe()
+        process = self.context.Process(target=shard_worker, args=(child_conn, self.table_kind, self.shard_size), daemon=True)
+        process.start()
+        child_conn.close()
+        self.workers[shard_id] = (process, parent_conn)
+        self.ring.add_shard(shard_id)
+        return shard_id
+
+    def _send(self, shard_id, command, *args):
+        self.workers[shard_id][1].send((command, args))
+
+    def _receive_all(self, shard_ids):
+        # Read every pending reply before raising, so no stale reply is left in a pipe
+        replies = {shard_id: self.workers[shard_id][1].recv() for shard_id in shard_ids}
+        errors = [f"shard {shard_id}: {result}" for shard_id, (ok, result) in replies.items() if not ok]
+        if errors:
+            raise RuntimeError("; ".join(errors))
+        return {shard_id: result for shard_id, (_, result) in replies.items()}
+
+    def _receive(self, shard_id):
+        return self._receive_all([shard_id])[shard_id]
+
+    def _group(self, keys):
+        groups = {}
+        for pos, owner in enumerate(self.ring.shards_for_many(keys).tolist()):
+            groups.setdefault(owner, []).append(pos)
+        return groups
+
+    def insert_many(self, keys, values):
+        keys = list(keys)
+        values = list(values)
+        groups = self._group(keys)
+        # Send every shard its batch first, then collect the replies
+        for shard_id, positions in groups.items():
+            self._send(shard_id, "insert_many", [keys[p] for p in positions], [values[p] for p in positions])
+        self._receive_all(groups)
+
+    def search_many(self, keys):
+        keys = list(keys)
+        results = [None] * len(keys)
+        groups = self._group(keys)
+        for shard_id, positions in groups.items():
+            self._send(shard_id, "search_many", [keys[p] for p in positions])
+        replies = self._receive_all(groups)
+        for shard_id, positions in groups.items():
+            for pos, value in zip(positions, replies[shard_id]):
+                results[pos] = value
+        return results
+
+    def insert(self, key, value):
+        self.insert_many([key], [value])
+
+    def search(self, key):
+        return self.search_many([key])[0]
+
+    def shard_sizes(self):
+        for shard_id in self.workers:
+            self._send(shard_id, "len")
+        return self._receive_all(self.workers)
+
+    def __len__(self):
+        return sum(self.shard_sizes().values())
+
+    def _route(self, moved):
+        # moved: {owner: (keys, values)}
+        count = 0
+        for owner, (keys, values) in moved.items():
+            self._send(owner, "insert_many", keys, values)
+            count += len(keys)
+        self._receive_all(moved)
+        return count
+
+    def add_shard(self):
+        old_shards = list(self.workers)
+        shard_id = self._start_worker()
+        for old in old_shards:
+            self._send(old, "rebalance", self.ring, old)
+        moved = {}
+        for reply in self._receive_all(old_shards).values():
+            for owner, (keys, values) in reply.items():
+                target = moved.setdefault(owner, ([], []))
+                target[0].extend(keys)
+                target[1].extend(values)
+        return shard_id, self._route(moved)
+
+    def remove_shard(self, shard_id):
+        # Checked before the ring or the worker changes, so a refused call loses nothing
+        if shard_id not in self.workers:
+            raise ValueError(f"unknown shard {shard_id!r}")
+        if len(self.workers) == 1:
+            raise ValueError("cannot remove the last shard: its keys would have nowhere to go")
+        self.ring.remove_shard(shard_id)
+        self._send(shard_id, "drain")
+        items = self._receive(shard_id)
+        self._stop_worker(shard_id)
+        keys = [key for key, _ in items]
+        values = [value for _, value in items]
+        moved = {}
+        for key, value, owner in zip(keys, values, self.ring.shards_for_many(keys).tolist() if keys else []):
+            target = moved.setdefault(owner, ([], []))
+            target[0].append(key)
+            target[1].append(value)
+        return self._route(moved)
+
+    def _stop_worker(self, shard_id):
+        process, conn = self.workers.pop(shard_id)
+        conn.send(("stop", ()))
+        conn.recv()
+        conn.close()
+        process.join()
+
+    def close(self):
+        for shard_id in list(self.workers):
+            self._stop_worker(shard_id)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Example usage
+students = [f"Student {n}" for n in range(100000)]
+grades = [f"Math: {n % 100}, English: {(n * 7) % 100}, Science: {(n * 13) % 100}" for n in range(100000)]
+
+with ShardedHashTable(shards=4) as sht:
+    start = time.perf_counter()
+    sht.insert_many(students, grades)
+    print("insert_many across 4 shards (ms):", round((time.perf_counter() - start) * 1000, 1))
+    print("keys per shard:", sht.shard_sizes())
+
+    start = time.perf_counter()
+    results = sht.search_many(students)
+    print("search_many across 4 shards (ms):", round((time.perf_counter() - start) * 1000, 1))
+    print(results[12345])  # Output: Math: 45, English: 15, Science: 85
+
+    shard_id, moved = sht.add_shard()
+    print(f"added shard {shard_id}: moved {moved} keys ({moved / len(students):.1%}, ideal 20%)")
+    moved = sht.remove_shard(0)
+    print(f"removed shard 0: moved {moved} keys")
+    print(len(sht), sht.search("Student 12345"))  # Output: 100000 Math: 45, English: 15, Science: 85
+
+"""
+nb.cells.append(new_code_cell(data_code_test2_11))
+
+
+s2_12 = r"""
+## Section 2-12: Benchmark Suite: HashTable vs HashTableOpenAddressing vs dict
+
+### Problem
+
+When should we switch from separate chaining to open addressing, and how far are both from Python's built-in `dict`? Without measurements this is guesswork, and there is no way to tell whether a change made things faster.
+
+### Solution: `run_hash_benchmarks`
+
+The harness sweeps every combination of:
+
+| Parameter | Meaning | Default |
+|-----------|---------|---------|
+| `sizes` | number of buckets / slots | 1,000 and 100,000 |
+| `load_factors` | entries / size before the workload starts | 0.5, 0.75, 0.9 |
+| `key_types` | `short_str` ("s123"), `long_str` (60+ characters), `int` (random 60-bit) | all three |
+| `hit_ratios` | fraction of searches for keys that are present | 1.0, 0.5 |
+| `insert_ratios` | fraction of operations that are inserts | 0.0, 0.2 |
+
+For each combination and each implementation it:
+
+1. Pre-generates the keys, so key creation is not measured.
+2. Fills the table to the load factor while `tracemalloc` is running: **bytes per entry** is the memory allocated by the table divided by the number of entries.
+3. Runs the same seeded operation list twice: once without per-operation timing for **ops/sec**, and once timing each operation with `time.perf_counter_ns()` for **p50 / p99 latency**.
+
+Implementations (`BENCHMARK_IMPLEMENTATIONS`): `dict` (behind a thin `insert` / `search` adapter, so every table pays the same method-call cost), `HashTable(lean=True, max_load_factor=float("inf"))`, and `HashTableOpenAddressing` in Robin Hood mode with the default and the compact layouts. The chaining table is built without automatic growth: with its default `max_load_factor=0.75` it would double before the 0.9 point and be measured at about 0.45. Inserts overwrite existing keys, so the load factor stays fixed during the run. This is also why the default `HashTable` and linear-probing modes, which append duplicates, are not in the list.
+
+### Machine-Readable Output
+
+`run_hash_benchmarks(..., output_path="bench.json")` writes:
+
+```
+{"meta": {"python": ..., "platform": ..., "timestamp": ..., "seed": ..., "ops": ...},
+ "results": [{"implementation": ..., "size": ..., "load_factor": ..., "key_type": ...,
+              "hit_ratio": ..., "insert_ratio": ..., "ops_per_sec": ...,
+              "p50_ns": ..., "p99_ns": ..., "bytes_per_entry": ...}, ...]}
+```
+
+`compare_benchmark_runs(old, new)` matches the records of two runs by their parameters and reports the `ops_per_sec` ratio, so two versions of the code can be compared.
+
+"""
+nb.cells.append(new_markdown_cell(s2_12))
+
+
+data_code_test2_12 = r"""
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+class DictTable:
+    # The built-in dict behind the same interface as the other tables
+    def __init__(self, size):
+        self.data = {}
+
+    def insert(self, key, value):
+        self.data[key] = value
+
+    def search(self, key):
+        return self.data.get(key)
+
+BENCHMARK_IMPLEMENTATIONS = {
+    "dict": DictTable,
+    # No automatic growth, so the chains really run at the requested load factor
+    "HashTable(lean)": lambda size: HashTable(size, max_load_factor=float("inf"), lean=True),
+    "HashTableOpenAddressing(robin_hood)": lambda size: HashTableOpenAddressing(size, mode="robin_hood"),
+    "HashTableOpenAddressing(robin_hood, compact)": lambda size: HashTableOpenAddressing(size, mode="robin_hood", compact=True),
+}
+
+def make_benchmark_keys(key_type, count, rng):
+    if key_type == "short_str":
+        return [f"s{n}" for n in rng.sample(range(count * 10), count)]
+    if key_type == "long_str":
+        return [f"Alice Johnson of the Silicon Valley Camp, student number {n:012d}" for n in rng.sample(range(count * 10), count)]
+    if key_type == "int":
+        return list({rng.getrandbits(60) for _ in range(count * 2)})[:count]
+    raise ValueError("unknown key type " + key_type)
+
+def make_operations(present, absent, ops, hit_ratio, insert_ratio, rng):
+    operations = []
+    for _ in range(ops):
+        if rng.random() < insert_ratio:
+            operations.append((True, rng.choice(present)))
+        elif rng.random() < hit_ratio:
+            operations.append((False, rng.choice(present)))
+        else:
+            operations.append((False, rng.choice(absent)))
+    return operations
+
+def benchmark_one(factory, size, load_factor, keys, operations):
+    count = int(size * load_factor)
+    values = list(range(count))
+    tracemalloc.start()
+    table = factory(size)
+    for key, value in zip(keys, values):
+        table.insert(key, value)
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    insert, search = table.insert, table.search
+    start = time.perf_counter()
+    for is_insert, key in operations:
+        if is_insert:
+            insert(key, 0)
+        else:
+            search(key)
+    elapsed = time.perf_counter() - start
+
+    latencies = []
+    clock = time.perf_counter_ns
+    for is_insert, key in operations:
+        t0 = clock()
+        if is_insert:
+            insert(key, 0)
+        else:
+            search(key)
+        latencies.append(clock() - t0)
+    latencies.sort()
+    return {
+        "ops_per_sec": len(operations) / elapsed,
+        "p50_ns": latencies[len(latencies) // 2],
+        "p99_ns": latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)],
+        "bytes_per_entry": used / count,
+    }
+
+def run_hash_benchmarks(sizes=(1000, 100000), load_factors=(0.5, 0.75, 0.9), key_types=("short_str", "long_str", "int"),
+                        hit_ratios=(1.0, 0.5), insert_ratios=(0.0, 0.2), ops=20000, implementations=None,
+                        seed=0, output_path=None):
+    implementations = implementations or BENCHMARK_IMPLEMENTATIONS
+    report = {
+        "meta": {
+            "python": sys.version.split()[0],
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "seed": seed,
+            "ops": ops,
+        },
+        "results": [],
+    }
+    for size, load_factor, key_type, hit_ratio, insert_ratio in itertools.product(
+            sizes, load_factors, key_types, hit_ratios, insert_ratios):
+        # The same keys and operations for every implementation
+        rng = random.Random(f"{seed}-{size}-{load_factor}-{key_type}-{hit_ratio}-{insert_ratio}")
+        count = int(size * load_factor)
+        keys = make_benchmark_keys(key_type, count * 2, rng)
+        present, absent = keys[:count], keys[count:]
+        operations = make_operations(present, absent, ops, hit_ratio, insert_ratio, rng)
+        for name, factory in implementations.items():
+            record = {"implementation": name, "size": size, "load_factor": load_factor, "key_type": key_type,
+                      "hit_ratio": hit_ratio, "insert_ratio": insert_ratio}
+            record.update(benchmark_one(factory, size, load_factor, present, operations))
+            report["results"].append(record)
+    if output_path:
+        with open(output_path, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+BENCHMARK_PARAMETERS = ("implementation", "size", "load_factor", "key_type", "hit_ratio", "insert_ratio")
+
+def compare_benchmark_runs(old, new):
+    # old, new: reports or paths to JSON files; returns new/old ops_per_sec per matching record
+    if isinstance(old, str):
+        with open(old) as f:
+            old = json.load(f)
+    if isinstance(new, str):
+        with open(new) as f:
+            new = json.load(f)
+    baseline = {tuple(r[p] for p in BENCHMARK_PARAMETERS): r for r in old["results"]}
+    comparison = []
+    for record in new["results"]:
+        before = baseline.get(tuple(record[p] for p in BENCHMARK_PARAMETERS))
+        if before:
+            entry = {p: record[p] for p in BENCHMARK_PARAMETERS}
+            entry["speedup"] = record["ops_per_sec"] / before["ops_per_sec"]
+            comparison.append(entry)
+    return comparison
+
+def print_benchmark_report(report):
+    print(f"{'implementation':45} {'size':>7} {'lf':>5} {'keys':>10} {'hit':>4} {'ins':>4} "
+          f"{'Mops/s':>7} {'p50 ns':>7} {'p99 ns':>7} {'B/entry':>8}")
+    for r in report["results"]:
+        print(f"{r['implementation']:45} {r['size']:>7} {r['load_factor']:>5} {r['key_type']:>10} "
+              f"{r['hit_ratio']:>4} {r['insert_ratio']:>4} {r['ops_per_sec'] / 1e6:>7.2f} "
+              f"{r['p50_ns']:>7} {r['p99_ns']:>7} {r['bytes_per_entry']:>8.1f}")
+
+
+# Example usage: a small sweep (the defaults run the full grid)
+with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+    path = f.name
+report = run_hash_benchmarks(sizes=(10000,), load_factors=(0.5, 0.9), key_types=("short_str", "long_str", "int"),
+                             hit_ratios=(0.5,), insert_ratios=(0.2,), ops=10000, output_path=path)
+print_benchmark_report(report)
+print(compare_benchmark_runs(path, report)[0])  # speedup 1.0 when compared with itself
+os.remove(path)
+
+"""
+nb.cells.append(new_code_cell(data_code_test2_12))
+
+
+s2_13 = r"""
+## Section 2-13: Cuckoo Hashing with Worst-Case O(1) Lookups
+
+### Problem
+
+Even with Robin Hood probing, a lookup in `HashTableOpenAddressing` has no fixed upper bound: an unlucky key can probe a long run. These rare long probes are exactly what shows up in p99 latency.
+
+### Solution: Cuckoo Hashing
+
+A key may live in only a few fixed places, so a lookup never has to search further than those places.
+
+1. **Several hash functions**: `num_hashes` (default 2) independent hash functions give each key `num_hashes` candidate buckets.
+2. **Bucketized slots**: each bucket has `bucket_size` (default 4) slots. With 2 hash functions and 4-slot buckets the table can be filled to about 95% before inserts start failing, compared with about 50% for classic one-slot cuckoo hashing.
+3. **Stash**: a tiny overflow list (`stash_size`, default 4) for the rare key that cannot be placed.
+
+`search` reads at most `num_hashes * bucket_size + stash_size` slots (12 with the defaults), **whatever the table contents**: `table.max_reads` reports that bound.
+
+### Insertion: Kicking Out the Cuckoo
+
+1. If the key already exists, update its value.
+2. If one of its candidate buckets has a free slot, store it there.
+3. Otherwise evict a random resident of a random candidate bucket (like a cuckoo chick pushing an egg out of the nest), store the new key in its place, and re-insert the evicted key into one of *its* other buckets. Repeat up to `max_kicks` times.
+4. If the chain of evictions does not end (an eviction cycle), the entry left without a slot goes to the stash.
+5. If the stash is full too, **rehash automatically**: choose new seeds for all hash functions and re-insert every entry, doubling the number of buckets if the table is more than half full. The table also grows when the load factor passes `max_load_factor`.
+
+### Hash Functions
+
+Hash function `i` is built by `hash_factory(seed)` with a seed that changes on every rehash. The default `SeededHash(seed)` is a keyed BLAKE2b over the key's bytes (`key_to_bytes`, Section 2-10), so it is stable across processes and keys must be of a type `key_to_bytes` accepts. The hash functions must not be derived from the built-in `hash(key)`: two keys with equal `hash()` would get the same buckets under every seed, and no rehash could separate them. `hash_factory=XXStyleHash` works too.
+
+A rehash that still leaves an entry without a place is retried with new seeds, in a loop rather than by recursion. After `max_rehashes` failed attempts, `insert` raises `RuntimeError` instead of looping forever. With a byte-level hash that takes keys whose encodings are identical (such as `"ab"` and `b"ab"`) crowding the same candidate slots, or settings like `stash_size=0` with a tiny `max_kicks`.
+
+**Complexity**:
+- `search` / `delete`: O(1) worst case (at most `max_reads` slot reads).
+- `insert`: O(1) expected, amortized over the occasional rehash.
+- Space: `num_buckets * bucket_size` slots, up to ~95% full.
+
+"""
+nb.cells.append(new_markdown_cell(s2_13))
+
+
+data_code_test2_13 = r"""
+import hashlib
+import random
+import time
+
+class SeededHash:
+    # Keyed BLAKE2b over the key's bytes (key_to_bytes, Section 2-10): keys that collide
+    # under one seed are unrelated under the next, unlike any reseeding of hash(key)
+    def __init__(self, seed=0):
+        self.seed = seed
+        self.base = hashlib.blake2b(digest_size=8, key=(seed & MASK64).to_bytes(8, "little"))
+
+    def __call__(self, key):
+        h = self.base.copy()
+        h.update(key_to_bytes(key))
+        return int.from_bytes(h.digest(), "little")
+
+class CuckooHashTable:
+    def __init__(self, size, num_hashes=2, bucket_size=4, stash_size=4, max_kicks=500,
+                 max_load_factor=0.9, hash_factory=SeededHash, max_rehashes=16, seed=0):
+        self.num_hashes = num_hashes
+        self.bucket_size = bucket_size
+        self.stash_size = stash_size
+        self.max_kicks = max_kicks
+        self.max_load_factor = max_load_factor
+        self.hash_factory = hash_factory
+        self.max_rehashes = max_rehashes
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.rehash_count = 0
+        self._reset(max(1, -(-size // bucket_size)))
+
+    def _reset(self, num_buckets):
+        self.num_buckets = num_buckets
+        self.size = num_buckets * self.bucket_size
+        self.keys = [None] * self.size   # None marks an empty slot
+        self.values = [None] * self.size
+        self.stash = []
+        self.count = 0
+        self.hash_funcs = [self.hash_factory(self.seed * self.num_hashes + i) for i in range(self.num_hashes)]
+
+    @property
+    def load_factor(self):
+        return self.count / self.size
+
+    @property
+    def max_reads(self):
+        return self.num_hashes * self.bucket_size + self.stash_size
+
+    def __len__(self):
+        return self.count
+
+    def _buckets(self, key):
+        return [h(key) % self.num_buckets for h in self.hash_funcs]
+
+    def _find_slot(self, key):
+        keys = self.keys
+        for bucket in self._buckets(key):
+            start = bucket * self.bucket_size
+            for slot in range(start, start + self.bucket_size):
+                if keys[slot] is not None and keys[slot] == key:
+                    return slot
+        return -1
+
+    def search(self, key):
+        slot = self._find_slot(key)
+        if slot != -1:
+            return self.values[slot]
+        for stash_key, stash_value in self.stash:
+            if stash_key == key:
+                return stash_value
+        return None
+
+    def insert(self, key, value):
+        slot = self._find_slot(key)
+        if slot != -1:
+            self.values[slot] = value
+            return
+        for i, (stash_key, _) in enumerate(self.stash):
+            if stash_key == key:
+                self.stash[i] = (key, value)
+                return
+        if self.count + 1 > self.max_load_factor * self.size:
+            self._rehash(grow=True)
+        leftover = self._insert_new(key, value)
+        if leftover is not None:
+            self._rehash(grow=self.load_factor > 0.5, pending=[leftover])
+
+    def _place_in_free_slot(self, key, value, buckets):
+        for bucket in buckets:
+            start = bucket * self.bucket_size
+            for slot in range(start, start + self.bucket_size):
+                if self.keys[slot] is None:
+                    self.keys[slot] = key
+                    self.values[slot] = value
+                    return True
+        return False
+
+    def _insert_new(self, key, value):
+        # Returns None once the entry is placed; otherwise undoes its evictions and returns it
+        path = []
+        for _ in range(self.max_kicks):
+            buckets = self._buckets(key)
+            if self._place_in_free_slot(key, value, buckets):
+                self.count += 1
+                return None
+            # Evict a random resident of a random candidate bucket and re-insert it instead
+            slot = self.random.choice(buckets) * self.bucket_size + self.random.randrange(self.bucket_size)
+            path.append(slot)
+            key, self.keys[slot] = self.keys[slot], key
+            value, self.values[slot] = self.values[slot], value
+        if len(self.stash) < self.stash_size:
+            self.stash.append((key, value))
+            self.count += 1
+            return None
+        for slot in reversed(path):
+            key, self.keys[slot] = self.keys[slot], key
+            value, self.values[slot] = self.values[slot], value
+        return key, value
+
+    def _rehash(self, grow, pending=()):
+        # Retry with fresh seeds until every entry has a place, growing while more than half full
+        entries = list(self.items()) + list(pending)
+        previous = (self.num_buckets, self.keys, self.values, self.stash, self.count, self.hash_funcs)
+        for _ in range(self.max_rehashes):
+            self.seed += 1
+            self.rehash_count += 1
+            self._reset(self.num_buckets * 2 if grow else self.num_buckets)
+            if all(self._insert_new(key, value) is None for key, value in entries):
+                return
+            grow = len(entries) > self.size / 2
+        # Give up with the table as it was before the failed insert
+        self.num_buckets, self.keys, self.values, self.stash, self.count, self.hash_funcs = previous
+        self.size = self.num_buckets * self.bucket_size
+        raise RuntimeError(f"could not place {len(entries)} entries after {self.max_rehashes} rehashes; "
+                           "too many keys share the same bytes")
+
+    def delete(self, key):
+        slot = self._find_slot(key)
+        if slot != -1:
+            self.keys[slot] = None
+            self.values[slot] = None
+            self.count -= 1
+            # A freed slot may give a stashed entry its place back
+            for i, (stash_key, stash_value) in enumerate(self.stash):
+                if self._place_in_free_slot(stash_key, stash_value, self._buckets(stash_key)):
+                    del self.stash[i]
+                    break
+            return True
+        for i, (stash_key, _) in enumerate(self.stash):
+            if stash_key == key:
+                del self.stash[i]
+                self.count -= 1
+                return True
+        return False
+
+    def items(self):
+        for key, value in zip(self.keys, self.values):
+            if key is not None:
+                yield key, value
+        yield from self.stash
+
+
+# Example usage
+cuckoo = CuckooHashTable(10)
+cuckoo.insert("Alice Johnson", "Math: 85, English: 92, Science: 78")
+cuckoo.insert("Bob Smith", "Math: 88, English: 75, Science: 90")
+print(cuckoo.search("Alice Johnson"))  # Output: Math: 85, English: 92, Science: 78
+print(cuckoo.max_reads)                # Output: 12
+
+# Tail latency of lookups at ~90% occupancy
+def lookup_percentiles(table, keys):
+    latencies = []
+    for key in keys:
+        start = time.perf_counter_ns()
+        table.search(key)
+        latencies.append(time.perf_counter_ns() - start)
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[len(latencies) * 99 // 100], latencies[-1]
+
+students = [f"Student {n}" for n in range(90000)]
+lookups = students[::3] + [f"Visitor {n}" for n in range(30000)]
+tables = {
+    "open addressing (linear)": HashTableOpenAddressing(100000),
+    "open addressing (robin_hood)": HashTableOpenAddressing(100000, mode="robin_hood"),
+    "cuckoo": CuckooHashTable(100000),
+}
+for name, table in tables.items():
+    for n, key in enumerate(students):
+        table.insert(key, n)
+    p50, p99, worst = lookup_percentiles(table, lookups)
+    print(f"{name}: load {table.load_factor:.2f}, p50 {p50} ns, p99 {p99} ns, max {worst} ns")
+print("cuckoo stash:", len(tables["cuckoo"].stash), "rehashes:", tables["cuckoo"].rehash_count)
+
+"""
+nb.cells.append(new_code_cell(data_code_test2_13))
+
+
+s2_14 = r"""
+## Section 2-14: Bounded LRU / LFU Cache on Top of HashTable
+
+### Problem
+
+When `HashTable` is used as a front cache for expensive grade lookups it only grows: nothing is ever removed, so memory climbs until the process is killed.
+
+### Solution: `BoundedCache`
+
+`BoundedCache` is a `HashTable` whose chain nodes (`CacheNode`) carry two more pointers, `prev_entry` and `next_entry`. These thread an **intrusive doubly linked list** through the same nodes the buckets point to. No second index is needed, and unlinking a node found through its bucket is O(1).
+
+| Policy | List structure | Victim |
+|--------|----------------|--------|
+| `"lru"` | one list, most recently used at the front | the back of the list |
+| `"lfu"` | one list per use count, plus `min_freq` | the back of the `min_freq` list (least recently used among the least frequently used) |
+
+Limits:
+
+- `max_entries`: the maximum number of entries.
+- `max_bytes`: a byte budget. Entry size is `sizeof(key) + sizeof(value)`, by default `sys.getsizeof`, which is shallow, so pass a better `sizeof` for nested values. A single entry larger than the whole budget is not cached.
+- `ttl`: seconds until an entry expires, overridable per `put`. Expired entries are dropped lazily when they are looked up. `purge_expired()` drops all of them at once.
+
+Counters: `hits`, `misses`, `evictions`, `expirations` (see `cache_counters()`).
+
+### Operations
+
+1. `get(key)`: find the node through its bucket. If it has expired, remove it and count a miss. Otherwise move it to the front of its list (LFU: the front of the list for `freq + 1`).
+2. `put(key, value)`: update or create the node, evict victims until the new entry fits, then link it at the front.
+3. `delete(key)`: unlink the node from its chain and from its list.
+
+`search` and `insert` are aliases of `get` and `put`, so the cache can replace a `HashTable`. The table still resizes incrementally (Section 2-2): rehashing moves whole nodes between buckets, so the list pointers stay valid.
+
+**Complexity**: `get`, `put`, `delete` and each eviction are O(1) on average. The one exception is LFU after the last entry with the smallest count is deleted or expires: the next eviction then scans the distinct counts to find the new minimum.
+
+"""
+nb.cells.append(new_markdown_cell(s2_14))
+
+
+data_code_test2_14 = r"""
+import random
+import sys
+import time
+
+class CacheNode:
+    # A chain node that is also a member of the cache's recency / frequency list
+    __slots__ = ("key", "value", "next", "prev_entry", "next_entry", "size", "expires_at", "freq")
+
+    def __init__(self, key, value, size=1, expires_at=None):
+        self.key = key
+        self.value = value
+        self.next = None
+        self.prev_entry = None
+        self.next_entry = None
+        self.size = size
+        self.expires_at = expires_at
+        self.freq = 1
+
+class BoundedCache(HashTable):
+    def __init__(self, max_entries=None, max_bytes=None, policy="lru", ttl=None, size=16,
+                 sizeof=sys.getsizeof, clock=time.monotonic):
+        if policy not in ("lru", "lfu"):
+            raise ValueError("policy must be 'lru' or 'lfu'")
+        super().__init__(size, lean=True)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.clock = clock
+        self.bytes_used = 0
+        # List heads (sentinels) by use count; LRU keeps everything under 0
+        self.lists = {}
+        self.min_freq = 1
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        if self.new_table is not None:
+            self._rehash_some()
+        node = self._find_node(key)
+        if node is not None and node.expires_at is not None and node.expires_at <= self.clock():
+            self._remove(node)
+            self.expirations += 1
+            node = None
+        if node is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._touch(node)
+        return node.value
+
+    def put(self, key, value, ttl=None):
+        if self.new_table is not None:
+            self._rehash_some()
+        node = self._find_node(key)
+        size = self.sizeof(key) + self.sizeof(value) if self.max_bytes is not None else 1
+        if self.max_bytes is not None and size > self.max_bytes:
+            if node is not None:
+                self._remove(node)
+            return False
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = None if ttl is None else self.clock() + ttl
+        if node is not None:
+            # Take the entry out of its list so it cannot be its own victim
+            self._detach(node)
+            self._make_room(size, 0)
+            node.value = value
+            node.size = size
+            node.expires_at = expires_at
+            if self.policy == "lfu":
+                node.freq += 1
+            self._attach(node)
+            return True
+        self._make_room(size, 1)
+        node = CacheNode(key, value, size, expires_at)
+        if self.new_table is not None:
+            table, hash_key = self.new_table, self.hash_func(key) % self.new_size
+        else:
+            table, hash_key = self.table, self.hash_function(key)
+        node.next = table[hash_key]
+        table[hash_key] = node
+        self.count += 1
+        self._attach(node)
+        self._check_load_factor()
+        return True
+
+    search = get
+    insert = put
+
+    def insert_many(self, keys, values, hashes=None):
+        for key, value in zip(keys, values):
+            self.put(key, value)
+
+    def search_many(self, keys, hashes=None):
+        return [self.get(key) for key in keys]
+
+    def delete(self, key):
+        node = self._find_node(key)
+        if node is None:
+            return False
+        self._remove(node)
+        return True
+
+    def purge_expired(self):
+        now = self.clock()
+        expired = []
+        for head in self.lists.values():
+            node = head.next_entry
+            while node is not head:
+                if node.expires_at is not None and node.expires_at <= now:
+                    expired.append(node)
+                node = node.next_entry
+        for node in expired:
+            self._remove(node)
+        self.expirations += len(expired)
+        return len(expired)
+
+    def cache_counters(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": self.count,
+            "bytes_used": self.bytes_used,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    # Intrusive list maintenance
+
+    def _list_head(self, freq):
+        head = self.lists.get(freq)
+        if head is None:
+            head = CacheNode(None, None)
+            head.prev_entry = head.next_entry = head
+            self.lists[freq] = head
+        return head
+
+    def _attach(self, node):
+        list_key = node.freq if self.policy == "lfu" else 0
+        head = self._list_head(list_key)
+        node.prev_entry = head
+        node.next_entry = head.next_entry
+        head.next_entry.prev_entry = node
+        head.next_entry = node
+        # No list ever has a count below min_freq; it may point at an emptied list
+        if list_key < self.min_freq:
+            self.min_freq = list_key
+        self.bytes_used += node.size
+
+    def _detach(self, node):
+        node.prev_entry.next_entry = node.next_entry
+        node.next_entry.prev_entry = node.prev_entry
+        list_key = node.freq if self.policy == "lfu" else 0
+        if self.lists[list_key].next_entry is self.lists[list_key]:
+            del self.lists[list_key]
+        node.prev_entry = node.next_entry = None
+        self.bytes_used -= node.size
+
+    def _touch(self, node):
+        self._detach(node)
+        if self.policy == "lfu":
+            if node.freq == self.min_freq and node.freq not in self.lists:
+                self.min_freq = node.freq + 1
+            node.freq += 1
+        self._attach(node)
+
+    def _remove(self, node):
+        self._detach(node)
+        HashTable.delete(self, node.key)
+
+    def _victim(self):
+        if not self.lists:
+            return None
+        list_key = self.min_freq if self.policy == "lfu" else 0
+        if list_key not in self.lists:
+            list_key = self.min_freq = min(self.lists)
+        return self.lists[list_key].prev_entry
+
+    def _make_room(self, size, new_entries):
+        while ((self.max_entries is not None and self.count + new_entries > self.max_entries)
+               or (self.max_bytes is not None and self.bytes_used + size > self.max_bytes)):
+            victim = self._victim()
+            if victim is None:
+                break
+            self._remove(victim)
+            self.evictions += 1
+
+
+# Example usage
+cache = BoundedCache(max_entries=2)
+cache.put("Alice Johnson", "Math: 85, English: 92, Science: 78")
+cache.put("Bob Smith", "Math: 88, English: 75, Science: 90")
+cache.get("Alice Johnson")
+cache.put("Charlie Brown", "Math: 90, English: 85, Science: 92")  # evicts Bob Smith
+print(cache.get("Bob Smith"))        # Output: None
+print(cache.get("Alice Johnson"))    # Output: Math: 85, English: 92, Science: 78
+print(cache.cache_counters())
+# Output: {'entries': 2, 'bytes_used': 2, 'hits': 2, 'misses': 1, 'hit_rate': 0.6666666666666666, 'evictions': 1, 'expirations': 0}
+
+# TTL expiry with a controllable clock
+now = [0.0]
+cache = BoundedCache(max_entries=100, ttl=60, clock=lambda: now[0])
+cache.put("Alice Johnson", "Math: 85, English: 92, Science: 78")
+now[0] = 61.0
+print(cache.get("Alice Johnson"), cache.expirations)   # Output: None 1
+
+# Front cache for an expensive lookup: 70% of lookups go to a few popular students,
+# the rest are spread evenly over 20,000 students
+def expensive_grade_lookup(name):
+    n = int(name.split()[1])
+    return f"Math: {n % 100}, English: {(n * 7) % 100}, Science: {(n * 13) % 100}"
+
+rng = random.Random(14)
+names = [f"Student {int(rng.paretovariate(0.5)) % 20000}" if rng.random() < 0.7 else f"Student {rng.randrange(20000)}"
+         for _ in range(100000)]
+for policy in ("lru", "lfu"):
+    cache = BoundedCache(max_entries=1000, policy=policy)
+    for name in names:
+        if cache.get(name) is None:
+            cache.put(name, expensive_grade_lookup(name))
+    counters = cache.cache_counters()
+    print(policy, "entries:", counters["entries"], "hit rate:", round(counters["hit_rate"], 3),
+          "evictions:", counters["evictions"])
+# Output: lru entries: 1000 hit rate: 0.651 evictions: 33851
+# Output: lfu entries: 1000 hit rate: 0.669 evictions: 32076
+
+# Byte budget: memory stays bounded however many records pass through
+cache = BoundedCache(max_bytes=64 * 1024)
+for n in range(50000):
+    cache.put(f"Student {n}", expensive_grade_lookup(f"Student {n}"))
+print("entries:", len(cache), "bytes used:", cache.bytes_used, "<=", cache.max_bytes)
+# Output: entries: 452 bytes used: 65411 <= 65536
+
+"""
+nb.cells.append(new_code_cell(data_code_test2_14))
+
+
+s2_15 = r"""
+## Section 2-15: Bloom Filter in Front of the Tables for Fast Negative Lookups
+
+### Problem
+
+Many `search` calls are for keys that are not in the table. Each miss still hashes the key, indexes into `table`, and walks the whole chain at that bucket (`HashTable`) or the whole probe run (`HashTableOpenAddressing`) before it returns `None`. At high load factors this is the slowest kind of lookup.
+
+### Solution: A Bloom Filter
+
+A Bloom filter is an array of `m` bits plus `k` index functions. `add(key)` sets the `k` bits of the key. `might_contain(key)` checks them: if any bit is 0 the key was **certainly never added**; if all are 1 it **probably** was.
+
+For `n` expected keys and a target false-positive rate `p`:
+
+- `m = -n * ln(p) / (ln 2)^2` bits (about 9.6 bits per key for p = 1%)
+- `k = (m / n) * ln 2` index functions (7 for p = 1%)
+
+The `k` indexes come from the table's own 64-bit hash value with double hashing, `(h1 + i * h2) mod m`. Here `h1` and `h2` are two splitmix64 mixes of the hash value, so a key is hashed only once.
+
+| Class | Storage | Deletes |
+|-------|---------|---------|
+| `BloomFilter` | 1 bit per position (`bytearray`) | no: a deleted key keeps its bits and only causes false positives |
+| `CountingBloomFilter` | 1 byte counter per position | `remove(key)` decrements the counters; a counter that reaches 255 stays there, so a false negative is impossible |
+
+### `BloomFilteredTable`
+
+`BloomFilteredTable(table, capacity, error_rate=0.01, counting=False)` wraps a `HashTable` or `HashTableOpenAddressing` with the same `insert` / `search` / `delete` / `insert_many` / `search_many` interface:
+
+1. `insert` adds the key to the filter and to the table.
+2. `search` returns `None` immediately when the filter rules the key out. Otherwise it asks the table.
+3. `delete` removes the key from a counting filter only if the table actually deleted it.
+4. `search_many` checks the whole batch against the filter with NumPy and sends only the surviving keys, with their hash values, to the table's `search_many`.
+
+`filter_counters()` reports `lookups`, `avoided` (misses answered by the filter alone), `false_positives` (keys that passed the filter but were not in the table), the measured false-positive rate, and the rate the filter expects at its current fill.
+
+**Complexity**: `k` bit tests per lookup, O(k) = O(log(1/p)), independent of chain or probe length. Space: about `1.44 * log2(1/p)` bits per key, or 8x that with counters.
+
+"""
+nb.cells.append(new_markdown_cell(s2_15))
+
+
+data_code_test2_15 = r"""
+import math
+import time
+import numpy as np
+
+def bloom_parameters(capacity, error_rate):
+    # (number of bits m, number of index functions k) for capacity keys at the given false-positive rate
+    num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+    num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+    return num_bits, num_hashes
+
+def mix64(x):
+    # splitmix64 finalizer on an unsigned 64-bit int
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK64
+    return x ^ (x >> 31)
+
+def mix64_many(x):
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.01, hash_func=hash):
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.hash_func = hash_func
+        self.num_bits, self.num_hashes = bloom_parameters(capacity, error_rate)
+        self.count = 0
+        self._init_storage()
+
+    def _init_storage(self):
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def _indexes(self, hash_value):
+        h1 = mix64(hash_value & MASK64)
+        h2 = mix64(h1) | 1
+        return [((h1 + i * h2) & MASK64) % self.num_bits for i in range(self.num_hashes)]
+
+    def _indexes_many(self, hash_values):
+        # (n, k) array of bit positions, the same positions _indexes gives for each key
+        h1 = mix64_many(np.asarray(hash_values, dtype=np.int64).view(np.uint64))
+        h2 = mix64_many(h1) | np.uint64(1)
+        steps = np.arange(self.num_hashes, dtype=np.uint64)
+        return (h1[:, None] + steps[None, :] * h2[:, None]) % np.uint64(self.num_bits)
+
+    def add(self, key, hash_value=None):
+        if hash_value is None:
+            hash_value = self.hash_func(key)
+        bits = self.bits
+        for index in self._indexes(hash_value):
+            bits[index >> 3] |= 1 << (index & 7)
+        self.count += 1
+
+    def might_contain(self, key, hash_value=None):
+        if hash_value is None:
+            hash_value = self.hash_func(key)
+        bits = self.bits
+        for index in self._indexes(hash_value):
+            if not bits[index >> 3] & (1 << (index & 7)):
+                return False
+        return True
+
+    __contains__ = might_contain
+
+    def add_many(self, keys, hashes=None):
+        keys, hash_values = prepare_batch(keys, hashes, self.hash_func)
+        indexes = self._indexes_many(hash_values).ravel()
+        view = np.frombuffer(self.bits, dtype=np.uint8)
+        np.bitwise_or.at(view, indexes >> np.uint64(3), np.left_shift(1, indexes & np.uint64(7)).astype(np.uint8))
+        self.count += len(keys)
+
+    def might_contain_many(self, keys, hashes=None):
+        # Boolean array, one entry per key
+        keys, hash_values = prepare_batch(keys, hashes, self.hash_func)
+        indexes = self._indexes_many(hash_values)
+        view = np.frombuffer(self.bits, dtype=np.uint8)
+        bits = (view[indexes >> np.uint64(3)] >> (indexes & np.uint64(7)).astype(np.uint8)) & 1
+        return bits.all(axis=1)
+
+    def fill_ratio(self):
+        return int(np.unpackbits(np.frombuffer(self.bits, dtype=np.uint8)).sum()) / self.num_bits
+
+    def estimated_false_positive_rate(self):
+        # Measured from the set bits, so repeated adds of the same key do not count twice
+        return self.fill_ratio() ** self.num_hashes
+
+class CountingBloomFilter(BloomFilter):
+    # One saturating 8-bit counter per position instead of one bit, so keys can be removed
+    def _init_storage(self):
+        self.counters = bytearray(self.num_bits)
+
+    def add(self, key, hash_value=None):
+        if hash_value is None:
+            hash_value = self.hash_func(key)
+        counters = self.counters
+        for index in self._indexes(hash_value):
+            if counters[index] < 255:
+                counters[index] += 1
+        self.count += 1
+
+    def remove(self, key, hash_value=None):
+        # Only call for keys that were added, or other keys' counters are decremented
+        if hash_value is None:
+            hash_value = self.hash_func(key)
+        counters = self.counters
+        for index in self._indexes(hash_value):
+            if 0 < counters[index] < 255:
+                counters[index] -= 1
+        self.count -= 1
+
+    def might_contain(self, key, hash_value=None):
+        if hash_value is None:
+            hash_value = self.hash_func(key)
+        counters = self.counters
+        for index in self._indexes(hash_value):
+            if not counters[index]:
+                return False
+        return True
+
+    __contains__ = might_contain
+
+    def add_many(self, keys, hashes=None):
+        keys, hash_values = prepare_batch(keys, hashes, self.hash_func)
+        positions, repeats = np.unique(self._indexes_many(hash_values), return_counts=True)
+        view = np.frombuffer(self.counters, dtype=np.uint8)
+        view[positions] = np.minimum(view[positions].astype(np.int64) + repeats, 255)
+        self.count += len(keys)
+
+    def might_contain_many(self, keys, hashes=None):
+        keys, hash_values = prepare_batch(keys, hashes, self.hash_func)
+        view = np.frombuffer(self.counters, dtype=np.uint8)
+        return (view[self._indexes_many(hash_values)] > 0).all(axis=1)
+
+    def fill_ratio(self):
+        return int(np.count_nonzero(np.frombuffer(self.counters, dtype=np.uint8))) / self.num_bits
+
+class BloomFilteredTable:
+    def __init__(self, table, capacity, error_rate=0.01, counting=False):
+        self.table = table
+        self.hash_func = table.hash_func
+        filter_class = CountingBloomFilter if counting else BloomFilter
+        self.filter = filter_class(capacity, error_rate, hash_func=self.hash_func)
+        self.lookups = 0
+        self.avoided = 0
+        self.false_positives = 0
+        for key, _ in table.items():
+            self.filter.add(key)
+
+    def __len__(self):
+        return len(self.table)
+
+    def insert(self, key, value):
+        self.filter.add(key, self.hash_func(key))
+        self.table.insert(key, value)
+
+    def search(self, key):
+        self.lookups += 1
+        if not self.filter.might_contain(key):
+            self.avoided += 1
+            return None
+        value = self.table.search(key)
+        if value is None:
+            self.false_positives += 1
+        return value
+
+    def delete(self, key):
+        removed = self.table.delete(key)
+        if removed and isinstance(self.filter, CountingBloomFilter):
+            self.filter.remove(key)
+        return removed
+
+    def insert_many(self, keys, values, hashes=None):
+        keys, hash_values = prepare_batch(keys, hashes, self.hash_func)
+        self.filter.add_many(keys, hash_values)
+        self.table.insert_many(keys, values, hash_values)
+
+    def search_many(self, keys, hashes=None):
+        keys, hash_values = prepare_batch(keys, hashes, self.hash_func)
+        passed = np.flatnonzero(self.filter.might_contain_many(keys, hash_values))
+        results = [None] * len(keys)
+        found = self.table.search_many([keys[pos] for pos in passed.tolist()], hash_values[passed])
+        for pos, value in zip(passed.tolist(), found):
+            results[pos] = value
+        self.lookups += len(keys)
+        self.avoided += len(keys) - len(passed)
+        self.false_positives += sum(value is None for value in found)
+        return results
+
+    def filter_counters(self):
+        passed = self.lookups - self.avoided
+        return {
+            "lookups": self.lookups,
+            "avoided": self.avoided,
+            "false_positives": self.false_positives,
+            "measured_false_positive_rate": self.false_positives / (self.false_positives + self.avoided)
+            if self.false_positives + self.avoided else 0.0,
+            "expected_false_positive_rate": self.filter.estimated_false_positive_rate(),
+            "table_lookups": passed,
+        }
+
+
+# Example usage
+bloom = BloomFilter(1000, error_rate=0.01)
+print(bloom.num_bits, bloom.num_hashes)   # Output: 9586 7
+bloom.add("Alice Johnson")
+print("Alice Johnson" in bloom)           # Output: True
+print("Bob Smith" in bloom)               # Output: False
+
+# Misses against a 90% full linear-probing table, with and without the filter
+students = [f"Student {n}" for n in range(90000)]
+lookups = students[::2] + [f"Visitor {n}" for n in range(45000)]
+plain = HashTableOpenAddressing(100000)
+for n, key in enumerate(students):
+    plain.insert(key, n)
+filtered = BloomFilteredTable(plain, capacity=90000, error_rate=0.01)
+for name, table in (("plain", plain), ("bloom", filtered)):
+    start = time.perf_counter()
+    for key in lookups:
+        table.search(key)
+    print(name, "search (s):", round(time.perf_counter() - start, 3))
+print(filtered.filter_counters())
+
+# Counting variant: deleted keys stop passing the filter
+counted = BloomFilteredTable(HashTable(1000), capacity=1000, counting=True)
+counted.insert("Alice Johnson", "Math: 85, English: 92, Science: 78")
+counted.delete("Alice Johnson")
+print(counted.filter.might_contain("Alice Johnson"))   # Output: False
+
+# Batch lookups check the filter for the whole batch at once; a seeded hash from
+# Section 2-10 instead of hash() keeps the count the same in every run
+batch = BloomFilteredTable(HashTable(1000, lean=True, hash_func=XXStyleHash(seed=0)), capacity=90000)
+batch.insert_many(students, range(len(students)))
+results = batch.search_many(lookups)
+print(results[:2], results[-1], batch.filter_counters()["avoided"])   # Output: [0, 2] None 44553
+
+"""
+nb.cells.append(new_code_cell(data_code_test2_15))
+
+
+s2_16 = r"""
+## Section 2-16: Frozen Tables with a Minimal Perfect Hash
+
+### Problem
+
+Roster tables are built once and then only read, yet every `HashTable.search` still pays for collision handling: walking a chain or a probe run and comparing keys along the way.
+
+### Solution: `FrozenHashTable` (CHD: Compress, Hash and Displace)
+
+When the key set is fixed we can choose a hash function with **no collisions at all**: a *minimal perfect hash* maps the `n` keys onto the positions `0 .. n-1`, one key per position. Keys and values are then stored in two dense arrays of length `n`, with no empty slots.
+
+Each key gets one 128-bit BLAKE2b digest of its encoded bytes (`encode_field`, Section 2-7), split into three numbers: a bucket `g` (out of `r = n / 2` buckets) and two values `f1`, `f2` in `[0, n)`. Every bucket stores a displacement pair `(d0, d1)`, and a key's position is
+
+```
+position = (f1 + d0 * f2 + d1) mod n
+```
+
+**Build** (`FrozenHashTable(mapping)` or `table.freeze()`):
+
+1. Group the keys by bucket and handle the largest buckets first, while the table is still mostly empty.
+2. For a bucket, try `d0 = 0, 1, 2, ...`. For each `d0`, look for a `d1` that sends every key of the bucket to a free position: first up to 128 random `d1` values, then a NumPy scan of all free positions.
+3. One-key buckets come last and need no search: for a free position `t`, `d0 = 0, d1 = (t - f1) mod n` lands exactly there.
+4. In the rare case that a bucket cannot be placed, retry with the next seed.
+
+**Lookup**: one digest, one position computation, **one** key comparison to reject keys that are not in the set. There is no chain, no probing, and no empty slot.
+
+### Serialization
+
+`frozen.save(path)` writes a small header, the `d0` / `d1` arrays, and the key and value lists. `FrozenHashTable.load(path)` reads them back without hashing or searching anything, so reloading is much faster than building. As in Section 2-7, the file is written to a temporary name and then renamed into place. The digest is keyed by the seed, not by `hash()`, so a file is valid in every process.
+
+`HashTable.freeze()` and `HashTableOpenAddressing.freeze()` build a frozen copy of their current contents.
+
+**Complexity**:
+- Build: O(1) expected random tries per bucket, plus an O(n) scan for the few buckets the random tries cannot place.
+- `search`: O(1) worst case, with one key comparison.
+- Space: `n` keys + `n` values + 5 bytes per bucket (`d0` is one byte, `d1` four), about 2.5 bytes per key for the hash itself.
+
+"""
+nb.cells.append(new_markdown_cell(s2_16))
+
+
+data_code_test2_16 = r"""
+import hashlib
+import os
+import pickle
+import random
+import struct
+import time
+from array import array
+import numpy as np
+
+FROZEN_MAGIC = b"SVPH0001"
+FROZEN_VERSION = 1
+FROZEN_HEADER = struct.Struct("<8sIIQQQ")   # magic, version, reserved, count, buckets, seed
+KEYS_PER_BUCKET = 2       # average bucket size n / r
+RANDOM_TRIES = 128        # random d1 values tried before scanning the free positions
+MAX_SHIFT = 64            # d0 values tried per bucket before giving up on a seed
+MAX_BUILD_ATTEMPTS = 16
+
+def perfect_hash_digest(key, seed):
+    # Two independent 64-bit values per key, the same in every process
+    digest = hashlib.blake2b(encode_field(key), digest_size=16, key=seed.to_bytes(8, "little")).digest()
+    value = int.from_bytes(digest, "little")
+    return value & MASK64, value >> 64
+
+def build_displacements(digests, num_buckets, n, rng):
+    # Returns (positions, d0, d1), or None if some bucket cannot be placed
+    buckets = [[] for _ in range(num_buckets)]
+    f1 = [0] * n
+    f2 = [0] * n
+    for i, (h1, h2) in enumerate(digests):
+        buckets[h1 % num_buckets].append(i)
+        f1[i] = h2 % n
+        f2[i] = (h1 // num_buckets) % n
+    free = np.ones(n, dtype=bool)
+    positions = [0] * n
+    d0 = [0] * num_buckets
+    d1 = [0] * num_buckets
+    order = sorted(range(num_buckets), key=lambda b: -len(buckets[b]))
+    multi = 0
+    for b in order:
+        members = buckets[b]
+        if len(members) < 2:
+            break
+        multi += 1
+        for shift in range(MAX_SHIFT):
+            base = [(f1[i] + shift * f2[i]) % n for i in members]
+            if len(set(base)) < len(base):
+                continue   # two keys collide for every d1
+            # Random d1 values first; scan every free position only if they all fail
+            offset = -1
+            for _ in range(RANDOM_TRIES):
+                candidate = int(rng.random() * n)
+                if all(free[(p + candidate) % n] for p in base):
+                    offset = candidate
+                    break
+            if offset == -1:
+                candidates = (np.flatnonzero(free) - base[0]) % n
+                ok = np.ones(len(candidates), dtype=bool)
+                for p in base[1:]:
+                    ok &= free[(p + candidates) % n]
+                hits = np.flatnonzero(ok)
+                if len(hits) == 0:
+                    continue
+                offset = int(candidates[hits[0]])
+            for i, p in zip(members, base):
+                slot = (p + offset) % n
+                free[slot] = False
+                positions[i] = slot
+            d0[b] = shift
+            d1[b] = offset
+            break
+        else:
+            return None
+    # One-key buckets go straight to the remaining free positions
+    free_slots = np.flatnonzero(free).tolist()
+    for b in order[multi:]:
+        if not buckets[b]:
+            break
+        i = buckets[b][0]
+        slot = free_slots.pop()
+        positions[i] = slot
+        d1[b] = (slot - f1[i]) % n
+    return positions, d0, d1
+
+class FrozenHashTable:
+    def __init__(self, items=(), seed=0):
+        entries = dict(items)
+        self.count = len(entries)
+        n = max(1, self.count)
+        self.num_buckets = max(1, -(-n // KEYS_PER_BUCKET))
+        rng = random.Random(seed)
+        keys = list(entries)
+        for attempt in range(MAX_BUILD_ATTEMPTS):
+            self.seed = seed + attempt
+            result = build_displacements([perfect_hash_digest(k, self.seed) for k in keys],
+                                         self.num_buckets, n, rng)
+            if result is not None:
+                break
+        else:
+            raise ValueError("could not build a perfect hash; are two keys encoded identically?")
+        positions, d0, d1 = result
+        self.d0 = array("B", d0)
+        self.d1 = array("I", d1)
+        self.keys = [None] * n
+        self.values = [None] * n
+        for key, position in zip(keys, positions):
+            self.keys[position] = key
+            self.values[position] = entries[key]
+
+    def __len__(self):
+        return self.count
+
+    def position(self, key):
+        h1, h2 = perfect_hash_digest(key, self.seed)
+        n = len(self.keys)
+        bucket = h1 % self.num_buckets
+        return (h2 % n + self.d0[bucket] * ((h1 // self.num_buckets) % n) + self.d1[bucket]) % n
+
+    def search(self, key):
+        position = self.position(key)
+        if self.count and self.keys[position] == key:
+            return self.values[position]
+        return None
+
+    def items(self):
+        return zip(self.keys[:self.count], self.values[:self.count])
+
+    def save(self, path):
+        header = FROZEN_HEADER.pack(FROZEN_MAGIC, FROZEN_VERSION, 0, self.count, self.num_buckets, self.seed)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(header)
+            f.write(self.d0.tobytes())
+            f.write(self.d1.tobytes())
+            pickle.dump((self.keys, self.values), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            magic, version, _, count, num_buckets, seed = FROZEN_HEADER.unpack(f.read(FROZEN_HEADER.size))
+            if magic != FROZEN_MAGIC or version != FROZEN_VERSION:
+                raise ValueError(f"{path} is not a frozen hash table file")
+            table = cls.__new__(cls)
+            table.count = count
+            table.num_buckets = num_buckets
+            table.seed = seed
+            table.d0 = array("B")
+            table.d0.frombytes(f.read(num_buckets))
+            table.d1 = array("I")
+            table.d1.frombytes(f.read(4 * num_buckets))
+            table.keys, table.values = pickle.load(f)
+        return table
+
+
+# Example usage
+roster = HashTable(10)
+roster.insert("Alice Johnson", "Math: 85, English: 92, Science: 78")
+roster.insert("Bob Smith", "Math: 88, English: 75, Science: 90")
+roster.insert("Charlie Brown", "Math: 90, English: 85, Science: 92")
+frozen = roster.freeze()
+print(frozen.search("Bob Smith"))   # Output: Math: 88, English: 75, Science: 90
+print(frozen.search("Nobody"))      # Output: None
+print(sorted(frozen.position(key) for key, _ in frozen.items()))   # Output: [0, 1, 2]
+
+# Build once, then read many times
+students = {f"Student {n}": f"Math: {n % 100}, English: {(n * 7) % 100}, Science: {(n * 13) % 100}"
+            for n in range(100000)}
+start = time.perf_counter()
+frozen = FrozenHashTable(students)
+print("build (s):", round(time.perf_counter() - start, 3))
+print("buckets:", frozen.num_buckets, "bytes per key for d0/d1:", 5 * frozen.num_buckets / len(frozen))   # Output: buckets: 50000 bytes per key for d0/d1: 2.5
+print(frozen.search("Student 12345"))   # Output: Math: 45, English: 15, Science: 85
+
+frozen.save("roster.svph")
+start = time.perf_counter()
+reloaded = FrozenHashTable.load("roster.svph")
+print("reload (s):", round(time.perf_counter() - start, 3))
+print(reloaded.search("Student 12345"))   # Output: Math: 45, English: 15, Science: 85
+print(all(reloaded.search(key) == value for key, value in students.items()))   # Output: True
+os.remove("roster.svph")
+
+"""
+nb.cells.append(new_code_cell(data_code_test2_16))
+
+
+s2_17 = r"""
+## Section 2-17: Persistent Hash Map (HAMT) with Copy-on-Write Snapshots
+
+### Problem
+
+Readers need a consistent snapshot of the grade table while a writer keeps applying updates. With `HashTable` the only safe snapshot is a deep copy of the whole `table` list and every `Node` chain: O(n) time and memory per snapshot.
+
+### Solution: A Hash Array Mapped Trie
+
+A HAMT is a tree of small nodes. The 64-bit hash of a key is read **5 bits at a time**. At depth `d`, bits `5d .. 5d+4` choose one of 32 children, so `n` keys need about `log32(n)` levels on average (4 for a million keys).
+
+- A node does not store 32 slots. It stores a 32-bit **bitmap** of the children that exist and a packed tuple of just those children. Child `i` sits at position `popcount(bitmap & ((1 << i) - 1))`.
+- A child is a leaf `(hash, key, value)`, another node, or a `CollisionNode` for keys whose full 64-bit hashes are equal.
+
+**Nothing is ever modified in place.** `insert` and `delete` copy only the nodes on the path from the root to the key, about `log32(n)` small tuples, and return a **new map**. Every other node is shared with the old version:
+
+```
+version 1:   root1 ── A ── B ── leaf(Alice: 85)
+                   └─ C ── ...
+version 2:   root2 ── A'── B'── leaf(Alice: 90)     (A', B', root2 are new)
+                   └─ C ── ...                       (C is shared)
+```
+
+Old versions stay valid and unchanged, so a snapshot is just a reference to the current root: **O(1), with no copying**.
+
+### Classes
+
+| Class | Role |
+|-------|------|
+| `PersistentHashMap` | immutable map: `search`, and `insert` / `delete` that return a new map |
+| `SnapshotHashTable` | the mutable `insert` / `search` / `delete` interface for a writer. `snapshot()` returns the current `PersistentHashMap`; `update(pairs)` applies several changes and publishes them as **one** new version |
+
+Publishing a version is a single attribute assignment (`self.current = new_map`), which is atomic in CPython. A reader thread therefore needs no lock: it sees either the old version or the new one, never a half-applied update.
+
+**Complexity** (n entries):
+- `search`: O(log32 n) node visits.
+- `insert` / `delete`: O(log32 n) new nodes.
+- `snapshot`: O(1).
+- Space: each version shares everything except its changed paths.
+
+"""
+nb.cells.append(new_markdown_cell(s2_17))
+
+
+data_code_test2_17 = r"""
+import copy
+import random
+import threading
+import time
+
+HAMT_BITS = 5
+HAMT_MASK = (1 << HAMT_BITS) - 1
+
+class BitmapNode:
+    __slots__ = ("bitmap", "entries")
+
+    def __init__(self, bitmap, entries):
+        self.bitmap = bitmap
+        self.entries = entries   # tuple of leaves (hash, key, value) and child nodes
+
+class CollisionNode:
+    # Leaves whose full 64-bit hashes are equal
+    __slots__ = ("hash", "leaves")
+
+    def __init__(self, hash_value, leaves):
+        self.hash = hash_value
+        self.leaves = leaves
+
+EMPTY_NODE = BitmapNode(0, ())
+
+def entry_hash(entry):
+    return entry[0] if type(entry) is tuple else entry.hash
+
+def merge_entries(a, b, shift):
+    # A subtree holding a and b, two entries with different keys that share a slot at this level
+    hash_a, hash_b = entry_hash(a), entry_hash(b)
+    if hash_a == hash_b:
+        leaves = a.leaves if type(a) is CollisionNode else (a,)
+        return CollisionNode(hash_a, leaves + (b,))
+    index_a = (hash_a >> shift) & HAMT_MASK
+    index_b = (hash_b >> shift) & HAMT_MASK
+    if index_a == index_b:
+        return BitmapNode(1 << index_a, (merge_entries(a, b, shift + HAMT_BITS),))
+    entries = (a, b) if index_a < index_b else (b, a)
+    return BitmapNode((1 << index_a) | (1 << index_b), entries)
+
+def node_insert(node, shift, leaf):
+    # Returns (new node, True if the key was added rather than replaced)
+    hash_value, key = leaf[0], leaf[1]
+    bit = 1 << ((hash_value >> shift) & HAMT_MASK)
+    index = (node.bitmap & (bit - 1)).bit_count()
+    entries = node.entries
+    if not node.bitmap & bit:
+        return BitmapNode(node.bitmap | bit, entries[:index] + (leaf,) + entries[index:]), True
+    entry = entries[index]
+    added = False
+    if type(entry) is tuple:
+        if entry[0] == hash_value and entry[1] == key:
+            new_entry = leaf
+        else:
+            new_entry = merge_entries(entry, leaf, shift + HAMT_BITS)
+            added = True
+    elif type(entry) is CollisionNode:
+        if entry.hash == hash_value:
+            leaves = tuple(l for l in entry.leaves if l[1] != key)
+            added = len(leaves) == len(entry.leaves)
+            new_entry = CollisionNode(hash_value, leaves + (leaf,))
+        else:
+            new_entry = merge_entries(entry, leaf, shift + HAMT_BITS)
+            added = True
+    else:
+        new_entry, added = node_insert(entry, shift + HAMT_BITS, leaf)
+    return BitmapNode(node.bitmap, entries[:index] + (new_entry,) + entries[index + 1:]), added
+
+def node_delete(node, shift, hash_value, key):
+    # Returns the replacement for node: node itself if key is absent, None if nothing is left,
+    # or a single leaf when a subtree shrinks to one entry (so it can move up a level)
+    bit = 1 << ((hash_value >> shift) & HAMT_MASK)
+    if not node.bitmap & bit:
+        return node
+    index = (node.bitmap & (bit - 1)).bit_count()
+    entries = node.entries
+    entry = entries[index]
+    if type(entry) is tuple:
+        if entry[0] != hash_value or entry[1] != key:
+            return node
+        new_entry = None
+    elif type(entry) is CollisionNode:
+        leaves = tuple(l for l in entry.leaves if l[1] != key)
+        if entry.hash != hash_value or len(leaves) == len(entry.leaves):
+            return node
+        new_entry = leaves[0] if len(leaves) == 1 else CollisionNode(entry.hash, leaves)
+    else:
+        new_entry = node_delete(entry, shift + HAMT_BITS, hash_value, key)
+        if new_entry is entry:
+            return node
+    if new_entry is None:
+        if len(entries) == 1:
+            return None
+        remaining = entries[:index] + entries[index + 1:]
+        if len(remaining) == 1 and type(remaining[0]) is tuple and shift > 0:
+            return remaining[0]
+        return BitmapNode(node.bitmap & ~bit, remaining)
+    if len(entries) == 1 and type(new_entry) is tuple and shift > 0:
+        return new_entry
+    return BitmapNode(node.bitmap, entries[:index] + (new_entry,) + entries[index + 1:])
+
+class PersistentHashMap:
+    def __init__(self, hash_func=hash, root=EMPTY_NODE, count=0):
+        self.hash_func = hash_func
+        self.root = root
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def search(self, key):
+        hash_value = self.hash_func(key) & MASK64
+        node = self.root
+        shift = 0
+        while True:
+            bit = 1 << ((hash_value >> shift) & HAMT_MASK)
+            if not node.bitmap & bit:
+                return None
+            entry = node.entries[(node.bitmap & (bit - 1)).bit_count()]
+            if type(entry) is tuple:
+                return entry[2] if entry[0] == hash_value and entry[1] == key else None
+            if type(entry) is CollisionNode:
+                if entry.hash == hash_value:
+                    for leaf in entry.leaves:
+                        if leaf[1] == key:
+                            return leaf[2]
+                return None
+            node = entry
+            shift += HAMT_BITS
+
+    def insert(self, key, value):
+        leaf = (self.hash_func(key) & MASK64, key, value)
+        root, added = node_insert(self.root, 0, leaf)
+        return PersistentHashMap(self.hash_func, root, self.count + added)
+
+    def delete(self, key):
+        root = node_delete(self.root, 0, self.hash_func(key) & MASK64, key)
+        if root is self.root:
+            return self
+        return PersistentHashMap(self.hash_func, root if root is not None else EMPTY_NODE, self.count - 1)
+
+    def items(self):
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            for entry in reversed(node.entries) if type(node) is BitmapNode else node.leaves:
+                if type(entry) is tuple:
+                    yield entry[1], entry[2]
+                else:
+                    stack.append(entry)
+
+    def depth(self):
+        # Levels below the root on the longest path
+        def node_depth(node):
+            if type(node) is not BitmapNode:
+                return 1
+            return 1 + max((node_depth(e) for e in node.entries if type(e) is not tuple), default=0)
+        return node_depth(self.root) - 1
+
+class SnapshotHashTable:
+    # Mutable front for one writer; readers take snapshot() and never need a lock
+    def __init__(self, hash_func=hash):
+        self.current = PersistentHashMap(hash_func)
+        self.version = 0
+
+    def __len__(self):
+        return len(self.current)
+
+    def insert(self, key, value):
+        self.current = self.current.insert(key, value)
+        self.version += 1
+
+    def search(self, key):
+        return self.current.search(key)
+
+    def delete(self, key):
+        new_map = self.current.delete(key)
+        if new_map is self.current:
+            return False
+        self.current = new_map
+        self.version += 1
+        return True
+
+    def update(self, pairs):
+        # Several changes, published as a single new version
+        new_map = self.current
+        for key, value in pairs:
+            new_map = new_map.insert(key, value)
+        self.current = new_map
+        self.version += 1
+
+    def snapshot(self):
+        return self.current
+
+    def items(self):
+        return self.current.items()
+
+
+# Example usage
+grades = SnapshotHashTable()
+grades.insert("Alice Johnson", "Math: 85, English: 92, Science: 78")
+grades.insert("Bob Smith", "Math: 88, English: 75, Science: 90")
+before = grades.snapshot()
+grades.insert("Alice Johnson", "Math: 90, English: 92, Science: 78")
+grades.delete("Bob Smith")
+print(before.search("Alice Johnson"))   # Output: Math: 85, English: 92, Science: 78
+print(grades.search("Alice Johnson"))   # Output: Math: 90, English: 92, Science: 78
+print(len(before), len(grades))         # Output: 2 1
+
+# Snapshot cost: deep copy of a HashTable vs a HAMT reference
+students = [f"Student {n}" for n in range(100000)]
+ht = HashTable(1000, lean=True)
+grades = SnapshotHashTable()
+for n, key in enumerate(students):
+    ht.insert(key, n)
+grades.update((key, n) for n, key in enumerate(students))
+print("longest path:", grades.current.depth())   # Output: longest path: 6
+start = time.perf_counter()
+copy.deepcopy(ht.table)
+print("HashTable deep copy (ms):", round((time.perf_counter() - start) * 1000, 1))
+start = time.perf_counter()
+snap = grades.snapshot()
+print("HAMT snapshot (ms):", round((time.perf_counter() - start) * 1000, 4))
+
+# A reader checks an invariant on snapshots while the writer moves points between students
+points = SnapshotHashTable()
+points.update((key, 100) for key in students[:1000])
+stop = threading.Event()
+violations = []
+
+def reader():
+    while not stop.is_set():
+        snap = points.snapshot()
+        if sum(value for _, value in snap.items()) != 100 * 1000:
+            violations.append(snap)
+
+thread = threading.Thread(target=reader)
+thread.start()
+rng = random.Random(17)
+for _ in range(20000):
+    a, b = rng.sample(students[:1000], 2)
+    amount = rng.randrange(10)
+    points.update([(a, points.search(a) - amount), (b, points.search(b) + amount)])
+stop.set()
+thread.join()
+print("versions:", points.version, "inconsistent snapshots:", len(violations))   # Output: versions: 20001 inconsistent snapshots: 0
+
+"""
+nb.cells.append(new_code_cell(data_code_test2_17))
+
+
+s2_18 = r"""
+## Section 2-18: Hash Join, Group-By and Distinct over HashTable Records
+
+### Problem
+
+Records such as `"Bob Smith" -> "Math: 88, English: 75, Science: 90"` have to be joined with other rosters (which class is each student in?) and aggregated (average Math per class). Written as nested loops, a join of `n` records against `m` records costs O(n * m).
+
+### Solution: Hash-Based Relational Operators
+
+All three operators keep a `HashTable(lean=True)` keyed by the join, group or distinct key, so each input row costs O(1) on average.
+
+| Operator | Build | Probe / output |
+|----------|-------|----------------|
+| `hash_join(build, probe, build_key, probe_key)` | key -> list of build rows | for each probe row, one output pair per matching build row (inner join) |
+| `hash_group_by(rows, group_key, value)` | group -> `[count, sum, min, max]` | `(group, {"count", "sum", "avg", "min", "max"})` per group |
+| `hash_distinct(rows, key=None)` | set of keys seen | every row whose key was not seen before |
+
+Put the **smaller** input on the build side of a join. The probe side is read in batches of `batch_size` rows, and each batch is looked up with one `search_many` call (Section 2-6). `hash_join` yields one list of output pairs per probe batch. With `batched=True` the operators accept inputs that are themselves iterables of batches (lists of rows), e.g. the output of `iter_batches` or of another `hash_join`.
+
+### Grace (Partitioned) Execution under a Memory Budget
+
+`memory_budget` limits the number of build rows (join), groups (group-by) or distinct keys kept in memory. When the in-memory table would grow past it, the operator switches to **grace hash join** style execution:
+
+1. **Partition**: everything not yet processed is written to `partitions` temporary files. This includes the rows or partial aggregates already in memory and the rest of the input (and, for a join, the whole probe side). Each row goes to file `mix64(hash(key)) mod partitions`, so equal keys always land in the same file, and the mix keeps the partition choice independent of the table's bucket choice.
+2. **Process each partition on its own** with the same rule. A partition that is still over the budget is split again, into `max(partitions, ceil(2 * rows / memory_budget))` sub-partitions. The factor 2 leaves room for keys not spreading perfectly evenly. Its rows are already known at that point (for a join, the build rows of the partition; for group-by and distinct, as soon as its table would pass the budget). Each level adds a different salt to the hash before `mix64`. Otherwise all keys of a partition would land in the same sub-partition again.
+
+So no in-memory table ever holds more than `memory_budget` rows, groups or keys. `stats["peak_table_rows"]` reports the largest one. The one exception is a single join key with more than `memory_budget` build rows, which hashing cannot split. `spill` notes when every row of a file has the same key, and such a partition is joined in memory anyway. `MAX_SPILL_DEPTH` caps the number of levels in any case.
+
+Partial group-by aggregates `[count, sum, min, max]` are merged, never recomputed. Pass a `stats` dict to see `partitions` (files written at all levels), `spill_depth`, `spilled_rows` and `peak_table_rows`.
+
+**Complexity**: O(n + m) expected for a join (plus output size), O(n) for group-by and distinct. With partitioning, each spilled row is written and read once per level, and the number of levels is about \( \log_{partitions}(n / memory\_budget) \).
+
+"""
+nb.cells.append(new_markdown_cell(s2_18))
+
+
+data_code_test2_18 = r"""
+import itertools
+import pickle
+import tempfile
+
+def parse_grades(value):
+    # "Math: 85, English: 92, Science: 78" -> {"Math": 85, "English": 92, "Science": 78}
+    grades = {}
+    for part in value.split(","):
+        subject, score = part.split(":")
+        grades[subject.strip()] = int(score)
+    return grades
+
+def iter_batches(rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+MAX_SPILL_DEPTH = 16  # levels of re-partitioning before an oversized partition is processed anyway
+
+def partition_of(key, partitions, level=0):
+    # A different salt per level, so a partition that is split again spreads over all its sub-partitions
+    return mix64((hash(key) + level * 0x9E3779B97F4A7C15) & MASK64) % partitions
+
+def sub_partitions(rows, memory_budget, partitions):
+    # Twice the minimum, so most sub-partitions fit even though keys do not spread perfectly evenly
+    return max(2, partitions, -(-2 * rows // memory_budget))
+
+def note_table_size(stats, size):
+    stats["peak_table_rows"] = max(stats["peak_table_rows"], size)
+
+class SpillFile:
+    # Rows appended in pickled batches to an anonymous temporary file, then read back once
+    def __init__(self, batch_size=1024):
+        self.file = tempfile.TemporaryFile()
+        self.buffer = []
+        self.batch_size = batch_size
+        self.rows = 0
+        self.first_key = None
+        self.one_key = True   # every row so far has the same key (set by spill)
+
+    def append(self, row):
+        self.buffer.append(row)
+        self.rows += 1
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            pickle.dump(self.buffer, self.file, protocol=pickle.HIGHEST_PROTOCOL)
+            self.buffer = []
+
+    def __iter__(self):
+        self.flush()
+        self.file.seek(0)
+        while True:
+            try:
+                batch = pickle.load(self.file)
+            except EOFError:
+                break
+            yield from batch
+        self.file.close()
+
+def spill(pairs, partitions, stats, level=0):
+    # Writes (key, payload) pairs to partitions files chosen by key
+    files = [SpillFile() for _ in range(partitions)]
+    for key, payload in pairs:
+        f = files[partition_of(key, partitions, level)]
+        if f.rows == 0:
+            f.first_key = key
+        elif f.one_key and key != f.first_key:
+            f.one_key = False
+        f.append((key, payload))
+    stats["partitions"] += partitions
+    stats["spill_depth"] = max(stats["spill_depth"], level + 1)
+    stats["spilled_rows"] += sum(f.rows for f in files)
+    return files
+
+def flat_rows(rows, batched):
+    return itertools.chain.from_iterable(rows) if batched else iter(rows)
+
+# Hash join
+
+def probe_table(table, probe_rows, probe_key, batch_size, stats):
+    for batch in iter_batches(probe_rows, batch_size):
+        stats["probe_rows"] += len(batch)
+        output = []
+        for row, matches in zip(batch, table.search_many([probe_key(row) for row in batch])):
+            if matches is not None:
+                for build_row in matches:
+                    output.append((build_row, row))
+        stats["output_rows"] += len(output)
+        if output:
+            yield output
+
+def build_table(pairs):
+    table = HashTable(1024, lean=True)
+    for key, row in pairs:
+        matches = table.search(key)
+        if matches is None:
+            table.insert(key, [row])
+        else:
+            matches.append(row)
+    return table
+
+def join_partition(build_file, probe_file, probe_key, memory_budget, partitions, batch_size, stats, level):
+    if build_file.rows > memory_budget and not build_file.one_key and level <= MAX_SPILL_DEPTH:
+        # Still over budget: split both sides again with the next level's salt (one heavy key cannot be split)
+        parts = sub_partitions(build_file.rows, memory_budget, partitions)
+        build_files = spill(build_file, parts, stats, level)
+        probe_files = spill(probe_file, parts, stats, level)
+        for sub_build, sub_probe in zip(build_files, probe_files):
+            yield from join_partition(sub_build, sub_probe, probe_key, memory_budget, partitions, batch_size,
+                                      stats, level + 1)
+        return
+    table = build_table(build_file)
+    note_table_size(stats, build_file.rows)
+    yield from probe_table(table, (r for _, r in probe_file), probe_key, batch_size, stats)
+
+def hash_join(build, probe, build_key, probe_key, memory_budget=None, partitions=8, batch_size=1024,
+              batched=False, stats=None):
+    # Inner join; yields lists of (build_row, probe_row) pairs, one list per probe batch
+    stats = {} if stats is None else stats
+    stats.update(build_rows=0, probe_rows=0, output_rows=0, partitions=0, spilled_rows=0, spill_depth=0,
+                 peak_table_rows=0)
+    build_rows = flat_rows(build, batched)
+    probe_rows = flat_rows(probe, batched)
+    table = HashTable(1024, lean=True)
+    for row in build_rows:
+        key = build_key(row)
+        stats["build_rows"] += 1
+        if memory_budget is not None and stats["build_rows"] > memory_budget:
+            # Too big: spill the table and the rest of both inputs, then join partition by partition
+            note_table_size(stats, memory_budget)
+            in_memory = ((k, r) for k, matches in table.items() for r in matches)
+            rest = ((build_key(r), r) for r in build_rows)
+            build_files = spill(itertools.chain(in_memory, [(key, row)], rest), partitions, stats)
+            stats["build_rows"] = sum(f.rows for f in build_files)
+            probe_files = spill(((probe_key(r), r) for r in probe_rows), partitions, stats)
+            table = None
+            for build_file, probe_file in zip(build_files, probe_files):
+                yield from join_partition(build_file, probe_file, probe_key, memory_budget, partitions, batch_size,
+                                          stats, 1)
+            return
+        matches = table.search(key)
+        if matches is None:
+            table.insert(key, [row])
+        else:
+            matches.append(row)
+    note_table_size(stats, stats["build_rows"])
+    yield from probe_table(table, probe_rows, probe_key, batch_size, stats)
+
+# Group-by
+
+def merge_aggregate(state, other):
+    state[0] += other[0]
+    state[1] += other[1]
+    state[2] = min(state[2], other[2])
+    state[3] = max(state[3], other[3])
+
+def finish_aggregates(table):
+    for group, (count, total, low, high) in table.items():
+        yield group, {"count": count, "sum": total, "avg": total / count, "min": low, "max": high}
+
+def aggregate_partition(pairs, memory_budget, partitions, stats, level):
+    # (group, [count, sum, min, max]) partial aggregates -> finished groups, holding at most memory_budget groups
+    table = HashTable(1024, lean=True)
+    pairs = iter(pairs)
+    for group, partial in pairs:
+        state = table.search(group)
+        if state is not None:
+            merge_aggregate(state, partial)
+        elif memory_budget is not None and len(table) >= memory_budget and level <= MAX_SPILL_DEPTH:
+            # Too many groups: spill the partial aggregates and the rest, then aggregate each partition
+            note_table_size(stats, len(table))
+            files = spill(itertools.chain(table.items(), [(group, partial)], pairs), partitions, stats, level)
+            table = None
+            for f in files:
+                parts = sub_partitions(f.rows, memory_budget, partitions)
+                yield from aggregate_partition(f, memory_budget, parts, stats, level + 1)
+            return
+        else:
+            table.insert(group, list(partial))
+    note_table_size(stats, len(table))
+    yield from finish_aggregates(table)
+
+def hash_group_by(rows, group_key, value, memory_budget=None, partitions=8, batched=False, stats=None):
+    # Yields (group, {"count", "sum", "avg", "min", "max"}) for every group
+    stats = {} if stats is None else stats
+    stats.update(rows=0, partitions=0, spilled_rows=0, spill_depth=0, peak_table_rows=0)
+
+    def one_row_aggregates():
+        for row in flat_rows(rows, batched):
+            stats["rows"] += 1
+            v = value(row)
+            yield group_key(row), (1, v, v, v)
+
+    yield from aggregate_partition(one_row_aggregates(), memory_budget, partitions, stats, 0)
+
+# Distinct
+
+def distinct_partition(pairs, memory_budget, partitions, stats, level):
+    # (key, row) pairs -> rows whose key was not seen before, holding at most memory_budget keys
+    seen = HashTable(1024, lean=True)
+    pairs = iter(pairs)
+    for k, row in pairs:
+        if seen.search(k) is not None:
+            continue
+        if memory_budget is not None and len(seen) >= memory_budget and level <= MAX_SPILL_DEPTH:
+            # Keys already in memory still filter the rest; unseen rows are deduplicated per partition
+            def unseen():
+                yield k, row
+                for rk, r in pairs:
+                    if seen.search(rk) is None:
+                        yield rk, r
+            files = spill(unseen(), partitions, stats, level)
+            note_table_size(stats, len(seen))
+            seen = None
+            for f in files:
+                parts = sub_partitions(f.rows, memory_budget, partitions)
+                yield from distinct_partition(f, memory_budget, parts, stats, level + 1)
+            return
+        seen.insert(k, True)
+        stats["distinct"] += 1
+        yield row
+    note_table_size(stats, len(seen))
+
+def hash_distinct(rows, key=None, memory_budget=None, partitions=8, batched=False, stats=None):
+    # Yields each row whose key (by default the row itself) has not been seen before
+    stats = {} if stats is None else stats
+    stats.update(rows=0, distinct=0, partitions=0, spilled_rows=0, spill_depth=0, peak_table_rows=0)
+
+    def keyed_rows():
+        for row in flat_rows(rows, batched):
+            stats["rows"] += 1
+            yield (row if key is None else key(row)), row
+
+    yield from distinct_partition(keyed_rows(), memory_budget, partitions, stats, 0)
+
+
+# Example usage
+grades = HashTable(10)
+grades.insert("Alice Johnson", "Math: 85, English: 92, Science: 78")
+grades.insert("Bob Smith", "Math: 88, English: 75, Science: 90")
+grades.insert("Charlie Brown", "Math: 90, English: 85, Science: 92")
+classes = [("Alice Johnson", "Room 101"), ("Bob Smith", "Room 102"), ("Charlie Brown", "Room 101"),
+           ("Dana White", "Room 103")]
+
+# Which room is each student in, with their grades? (build on the smaller side)
+for batch in hash_join(grades.items(), classes, build_key=lambda r: r[0], probe_key=lambda r: r[0]):
+    for (name, grade), (_, room) in batch:
+        print(name, room, grade)
+# Output:
+# Alice Johnson Room 101 Math: 85, English: 92, Science: 78
+# Bob Smith Room 102 Math: 88, English: 75, Science: 90
+# Charlie Brown Room 101 Math: 90, English: 85, Science: 92
+
+# Average Math grade per room
+joined = hash_join(grades.items(), classes, lambda r: r[0], lambda r: r[0])
+for room, agg in sorted(hash_group_by(joined, lambda pair: pair[1][1],
+                                      lambda pair: parse_grades(pair[0][1])["Math"], batched=True)):
+    print(room, agg)
+# Output:
+# Room 101 {'count': 2, 'sum': 175, 'avg': 87.5, 'min': 85, 'max': 90}
+# Room 102 {'count': 1, 'sum': 88, 'avg': 88.0, 'min': 88, 'max': 88}
+
+print(list(hash_distinct(room for _, room in classes)))   # Output: ['Room 101', 'Room 102', 'Room 103']
+
+# Large inputs: the same join in memory and with a build-side budget of 5,000 rows
+roster = [(f"Student {n}", f"Math: {n % 100}, English: {(n * 7) % 100}, Science: {(n * 13) % 100}")
+          for n in range(50000)]
+rooms = [(f"Student {n}", f"Room {n % 40}") for n in range(0, 100000, 2)]
+for budget in (None, 5000):
+    stats = {}
+    start = time.perf_counter()
+    per_room = dict(hash_group_by(hash_join(roster, rooms, lambda r: r[0], lambda r: r[0],
+                                            memory_budget=budget, stats=stats),
+                                  lambda pair: pair[1][1], lambda pair: parse_grades(pair[0][1])["Math"],
+                                  batched=True))
+    print("budget:", budget, "seconds:", round(time.perf_counter() - start, 3), stats)
+    print(per_room["Room 8"])
+# Output (both runs): {'count': 1250, 'sum': 60000, 'avg': 48.0, 'min': 8, 'max': 88}
+
+# Group-by and distinct with more groups than the budget
+stats = {}
+groups = dict(hash_group_by(range(100000), lambda n: n % 30000, lambda n: n, memory_budget=1000, stats=stats))
+print(len(groups), groups[7], stats["peak_table_rows"] <= 1000)
+# Output: 30000 {'count': 4, 'sum': 180028, 'avg': 45007.0, 'min': 7, 'max': 90007} True
+stats = {}
+print(len(list(hash_distinct((n % 30000 for n in range(100000)), memory_budget=1000, stats=stats))),
+      stats["peak_table_rows"] <= 1000)   # Output: 30000 True
+
+"""
+nb.cells.append(new_code_cell(data_code_test2_18))
+
+
+s2_19 = r"""
+## Section 2-19: Columnar Grade Storage Instead of Grade Strings
+
+### Problem
+
+Every value in the examples so far is a string like `"Math: 85, English: 92, Science: 78"`. That is 80+ bytes per record for three small numbers. Every numeric question ("who has Math >= 90?", "what is the average Science grade?") has to visit every record and parse its string again.
+
+### Solution: `ColumnarGradeTable`
+
+Parse each value **once**, when it is inserted, and store the numbers in columns indexed by the **slot id** of the compact Robin Hood table (Section 2-4):
+
+| Array | Contents per slot |
+|-------|-------------------|
+| `keys`, `hashes` | name and cached hash, as in compact mode |
+| `columns[subject]` | one NumPy `int16` array per subject: 2 bytes per grade |
+| `occupied` | NumPy boolean mask of the slots in use |
+
+There is no per-record value object at all. `ColumnarGradeTable` is a subclass of `HashTableOpenAddressing` and overrides only the slot-access helpers (`_get_entry`, `_set_entry`, `_move_slot`, `_clear_slot`, `_value_at`). When a Robin Hood insert swaps two entries, or a backward-shift delete moves an entry, the grades move between columns at the same time as the key. The table doubles its size when it passes `max_load_factor`. A grade that does not fit the column type (`np.iinfo(dtype)`), or that is not a whole number for an integer column (`89.5` would be truncated to 89), raises `ValueError` before any slot is written, so a rejected insert leaves no half-written entry.
+
+- `insert(name, value)` accepts the usual grade string (parsed with `parse_grades`, Section 2-18) or a `{subject: grade}` dict.
+- `search(name)` still returns the **full record** as the original string, rebuilt on demand. `record(name)` returns a dict.
+- Scans and aggregates run on whole columns with NumPy, with no parsing and no per-record Python work:
+  - `where(Math=(90, None), Science=(None, 49))` returns the names with `90 <= Math` and `Science <= 49` (inclusive bounds, `None` = unbounded).
+  - `aggregate("Math")` returns `count`, `sum`, `avg`, `min`, `max`.
+  - `column("Math")` returns the grades of all records.
+
+**Complexity**: `insert` / `search` / `delete` O(1) average, as in Section 2-3. Scans and aggregates run in O(size) NumPy time, about two orders of magnitude faster than parsing strings in a loop. Storage is 8 (key pointer) + 8 (hash) + 2 per subject + 1 bytes per slot.
+
+"""
+nb.cells.append(new_markdown_cell(s2_19))
+
+
+data_code_test2_19 = r"""
+import numbers
+import time
+import tracemalloc
+from array import array
+import numpy as np
+
+class ColumnarGradeTable(HashTableOpenAddressing):
+    # Compact Robin Hood table whose values live in one int array per subject, indexed by slot
+    def __init__(self, size=16, subjects=("Math", "English", "Science"), dtype=np.int16,
+                 max_load_factor=0.9, hash_func=hash):
+        super().__init__(size, mode="robin_hood", compact=True, hash_func=hash_func)
+        self.subjects = tuple(subjects)
+        self.dtype = dtype
+        # Grades are checked against the column type before any slot is written
+        self.whole_grades = np.issubdtype(dtype, np.integer)
+        info = np.iinfo(dtype) if self.whole_grades else np.finfo(dtype)
+        self.grade_min, self.grade_max = info.min, info.max
+        self.max_load_factor = max_load_factor
+        self._allocate_columns()
+
+    def _allocate_columns(self):
+        self.values = None   # replaced by the columns
+        self.columns = {subject: np.zeros(self.size, dtype=self.dtype) for subject in self.subjects}
+        self.column_list = [self.columns[subject] for subject in self.subjects]
+        self.occupied = np.zeros(self.size, dtype=bool)
+
+    def _parse(self, value):
+        grades = parse_grades(value) if isinstance(value, str) else dict(value)
+        if set(grades) != set(self.subjects):
+            raise ValueError(f"expected grades for {', '.join(self.subjects)}, got {', '.join(grades)}")
+        for subject in self.subjects:
+            grade = grades[subject]
+            if not isinstance(grade, numbers.Real):
+                raise ValueError(f"{subject} grade {grade!r} is not a number")
+            if not self.grade_min <= grade <= self.grade_max:
+                raise ValueError(f"{subject} grade {grade} does not fit in {np.dtype(self.dtype).name}")
+            # An integer column would silently truncate 89.5 to 89
+            if self.whole_grades and int(grade) != grade:
+                raise ValueError(f"{subject} grade {grade} is not a whole number")
+        return tuple(grades[subject] for subject in self.subjects)
+
+    def _resize(self, new_size):
+        entries = [self._get_entry(slot) for slot in np.flatnonzero(self.occupied).tolist()]
+        self.size = new_size
+        self.keys = [None] * new_size
+        self.hashes = array("q", bytes(8 * new_size))
+        self.count = 0
+        self._allocate_columns()
+        for key, grades, hash_value in entries:
+            self._insert_hashed(key, grades, hash_value)
+
+    # Slot access: the grades travel with the key whenever an entry moves
+
+    def _get_entry(self, slot):
+        return (self.keys[slot], tuple(int(column[slot]) for column in self.column_list), self.hashes[slot])
+
+    def _set_entry(self, slot, entry):
+        self.keys[slot], grades, self.hashes[slot] = entry
+        for column, grade in zip(self.column_list, grades):
+            column[slot] = grade
+        self.occupied[slot] = True
+
+    def _clear_slot(self, slot):
+        self.keys[slot] = None
+        self.hashes[slot] = 0
+        self.occupied[slot] = False
+
+    def _move_slot(self, dst, src):
+        self.keys[dst] = self.keys[src]
+        self.hashes[dst] = self.hashes[src]
+        for column in self.column_list:
+            column[dst] = column[src]
+        self.occupied[dst] = True
+        self._clear_slot(src)
+
+    def _value_at(self, slot):
+        return ", ".join(f"{subject}: {column[slot]}" for subject, column in zip(self.subjects, self.column_list))
+
+    # Public operations
+
+    def insert(self, key, value):
+        grades = self._parse(value)
+        if self.count + 1 > self.max_load_factor * self.size:
+            self._resize(2 * self.size)
+        return self._insert_hashed(key, grades, self.hash_func(key))
+
+    def insert_many(self, keys, values, hashes=None):
+        grades = [self._parse(value) for value in values]
+        new_size = self.size
+        while self.count + len(grades) > self.max_load_factor * new_size:
+            new_size *= 2
+        if new_size != self.size:
+            self._resize(new_size)
+        super().insert_many(keys, grades, hashes)
+
+    def record(self, key):
+        slot = self._find_slot(key)
+        if slot == -1:
+            return None
+        return {subject: int(column[slot]) for subject, column in zip(self.subjects, self.column_list)}
+
+    def items(self):
+        for slot in np.flatnonzero(self.occupied).tolist():
+            yield self.keys[slot], self._value_at(slot)
+
+    # Vectorized scans over the occupied slots
+
+    def column(self, subject):
+        return self.columns[subject][self.occupied]
+
+    def mask(self, **bounds):
+        # Boolean mask over slots: subject=(low, high), inclusive, None for no bound
+        mask = self.occupied.copy()
+        for subject, (low, high) in bounds.items():
+            column = self.columns[subject]
+            if low is not None:
+                mask &= column >= low
+            if high is not None:
+                mask &= column <= high
+        return mask
+
+    def where(self, **bounds):
+        return [self.keys[slot] for slot in np.flatnonzero(self.mask(**bounds)).tolist()]
+
+    def aggregate(self, subject, **bounds):
+        values = self.columns[subject][self.mask(**bounds)]
+        if len(values) == 0:
+            return {"count": 0, "sum": 0, "avg": None, "min": None, "max": None}
+        total = int(values.sum(dtype=np.int64))
+        return {"count": len(values), "sum": total, "avg": total / len(values),
+                "min": int(values.min()), "max": int(values.max())}
+
+
+# Example usage
+grades = ColumnarGradeTable()
+grades.insert("Alice Johnson", "Math: 85, English: 92, Science: 78")
+grades.insert("Bob Smith", "Math: 88, English: 75, Science: 90")
+grades.insert("Charlie Brown", {"Math": 90, "English": 85, "Science": 92})
+print(grades.search("Charlie Brown"))            # Output: Math: 90, English: 85, Science: 92
+print(grades.record("Bob Smith"))                # Output: {'Math': 88, 'English': 75, 'Science': 90}
+print(sorted(grades.where(Math=(88, None))))     # Output: ['Bob Smith', 'Charlie Brown']
+print(grades.aggregate("Science"))               # Output: {'count': 3, 'sum': 260, 'avg': 86.66666666666667, 'min': 78, 'max': 92}
+try:
+    grades.insert("Dana Scully", {"Math": 89.5, "English": 80, "Science": 95})
+except ValueError as error:
+    print(error, len(grades))                    # Output: Math grade 89.5 is not a whole number 3
+
+# 100,000 records: memory per record and a numeric query, strings vs columns
+# (the value strings are created inside the measurement, as when loading them from a file)
+names = [f"Student {n}" for n in range(100000)]
+
+def grade_string(n):
+    return f"Math: {n % 100}, English: {(n * 7) % 100}, Science: {(n * 13) % 100}"
+
+tracemalloc.start()
+string_table = HashTableOpenAddressing(1 << 17, mode="robin_hood", compact=True)
+for n, name in enumerate(names):
+    string_table.insert(name, grade_string(n))
+string_bytes = tracemalloc.get_traced_memory()[0]
+tracemalloc.stop()
+tracemalloc.start()
+columnar = ColumnarGradeTable(1 << 17)
+for n, name in enumerate(names):
+    columnar.insert(name, grade_string(n))
+columnar_bytes = tracemalloc.get_traced_memory()[0]
+tracemalloc.stop()
+print("bytes per record, strings:", round(string_bytes / len(names)), "columns:", round(columnar_bytes / len(names)))
+
+start = time.perf_counter()
+slow = [name for name, value in string_table.items()
+        if parse_grades(value)["Math"] >= 90 and parse_grades(value)["Science"] <= 49]
+parse_time = time.perf_counter() - start
+start = time.perf_counter()
+fast = columnar.where(Math=(90, None), Science=(None, 49))
+scan_time = time.perf_counter() - start
+print(len(slow), len(fast), sorted(slow) == sorted(fast))   # Output: 4000 4000 True
+print(f"parse every string: {parse_time * 1000:.1f} ms, column scan: {scan_time * 1000:.1f} ms")
+print(columnar.aggregate("Math", Science=(90, None)))
+# Output: {'count': 10000, 'sum': 465000, 'avg': 46.5, 'min': 7, 'max': 92}
+
+"""
+nb.cells.append(new_code_cell(data_code_test2_19))
+
+
+s2_20 = r"""
+## Section 2-20: Radix-Trie Prefix Index for Name-Prefix Queries
+
+### Problem
+
+`HashTable.search` only answers exact-key questions. "All students whose name starts with 'Al'" has to scan every bucket, like `print_hash_table` does: O(n) even when only a handful of names match. Hashing destroys key order by design, so range questions ("names from 'Bo' to 'Ch'") have the same problem.
+
+### Solution: A Secondary Radix-Trie Index
+
+`PrefixIndexedHashTable` is a `HashTable` that also keeps every key in a **radix trie** (a compressed prefix tree) and updates it in `insert`, `insert_many` and `delete`. Keys must be `str`: any other key is rejected with `TypeError` before the hash table is changed, so the table and the trie always hold the same keys.
+
+In a radix trie each edge carries a whole string, not one character. A chain of nodes with one child each is merged into a single edge, so the trie has at most about `2n` nodes for `n` keys:
+
+```
+(root)
+ ├─ "Al" ─┬─ "ice Johnson"  *
+ │        └─ "an Turing"    *
+ ├─ "Bob Smith"             *
+ └─ "Charlie Brown"         *
+```
+
+(`*` marks a node where a key ends.)
+
+- **Insert**: follow the matching edges; where a new key diverges in the middle of an edge, split that edge in two.
+- **Delete**: clear the key's end mark, remove a node left without keys or children, and merge a node that has one child back into one edge.
+- **Prefix query** `keys_with_prefix("Al")`: walk down `len(prefix)` characters, then list the subtree. Children are visited in sorted order, so keys come out **sorted**.
+- **Range query** `keys_in_range("Bo", "Ch")` (`low <= key < high`): skip every subtree that lies entirely below `low`, then stream keys in order and stop at the first key `>= high`.
+
+Both queries are **generators**: they yield one key at a time, so a huge result set is never built as a list and `itertools.islice` can stop early. `items_with_prefix` / `items_in_range` pair each key with its value from the hash table.
+
+**Complexity** (`p` = prefix length, `k` = results): prefix query O(p + k) node visits. Range query O(depth + k), plus the sibling subtrees skipped on the way down. Insert / delete O(key length). Exact lookups still go through the hash table in O(1).
+
+"""
+nb.cells.append(new_markdown_cell(s2_20))
+
+
+data_code_test2_20 = r"""
+import itertools
+import random
+import time
+
+class TrieNode:
+    __slots__ = ("label", "children", "terminal")
+
+    def __init__(self, label="", terminal=False):
+        self.label = label        # the string on the edge from the parent
+        self.children = {}        # first character of the child's label -> child
+        self.terminal = terminal  # a key ends here
+
+def common_prefix_length(a, b):
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+class RadixTrie:
+    def __init__(self):
+        self.root = TrieNode()
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def insert(self, key):
+        node = self.root
+        rest = key
+        while rest:
+            child = node.children.get(rest[0])
+            if child is None:
+                node.children[rest[0]] = TrieNode(rest, terminal=True)
+                self.count += 1
+                return
+            common = common_prefix_length(rest, child.label)
+            if common < len(child.label):
+                # Split the edge: node -> middle (common part) -> child (remaining label)
+                middle = TrieNode(child.label[:common])
+                child.label = child.label[common:]
+                middle.children[child.label[0]] = child
+                node.children[rest[0]] = middle
+                child = middle
+            node = child
+            rest = rest[common:]
+        if not node.terminal:
+            node.terminal = True
+            self.count += 1
+
+    def delete(self, key):
+        path = [self.root]
+        rest = key
+        while rest:
+            child = path[-1].children.get(rest[0])
+            if child is None or not rest.startswith(child.label):
+                return False
+            rest = rest[len(child.label):]
+            path.append(child)
+        node = path[-1]
+        if not node.terminal:
+            return False
+        node.terminal = False
+        self.count -= 1
+        # Remove the node if it is now empty, then merge a single-child node into its edge
+        if node is not self.root and not node.children:
+            parent = path[-2]
+            del parent.children[node.label[0]]
+            node = parent
+            path.pop()
+        if node is not self.root and not node.terminal and len(node.children) == 1:
+            (child,) = node.children.values()
+            child.label = node.label + child.label
+            path[-2].children[child.label[0]] = child
+        return True
+
+    def _walk(self, node, path, low=None):
+        # Keys under node (whose label ends at path) in sorted order, starting at low
+        stack = [(node, path, low)]
+        while stack:
+            node, path, low = stack.pop()
+            if node.terminal and (low is None or path >= low):
+                yield path
+            children = []
+            for first in sorted(node.children):
+                child = node.children[first]
+                child_path = path + child.label
+                child_low = low
+                if low is not None:
+                    bound = low[:len(child_path)]
+                    if child_path < bound:
+                        continue              # the whole subtree is below low
+                    if child_path > bound or len(child_path) >= len(low):
+                        child_low = None      # the whole subtree is at or above low
+                children.append((child, child_path, child_low))
+            stack.extend(reversed(children))
+
+    def keys_with_prefix(self, prefix):
+        node = self.root
+        path = ""
+        rest = prefix
+        while rest:
+            child = node.children.get(rest[0])
+            if child is None:
+                return
+            if child.label.startswith(rest):
+                node, path, rest = child, path + child.label, ""
+            elif rest.startswith(child.label):
+                node, path, rest = child, path + child.label, rest[len(child.label):]
+            else:
+                return
+        yield from self._walk(node, path)
+
+    def keys_in_range(self, low=None, high=None):
+        # low <= key < high; None leaves that side open
+        for key in self._walk(self.root, "", low or None):
+            if high is not None and key >= high:
+                return
+            yield key
+
+class PrefixIndexedHashTable(HashTable):
+    # HashTable plus a radix-trie index over its keys, updated on every insert and delete
+    def __init__(self, size, **kwargs):
+        super().__init__(size, **kwargs)
+        self.index = RadixTrie()
+
+    @staticmethod
+    def _check_key(key):
+        # Checked before the table is touched, so the table and the index never disagree
+        if not isinstance(key, str):
+            raise TypeError(f"prefix-indexed keys must be str, not {type(key).__name__}")
+
+    def insert(self, key, value):
+        self._check_key(key)
+        result = super().insert(key, value)
+        self.index.insert(key)
+        return result
+
+    def insert_many(self, keys, values, hashes=None):
+        keys = list(keys)
+        for key in keys:
+            self._check_key(key)
+        super().insert_many(keys, values, hashes)
+        for key in keys:
+            self.index.insert(key)
+
+    def delete(self, key):
+        removed = super().delete(key)
+        # Without lean=True a key may have been inserted more than once
+        if removed and self._find_node(key) is None:
+            self.index.delete(key)
+        return removed
+
+    def keys_with_prefix(self, prefix):
+        return self.index.keys_with_prefix(prefix)
+
+    def keys_in_range(self, low=None, high=None):
+        return self.index.keys_in_range(low, high)
+
+    def items_with_prefix(self, prefix):
+        for key in self.index.keys_with_prefix(prefix):
+            yield key, self.search(key)
+
+    def items_in_range(self, low=None, high=None):
+        for key in self.index.keys_in_range(low, high):
+            yield key, self.search(key)
+
+
+# Example usage
+ht = PrefixIndexedHashTable(10, lean=True)
+ht.insert("Alice Johnson", "Math: 85, English: 92, Science: 78")
+ht.insert("Alan Turing", "Math: 99, English: 80, Science: 97")
+ht.insert("Bob Smith", "Math: 88, English: 75, Science: 90")
+ht.insert("Charlie Brown", "Math: 90, English: 85, Science: 92")
+print(list(ht.keys_with_prefix("Al")))       # Output: ['Alan Turing', 'Alice Johnson']
+print(list(ht.keys_in_range("B", "Ch")))     # Output: ['Bob Smith']
+ht.delete("Alan Turing")
+print(list(ht.items_with_prefix("Al")))      # Output: [('Alice Johnson', 'Math: 85, English: 92, Science: 78')]
+try:
+    ht.insert(0, "Math: 70, English: 70, Science: 70")
+except TypeError as error:
+    print(error, len(ht))                    # Output: prefix-indexed keys must be str, not int 3
+
+# 100,000 random names: prefix query through the index vs scanning every bucket
+rng = random.Random(20)
+first = ["Alice", "Alan", "Bob", "Charlie", "Dana", "Eve", "Frank", "Grace", "Heidi", "Ivan"]
+last = ["Johnson", "Smith", "Brown", "Turing", "Lovelace", "Hopper", "Knuth", "Liskov"]
+roster = PrefixIndexedHashTable(1024, lean=True)
+for n in range(100000):
+    roster.insert(f"{rng.choice(first)} {rng.choice(last)} {n:06d}", n)
+
+start = time.perf_counter()
+scanned = sorted(key for key, _ in roster.items() if key.startswith("Alan Knuth 01"))
+scan_time = time.perf_counter() - start
+start = time.perf_counter()
+indexed = list(roster.keys_with_prefix("Alan Knuth 01"))
+index_time = time.perf_counter() - start
+print(len(indexed), indexed == scanned)   # Output: 98 True
+print(f"bucket scan: {scan_time * 1000:.1f} ms, trie: {index_time * 1000:.3f} ms")
+
+# Streaming: the first few of a large result set, without building the whole list
+print(list(itertools.islice(roster.keys_in_range("Bob", "Charlie"), 3)))
+# Output: ['Bob Brown 000030', 'Bob Brown 000124', 'Bob Brown 000141']
+
+"""
+nb.cells.append(new_code_cell(data_code_test2_20))
+
+
 
 
 
 s3 = """
 # Section 3: Comprehensive Guide to String Data Structure and Algorithms
 
-## Section 3-1: Introduction to String Data Structure
+## Section 3-1: Introduction to String Data Structure
+
+### Basic Concepts
+
+Strings in Python are sequences of characters enclosed within single, double, or triple quotes. Strings are immutable, meaning once created, they cannot be modified.
+
+**Popular Representations of Characters:**
+
+1. **ASCII (American Standard Code for Information Interchange)**:
+   - Represents characters using 1 byte.
+   - Example: 'A' = 65, 'a' = 97.
+
+2. **Unicode**:
+   - Represents characters using UTF-8 (1 to 4 bytes) or UTF-16 (2 to 4 bytes).
+   - Covers over 110,000 characters across various scripts and symbols.
+
+### Applications of Strings
+
+Strings are fundamental in various applications, including text processing, data representation, and communication protocols. They are used extensively in file handling, user inputs, and display messages.
+
+### String Operations
+
+1. **Basic Operations**:
+   - Concatenation: `greet = greeting + name`
+   - Comparison: `==, >, <`
+   - Indexing and Slicing: 
+     ```python
+     s = "abc"
+     s[0], s[1], s[2]
+     s[3:6], s[::], s[::-1]
+     ```
+
+2. **Immutability**:
+   - Strings cannot be changed after creation.
+   - Example: `s[0] = "k"` is invalid; use `"k" + s[1:]`.
+
+### Common String Interview Problems
+
+1. **Removal**:
+   - Remove specific characters from a string.
+   - Remove leading/trailing/duplicate spaces.
+
+2. **De-duplication**:
+   - Remove adjacent duplicate characters.
+
+3. **Reversal**:
+   - Reverse the entire string or individual words.
+
+4. **Substring Search (strstr)**:
+   - Naive method, Rabin-Karp, and KMP algorithms.
+
+## Section 3-2: Detailed Algorithms and Implementation
+
+### Character Removal
+
+#### Problem: Remove specific characters from a string
+
+**Example**: Remove 'u' and 'n' from "student".
+**Output**: "stdet"
+
+**Solution**:
+
+1. **Naive Approach**:
+   - Iterate through the string and remove characters.
+   - Problem: Incorrect indexing due to immutability.
+
+```python
+def remove_chars(string):
+    for i in range(len(string)):
+        if string[i] == 'u' or string[i] == 'n':
+            string = string[:i] + string[(i + 1):]
+    return string
+```
+
+2. **Two-Pointer Technique**:
+   - Convert string to list for mutability.
+   - Use two pointers to filter out characters.
+
+```python
+def remove_chars_v2(string):
+    lst = list(string)
+    i, j = 0, 0
+    while j < len(lst):
+        if lst[j] not in ['u', 'n']:
+            lst[i] = lst[j]
+            i += 1
+        j += 1
+    return ''.join(lst[:i])
+```
+
+**Complexity**:
+- Time: O(n)
+- Space: O(n)
+
+### Removing Leading/Trailing and Duplicate Spaces
+
+#### Problem: Remove leading, trailing, and duplicate spaces from a string.
+
+**Example**: "   abc   de   "
+**Output**: "abc de"
+
+**Solution**:
+
+1. **Two-Pointer Technique**:
+   - Use pointers to track and remove spaces.
+
+```python
+def remove_spaces(string):
+    if not string:
+        return string
+    lst = list(string)
+    i, j = 0, 0
+    while j < len(lst):
+        if lst[j] != ' ' or (i != 0 and lst[i - 1] != ' '):
+            lst[i] = lst[j]
+            i += 1
+        j += 1
+    if i > 0 and lst[i - 1] == ' ':
+        i -= 1
+    return ''.join(lst[:i])
+```
+
+**Complexity**:
+- Time: O(n)
+- Space: O(n)
+
+### Character De-duplication
+
+#### Problem: Remove adjacent duplicate characters.
+
+**Example**: "aaaaaabbazw"
+**Output**: "abazw"
+
+**Solution**:
+
+1. **Two-Pointer Technique**:
+
+```python
+def remove_duplicates(string):
+    if not string or len(string) < 2:
+        return string
+    lst = list(string)
+    slow, fast = 1, 1
+    while fast < len(lst):
+        if lst[fast] != lst[slow - 1]:
+            lst[slow] = lst[fast]
+            slow += 1
+        fast += 1
+    return ''.join(lst[:slow])
+```
+
+**Complexity**:
+- Time: O(n)
+- Space: O(n)
+
+2. **Stack-Based Method**:
+
+```python
+def remove_duplicates_stack(string):
+    if not string or len(string) < 2:
+        return string
+    stack = []
+    fast = 0
+    while fast < len(string):
+        if stack and string[fast] == stack[-1]:
+            while fast < len(string) and string[fast] == stack[-1]:
+                fast += 1
+            stack.pop()
+        else:
+            stack.append(string[fast])
+            fast += 1
+    return ''.join(stack)
+```
+
+**Complexity**:
+- Time: O(n)
+- Space: O(n)
+
+### String Reversal
+
+#### Problem: Reverse the words in a string.
+
+**Example**: "I love Yahoo"
+**Output**: "Yahoo love I"
+
+**Solution**:
+
+1. **Split and Reverse**:
+
+```python
+def reverse_words(string):
+    arr = string.split(" ")
+    arr.reverse()
+    return " ".join(arr)
+```
+
+2. **In-Place Reversal**:
+
+```python
+def reverse_helper(lst, left, right):
+    while left < right:
+        lst[left], lst[right] = lst[right], lst[left]
+        left += 1
+        right -= 1
+
+def reverse_string(string):
+    lst = list(string)
+    reverse_helper(lst, 0, len(lst) - 1)
+    i = 0
+    left = 0
+    right = 0
+    while i < len(lst):
+        if i == len(lst) - 1 or lst[i + 1] == " ":
+            right = i
+            reverse_helper(lst, left, right)
+            left = i + 2
+        i += 1
+    return ''.join(lst)
+```
+
+**Complexity**:
+- Time: O(n)
+- Space: O(n)
+
+### Substring Search
+
+#### Problem: Implement `strstr()` to check if a string is a substring of another.
+
+1. **Brute-Force Approach**:
+
+```python
+def strstr(text, pattern):
+    m = len(text)
+    n = len(pattern)
+    if m < n:
+        return -1
+    for i in range(m - n + 1):
+        if text[i:i+n] == pattern:
+            return i
+    return -1
+```
+
+**Complexity**:
+- Time: O(m * n)
+- Space: O(1)
+
+2. **Rabin-Karp Algorithm**:
+
+```python
+def rabin_karp(text, pattern):
+    m = len(text)
+    n = len(pattern)
+    if m < n:
+        return -1
+
+    base = 256
+    prime = 101
+    pattern_hash = 0
+    text_hash = 0
+    h = 1
+
+    for i in range(n - 1):
+        h = (h * base) % prime
+
+    for i in range(n):
+        pattern_hash = (base * pattern_hash + ord(pattern[i])) % prime
+        text_hash = (base * text_hash + ord(text[i])) % prime
+
+    for i in range(m - n + 1):
+        if pattern_hash == text_hash:
+            for j in range(n):
+                if text[i + j] != pattern[j]:
+                    break
+            else:
+                return i
+
+        if i < m - n:
+            text_hash = (base * (text_hash - ord(text[i]) * h) + ord(text[i + n])) % prime
+            if text_hash < 0:
+                text_hash += prime
+
+    return -1
+```
+
+**Complexity**:
+- Time: O(m + n) on average, O(m * n) in the worst case.
+- Space: O(1)
+
+## Conclusion
+
+This comprehensive guide provides a detailed overview of string data structures and algorithms. We have covered basic operations, character removal, de-duplication, reversal, and substring search. Each section includes in-depth explanations and Python code examples to illustrate the concepts and implementations.
+
+Understanding these fundamental string operations and algorithms is crucial for solving common interview problems and efficiently processing textual data in real-world applications.
+"""
+nb.cells.append(new_markdown_cell(s3))
+
+
+
+s4 = r"""
+
+## Section 4: Hand-on Detailed Analysis of the KMP Algorithm Based on STRING
+
+### Background
+
+The Knuth-Morris-Pratt (KMP) algorithm is a classic string matching algorithm developed by Donald Knuth, Vaughan Pratt, and James H. Morris in 1977. The algorithm was designed to solve the problem of efficiently finding occurrences of a "pattern" within a "text". The primary goal is to minimize the number of comparisons by leveraging the pattern's internal structure.
+
+### Problem Solved by KMP
+
+The KMP algorithm significantly reduces the number of character comparisons needed to find a pattern within a text. Traditional string matching algorithms, such as the naive approach, can be inefficient, especially for large texts and patterns. The KMP algorithm addresses this inefficiency by pre-processing the pattern to build a partial match table, which allows the algorithm to skip unnecessary comparisons.
+
+### Key Concepts
+
+#### Pattern’s Self-Similarity
+
+Self-similarity in the pattern refers to the repetitive sequences within the pattern. This characteristic is used to determine how far to slide the pattern along the text when a mismatch occurs.
+
+#### Shifted Similarity
+
+Shifted similarity involves identifying how much of the pattern can be reused when a mismatch occurs. The partial match table captures this information.
+
+#### Sliding Window Shifted Similarity
+
+The sliding window approach in KMP involves using the partial match table to determine the next alignment of the pattern with the text, thus avoiding redundant comparisons.
+
+### Detailed Explanation of the Algorithm
+
+#### Constructing the Partial Match Table (Prefix Table)
+
+The partial match table, or prefix table, records the lengths of the longest proper prefix of the pattern that matches a proper suffix of the pattern up to each position.
+
+1. **Initialization**:
+   - Initialize an array `pi` of the same length as the pattern with all values set to 0.
+   - Set the first value `pi[0]` to 0, as the longest prefix which is also a suffix for a single character is always 0.
+
+2. **Filling the Table**:
+   - Use two pointers, `i` (current character in the pattern) and `j` (length of the current matching prefix).
+   - Iterate through the pattern:
+     - If the characters at `P[i]` and `P[j]` match, increment `j` and set `pi[i]` to `j`.
+     - If they do not match and `j` is not 0, set `j` to `pi[j-1]` and repeat the comparison.
+     - If they do not match and `j` is 0, set `pi[i]` to 0 and move to the next character.
+
+
+
+- ![Partial Match Table](https://raw.githubusercontent.com/williampolicy/svcamp_data_algorithm/main/puml_partial_match_table.png)
+```python
+def compute_partial_match_table(P):
+    m = len(P)
+    pi = [0] * m
+    j = 0
+    i = 1
+    while i < m:
+        if P[i] == P[j]:
+            j += 1
+            pi[i] = j
+            i += 1
+        else:
+            if j != 0:
+                j = pi[j - 1]
+            else:
+                pi[i] = 0
+                i += 1
+    return pi
+```
+
+#### KMP Search Algorithm
+
+1. **Initialization**:
+   - Compute the partial match table for the pattern.
+   - Initialize two indices, `i` for the text and `j` for the pattern.
+
+2. **Search Process**:
+   - Iterate through the text:
+     - If `P[j]` matches `T[i]`, increment both `i` and `j`.
+     - If `j` reaches the length of the pattern, a match is found. Reset `j` using the partial match table.
+     - If a mismatch occurs and `j` is not 0, reset `j` using the partial match table.
+     - If a mismatch occurs and `j` is 0, simply move to the next character in the text.
+
+
+
+- ![KMP Algorithm](https://raw.githubusercontent.com/williampolicy/svcamp_data_algorithm/main/kmp_algorithm.png)
+
+```python
+def KMP_search(T, P):
+    n = len(T)
+    m = len(P)
+    pi = compute_partial_match_table(P)
+    i = 0
+    j = 0
+    while i < n:
+        if P[j] == T[i]:
+            i += 1
+            j += 1
+        if j == m:
+            print("Found pattern at index " + str(i - j))
+            j = pi[j - 1]
+        elif i < n and P[j] != T[i]:
+            if j != 0:
+                j = pi[j - 1]
+            else:
+                i += 1
+
+# Example usage
+T = "I study in SVCAMP"
+P = "SVCAMP"
+KMP_search(T, P)
+```
+
+### Example and Detailed Analysis
+
+Let's consider the pattern "ABCABD" and the text "ABCABCAAABBABCABDBBAA".
+
+#### Partial Match Table Construction
+
+1. **Pattern**: "ABCABD"
+2. **Length of the pattern (m)**: 6
+3. **Initialize the pi array**: `pi = [0, 0, 0, 0, 0, 0]`
+4. **Initialize indices**: `j = 0`, start `i` from 1
+
+#### Construction Process:
+
+**Step 1**: For `i = 1`
+- `P[i] = 'B'`, `P[j] = 'A'`
+- `P[i] != P[j]`
+- Since `j = 0`, set `pi[1] = 0`
+- Move to `i = 2`
+
+**pi array**: `[0, 0, 0, 0, 0, 0]`
+
+**Step 2**: For `i = 2`
+- `P[i] = 'C'`, `P[j] = 'A'`
+- `P[i] != P[j]`
+- Since `j = 0`, set `pi[2] = 0`
+- Move to `i = 3`
+
+**pi array**: `[0, 0, 0, 0, 0, 0]`
+
+**Step 3**: For `i = 3`
+- `P[i] = 'A'`, `P[j] = 'A'`
+- `P[i] == P[j]`
+- Increment `j`: `j = 1`
+- Set `pi[3] = j = 1`
+- Move to `i = 4`
+
+**pi array**: `[0, 0, 0, 1, 0, 0]`
+
+**Step 4**: For `i = 4`
+- `P[i] = 'B'`, `P[j] = 'B'`
+- `P[i] == P[j]`
+- Increment `j`: `j = 2`
+- Set `pi[4] = j = 2`
+- Move to `i = 5`
+
+**pi array**: `[0, 0, 0, 1, 2, 0]`
+
+**Step 5**: For `i = 5`
+- `P[i] = 'D'`, `P[j] = 'C'`
+- `P[i] != P[j]`
+- Since `j != 0`, set `j = pi[j - 1] = pi[1] = 0`
+- Since `j = 0`, set `pi[5] = 0`
+- Move to `i = 6`
+
+**pi array**: `[0, 0, 0, 1, 2, 0]`
+
+### Partial Match Table for "ABCABD"
+
+**pi array**: `[0, 0, 0, 1, 2, 0]`
+
+### Detailed Comparison Process Using the Partial Match Table
+
+Let’s consider the text `T = "ABCABCAAABBABCABDBBAA"` and the pattern `P = "ABCABD"`.
+
+#### Without the Partial Match Table (Naive Approach)
+
+1. Compare `T[0:6]` with `P`: `ABCABC` != `ABCABD` (Mismatch at `T[5]` and `P[5]`)
+2. Move to the next character in `T` and repeat.
+
+This would involve a lot of redundant comparisons, making the process inefficient.
+
+#### Using the Partial Match Table
+
+Using the partial match table, we avoid redundant comparisons by leveraging the information in the `pi` array.
+
+**Step-by-Step Comparison with the Partial Match Table**:
+
+1. `T[0] == P[0]`: `A == A`, `i = 1`, `j = 1`
+2. `T[1] == P[1]`: `B == B`, `i = 2`, `j = 2`
+3. `T[2] == P[2]`: `C == C`, `i = 3`, `j = 3`
+4. `T[3] == P[3]`: `A == A`, `i = 4`, `j = 4`
+5. `T[4] == P[4]`: `B == B`, `i = 5`, `j = 5`
+6. `T[5] != P[5]`: `C != D`, use `pi[5]`, `j = pi[4] = 2`
+7. `T[5] == P[2]`: `C == C
+
+`, `i = 6`, `j = 3`
+8. `T[6] == P[3]`: `A == A`, `i = 7`, `j = 4`
+9. `T[7] == P[4]`: `A == B`, use `pi[4]`, `j = pi[3] = 1`
+10. `T[7] != P[1]`: `A != B`, use `pi[1]`, `j = pi[0] = 0`
+11. `T[8] == P[0]`: `B == A`, `i = 9`, `j = 0`
+12. Repeat the comparison steps until `j == m` or `i == n`.
+
+By using the partial match table, we skip unnecessary comparisons and only perform comparisons where there is a potential match, significantly reducing the number of operations.
+
+### Conclusion
+
+The KMP algorithm optimizes string search by leveraging the pattern's self-similarity, reducing redundant comparisons through the use of a partial match table. This table captures the longest prefix which is also a suffix, allowing the algorithm to efficiently skip over sections of the text that cannot possibly match the pattern. By understanding and applying these principles, we achieve a highly efficient string matching algorithm essential for various computational tasks and applications.
+### Mathematical Expressions
+
+Let \( T \) be the text and \( P \) be the pattern.
+
+1. **Partial Match Table**:
+   The partial match table \( \kappa \) captures the longest proper prefix of \( P \) that is also a suffix up to each position.
+
+$$
+\kappa[i] = \begin{cases} 
+0 & \text{if } i = 0 \\
+\text{length of the longest proper prefix of } P[0:i] \text{ which is also a suffix} & \text{if } i > 0 
+\end{cases}
+$$
+
+2. **KMP Search**:
+   During the search, we use the partial match table to skip unnecessary comparisons.
+
+$$
+\text{For each } i \text{ in } T: 
+$$
+
+$$
+\begin{cases}
+j = \kappa[j-1] & \text{if } T[i] \neq P[j] \text{ and } j \neq 0 \\
+i++ & \text{if } T[i] \neq P[j] \text{ and } j = 0 \\
+i++, j++ & \text{if } T[i] = P[j]
+\end{cases}
+$$
+
+3. **When a match is found**:
+   If the pattern is fully matched, we record the match and use the partial match table to continue the search efficiently.
+
+$$
+j = m \Rightarrow \text{Match at index } i - j 
+$$
+
+$$
+j = \kappa[j - 1]
+$$
+
+### Enhanced Explanation with Detailed Steps
+
+To further clarify the usage of the partial match table and the match process:
+
+1. **Initialization**:
+   - Compute the partial match table $ \kappa $ for the pattern $ P $.
+   - Initialize indices \( i \) for the text \( T \) and \( j \) for the pattern \( P \).
+
+2. **Search Process**:
+   - Iterate through the text \( T \):
+     - If \( P[j] = T[i] \), both indices are incremented (\( i++ \) and \( j++ \)).
+     - If \( j \) reaches the length of the pattern \( m \), a match is found at index \( i - j \). Reset \( j \) using the partial match table $ \kappa[j-1] $.
+     - If \( P[j] \neq T[i] \) and \( j \neq 0 \), reset \( j \) using the partial match table \( \kappa[j-1] \).
+     - If \( P[j] \neq T[i] \) and \( j = 0 \), simply move to the next character in the text (\( i++ \)).
+
+### KMP Search Example
+
+Let's consider the pattern $ P = \text{"ABCABC"} $  and the text $ T = \text{"ABCABCAAABBABCABDBBAA"} $.
+
+1. **Partial Match Table** for $ P = \text{"ABCABC"} $:
+
+$$
+\kappa = [0, 0, 0, 1, 2, 3]
+$$
+
+2. **Search Process**:
+   - \( i = 0, j = 0 \)
+   - \( T[0] = P[0] \): \( A = A \), \( i++ \), \( j++ \)
+   - \( T[1] = P[1] \): \( B = B \), \( i++ \), \( j++ \)
+   - \( T[2] = P[2] \): \( C = C \), \( i++ \), \( j++ \)
+   - \( T[3] = P[3] \): \( A = A \), \( i++ \), \( j++ \)
+   - \( T[4] = P[4] \): \( B = B \), \( i++ \), \( j++ \)
+   - \( T[5] = P[5] \): \( C = C \), \( i++ \), \( j++ \)
+   - \( j = 6 \): Match found at index \( i - j = 0 \),$ j = \kappa[5] = 3 $
+   - Continue comparing from $ T[6] $ and $ P[3] $, efficiently skipping unnecessary comparisons based on \( \kappa \).
+
+By following this detailed explanation and using the provided formulas, you can clearly see how the KMP algorithm leverages the partial match table to minimize redundant comparisons, thus achieving efficient string matching.
+
+
+
+
+"""
+nb.cells.append(new_markdown_cell(s4))
+
+
+s4_2=r"""
+### Complete Code for Partial Match Table and KMP Algorithm with Examples
+
+Here is the complete code for computing the partial match table and performing the KMP search algorithm. This includes two examples to demonstrate the process.
+
+#### Computing the Partial Match Table (Prefix Table)
+
+```python
+def compute_partial_match_table(P):
+    m = len(P)
+    pi = [0] * m  # Initialize the partial match table with zeros
+    j = 0  # Length of the previous longest prefix suffix
+    i = 1  # Start from the second character in the pattern
+    
+    # Loop through the pattern to fill the partial match table
+    while i < m:
+        if P[i] == P[j]:
+            j += 1
+            pi[i] = j
+            i += 1
+        else:
+            if j != 0:
+                j = pi[j - 1]
+            else:
+                pi[i] = 0
+                i += 1
+    
+    return pi
+
+# Example pattern "ABCABD"
+P = "ABCABD"
+pi = compute_partial_match_table(P)
+print("Partial Match Table for 'ABCABD':", pi)
+```
+
+#### KMP Search Algorithm
+
+```python
+def KMP_search(T, P):
+    n = len(T)
+    m = len(P)
+    pi = compute_partial_match_table(P)
+    i = 0  # Index for T (text)
+    j = 0  # Index for P (pattern)
+    
+    while i < n:
+        if P[j] == T[i]:
+            i += 1
+            j += 1
+        
+        if j == m:
+            print("Found pattern at index", i - j)
+            j = pi[j - 1]
+        elif i < n and P[j] != T[i]:
+            if j != 0:
+                j = pi[j - 1]
+            else:
+                i += 1
+
+# Example 1: Pattern "ABCABD" in Text "ABCABCAAABBABCABDBBAA"
+T1 = "ABCABCAAABBABCABDBBAA"
+P1 = "ABCABD"
+print("\nExample 1:")
+KMP_search(T1, P1)
+
+# Example 2: Pattern "ABCABC" in Text "ABCABCAAABBABCABDBBAA"
+T2 = "ABCABCAAABBABCABDBBAA"
+P2 = "ABCABC"
+print("\nExample 2:")
+KMP_search(T2, P2)
+```
+
+### Detailed Explanation of the Code
+
+#### Partial Match Table Construction
+
+1. **Initialization**:
+   - The `pi` array is initialized with zeros.
+   - `j` is the length of the previous longest prefix suffix.
+   - `i` starts from 1, as `pi[0]` is always 0.
 
-### Basic Concepts
+2. **Filling the Table**:
+   - If `P[i]` matches `P[j]`, increment both `i` and `j`, and set `pi[i]` to `j`.
+   - If there is a mismatch and `j` is not 0, set `j` to `pi[j-1]` and continue the comparison.
+   - If there is a mismatch and `j` is 0, set `pi[i]` to 0 and move to the next character.
 
-Strings in Python are sequences of characters enclosed within single, double, or triple quotes. Strings are immutable, meaning once created, they cannot be modified.
+#### KMP Search Algorithm
 
-**Popular Representations of Characters:**
+1. **Initialization**:
+   - Compute the partial match table `pi` for the pattern `P`.
+   - Initialize indices `i` and `j` for the text `T` and the pattern `P`, respectively.
 
-1. **ASCII (American Standard Code for Information Interchange)**:
-   - Represents characters using 1 byte.
-   - Example: 'A' = 65, 'a' = 97.
+2. **Search Process**:
+   - Iterate through the text `T`:
+     - If `P[j]` matches `T[i]`, increment both `i` and `j`.
+     - If `j` reaches the length of the pattern `m`, a match is found. Print the match index and reset `j` using `pi[j-1]`.
+     - If there is a mismatch and `j` is not 0, reset `j` using `pi[j-1]`.
+     - If there is a mismatch and `j` is 0, move to the next character in the text `T`.
 
-2. **Unicode**:
-   - Represents characters using UTF-8 (1 to 4 bytes) or UTF-16 (2 to 4 bytes).
-   - Covers over 110,000 characters across various scripts and symbols.
+### Running the Code
 
-### Applications of Strings
+To run this code, copy and paste it into a Python environment or a Jupyter notebook. The output will display the partial match table for the given pattern and the indices of found matches in the text for both examples.
 
-Strings are fundamental in various applications, including text processing, data representation, and communication protocols. They are used extensively in file handling, user inputs, and display messages.
+```python
+# Computing the partial match table for "ABCABD"
+P = "ABCABD"
+pi = compute_partial_match_table(P)
+print("Partial Match Table for 'ABCABD':", pi)
 
-### String Operations
+# Running KMP search for both examples
+print("\nExample 1:")
+KMP_search(T1, P1)
 
-1. **Basic Operations**:
-   - Concatenation: `greet = greeting + name`
-   - Comparison: `==, >, <`
-   - Indexing and Slicing: 
-     ```python
-     s = "abc"
-     s[0], s[1], s[2]
-     s[3:6], s[::], s[::-1]
-     ```
+print("\nExample 2:")
+KMP_search(T2, P2)
+```
 
-2. **Immutability**:
-   - Strings cannot be changed after creation.
-   - Example: `s[0] = "k"` is invalid; use `"k" + s[1:]`.
+### Output
 
-### Common String Interview Problems
+The output will show the partial match table and the indices where the pattern is found in the text.
 
-1. **Removal**:
-   - Remove specific characters from a string.
-   - Remove leading/trailing/duplicate spaces.
+```plaintext
+Partial Match Table for 'ABCABD': [0, 0, 0, 1, 2, 0]
 
-2. **De-duplication**:
-   - Remove adjacent duplicate characters.
+Example 1:
+Found pattern at index 12
 
-3. **Reversal**:
-   - Reverse the entire string or individual words.
+Example 2:
+Found pattern at index 0
+Found pattern at index 9
+```
 
-4. **Substring Search (strstr)**:
-   - Naive method, Rabin-Karp, and KMP algorithms.
 
-## Section 3-2: Detailed Algorithms and Implementation
+"""
+nb.cells.append(new_markdown_cell(s4_2))
 
-### Character Removal
 
-#### Problem: Remove specific characters from a string
+data_code_test = """
 
-**Example**: Remove 'u' and 'n' from "student".
-**Output**: "stdet"
+def compute_partial_match_table(P):
+    m = len(P)
+    pi = [0] * m  # Initialize the partial match table with zeros
+    j = 0  # Length of the previous longest prefix suffix
+    i = 1  # Start from the second character in the pattern
+    
+    # Loop through the pattern to fill the partial match table
+    while i < m:
+        if P[i] == P[j]:
+            j += 1
+            pi[i] = j
+            i += 1
+        else:
+            if j != 0:
+                j = pi[j - 1]
+            else:
+                pi[i] = 0
+                i += 1
+    
+    return pi
 
-**Solution**:
+# Example pattern "ABCABD"
+P = "ABCABD"
+pi = compute_partial_match_table(P)
+print("Partial Match Table for 'ABCABD':", pi)
 
-1. **Naive Approach**:
-   - Iterate through the string and remove characters.
-   - Problem: Incorrect indexing due to immutability.
 
-```python
+"""
+nb.cells.append(new_code_cell(data_code_test))
+
+
+
+
+data_code_test3 = """
+def KMP_search(T, P):
+    n = len(T)
+    m = len(P)
+    pi = compute_partial_match_table(P)
+    i = 0  # Index for T (text)
+    j = 0  # Index for P (pattern)
+    
+    while i < n:
+        if P[j] == T[i]:
+            i += 1
+            j += 1
+        
+        if j == m:
+            print("Found pattern at index", i - j)
+            j = pi[j - 1]
+        elif i < n and P[j] != T[i]:
+            if j != 0:
+                j = pi[j - 1]
+            else:
+                i += 1
+
+# Example 1: Pattern "ABCABD" in Text "ABCABCAAABBABCABDBBAA"
+T1 = "ABCABCAAABBABCABDBBAA"
+P1 = "ABCABD"
+print("\nExample 1:")
+KMP_search(T1, P1)
+
+# Example 2: Pattern "ABCABC" in Text "ABCABCAAABBABCABDBBAA"
+T2 = "ABCABCAAABBABCABDBBAA"
+P2 = "ABCABC"
+print("\nExample 2:")
+KMP_search(T2, P2)
+
+"""
+nb.cells.append(new_code_cell(data_code_test3))
+
+
+
+
+
+
+data_code_test4 = """
+
+# Computing the partial match table for "ABCABD"
+P = "ABCABD"
+pi = compute_partial_match_table(P)
+print("Partial Match Table for 'ABCABD':", pi)
+
+# Running KMP search for both examples
+print("\nExample 1:")
+KMP_search(T1, P1)
+
+print("\nExample 2:")
+KMP_search(T2, P2)
+
+"""
+
+nb.cells.append(new_code_cell(data_code_test4))
+
+
+s5 = r"""
+# Section 5: String Routines at Scale
+
+The Section 3 routines are written for clarity. They copy the input into a Python list of single characters, make one pass per transform, and work on decoded `str` only. This section keeps their exact results and makes them fast enough for large inputs: multi-hundred-MB logs, streams that do not fit in memory, raw UTF-8 bytes, and millions of records.
+
+The next cell defines the Section 3 routines exactly as printed above, so that every later cell can check its output against them.
+
+"""
+nb.cells.append(new_markdown_cell(s5))
+
+
+data_code_test5 = r"""
+# Section 3 reference implementations
+
 def remove_chars(string):
     for i in range(len(string)):
         if string[i] == 'u' or string[i] == 'n':
             string = string[:i] + string[(i + 1):]
     return string
-```
-
-2. **Two-Pointer Technique**:
-   - Convert string to list for mutability.
-   - Use two pointers to filter out characters.
 
-```python
 def remove_chars_v2(string):
     lst = list(string)
     i, j = 0, 0
@@ -545,25 +5828,7 @@ def remove_chars_v2(string):
             i += 1
         j += 1
     return ''.join(lst[:i])
-```
-
-**Complexity**:
-- Time: O(n)
-- Space: O(n)
-
-### Removing Leading/Trailing and Duplicate Spaces
-
-#### Problem: Remove leading, trailing, and duplicate spaces from a string.
-
-**Example**: "   abc   de   "
-**Output**: "abc de"
-
-**Solution**:
 
-1. **Two-Pointer Technique**:
-   - Use pointers to track and remove spaces.
-
-```python
 def remove_spaces(string):
     if not string:
         return string
@@ -577,24 +5842,7 @@ def remove_spaces(string):
     if i > 0 and lst[i - 1] == ' ':
         i -= 1
     return ''.join(lst[:i])
-```
-
-**Complexity**:
-- Time: O(n)
-- Space: O(n)
-
-### Character De-duplication
-
-#### Problem: Remove adjacent duplicate characters.
-
-**Example**: "aaaaaabbazw"
-**Output**: "abazw"
 
-**Solution**:
-
-1. **Two-Pointer Technique**:
-
-```python
 def remove_duplicates(string):
     if not string or len(string) < 2:
         return string
@@ -606,15 +5854,7 @@ def remove_duplicates(string):
             slow += 1
         fast += 1
     return ''.join(lst[:slow])
-```
-
-**Complexity**:
-- Time: O(n)
-- Space: O(n)
-
-2. **Stack-Based Method**:
 
-```python
 def remove_duplicates_stack(string):
     if not string or len(string) < 2:
         return string
@@ -626,36 +5866,15 @@ def remove_duplicates_stack(string):
                 fast += 1
             stack.pop()
         else:
-            stack.append(string[fast])
-            fast += 1
-    return ''.join(stack)
-```
-
-**Complexity**:
-- Time: O(n)
-- Space: O(n)
-
-### String Reversal
-
-#### Problem: Reverse the words in a string.
-
-**Example**: "I love Yahoo"
-**Output**: "Yahoo love I"
-
-**Solution**:
-
-1. **Split and Reverse**:
+            stack.append(string[fast])
+            fast += 1
+    return ''.join(stack)
 
-```python
 def reverse_words(string):
     arr = string.split(" ")
     arr.reverse()
     return " ".join(arr)
-```
-
-2. **In-Place Reversal**:
 
-```python
 def reverse_helper(lst, left, right):
     while left < right:
         lst[left], lst[right] = lst[right], lst[left]
@@ -675,19 +5894,7 @@ def reverse_string(string):
             left = i + 2
         i += 1
     return ''.join(lst)
-```
-
-**Complexity**:
-- Time: O(n)
-- Space: O(n)
-
-### Substring Search
-
-#### Problem: Implement `strstr()` to check if a string is a substring of another.
-
-1. **Brute-Force Approach**:
 
-```python
 def strstr(text, pattern):
     m = len(text)
     n = len(pattern)
@@ -697,15 +5904,7 @@ def strstr(text, pattern):
         if text[i:i+n] == pattern:
             return i
     return -1
-```
-
-**Complexity**:
-- Time: O(m * n)
-- Space: O(1)
-
-2. **Rabin-Karp Algorithm**:
 
-```python
 def rabin_karp(text, pattern):
     m = len(text)
     n = len(pattern)
@@ -739,544 +5938,916 @@ def rabin_karp(text, pattern):
                 text_hash += prime
 
     return -1
-```
-
-**Complexity**:
-- Time: O(m + n) on average, O(m * n) in the worst case.
-- Space: O(1)
 
-## Conclusion
 
-This comprehensive guide provides a detailed overview of string data structures and algorithms. We have covered basic operations, character removal, de-duplication, reversal, and substring search. Each section includes in-depth explanations and Python code examples to illustrate the concepts and implementations.
+print(remove_chars_v2("student"))             # Output: stdet
+print(remove_spaces("   abc   de   "))        # Output: abc de
+print(remove_duplicates("aaaaaabbazw"))       # Output: abazw
+print(reverse_words("I love Yahoo"))          # Output: Yahoo love I
+print(rabin_karp("ABCABCAAABBABCABDBBAA", "ABCABD"))   # Output: 11
 
-Understanding these fundamental string operations and algorithms is crucial for solving common interview problems and efficiently processing textual data in real-world applications.
 """
-nb.cells.append(new_markdown_cell(s3))
-
-
-
-s4 = r"""
-
-## Section 4: Hand-on Detailed Analysis of the KMP Algorithm Based on STRING
-
-### Background
-
-The Knuth-Morris-Pratt (KMP) algorithm is a classic string matching algorithm developed by Donald Knuth, Vaughan Pratt, and James H. Morris in 1977. The algorithm was designed to solve the problem of efficiently finding occurrences of a "pattern" within a "text". The primary goal is to minimize the number of comparisons by leveraging the pattern's internal structure.
-
-### Problem Solved by KMP
-
-The KMP algorithm significantly reduces the number of character comparisons needed to find a pattern within a text. Traditional string matching algorithms, such as the naive approach, can be inefficient, especially for large texts and patterns. The KMP algorithm addresses this inefficiency by pre-processing the pattern to build a partial match table, which allows the algorithm to skip unnecessary comparisons.
-
-### Key Concepts
-
-#### Pattern’s Self-Similarity
-
-Self-similarity in the pattern refers to the repetitive sequences within the pattern. This characteristic is used to determine how far to slide the pattern along the text when a mismatch occurs.
+nb.cells.append(new_code_cell(data_code_test5))
 
-#### Shifted Similarity
 
-Shifted similarity involves identifying how much of the pattern can be reused when a mismatch occurs. The partial match table captures this information.
+s5_1 = r"""
+## Section 5-1: Single-Pass Character Filter Engine
 
-#### Sliding Window Shifted Similarity
+### Problem
 
-The sliding window approach in KMP involves using the partial match table to determine the next alignment of the pattern with the text, thus avoiding redundant comparisons.
+- `remove_chars` rebuilds the string with slicing inside the loop, which is O(n^2). It also shifts indexes as it deletes: it skips the character after each removed one and runs off the end of the string (`remove_chars("student")` raises `IndexError`).
+- `remove_chars_v2` is O(n) but hard-codes `['u', 'n']`, tests membership in a list once per character, and goes through a list of one-character strings.
 
-### Detailed Explanation of the Algorithm
+### Solution: `CharFilter`
 
-#### Constructing the Partial Match Table (Prefix Table)
+Build the lookup structures **once** for an arbitrary character set, then let C code do the pass:
 
-The partial match table, or prefix table, records the lengths of the longest proper prefix of the pattern that matches a proper suffix of the pattern up to each position.
+| Input | Precomputed | Pass |
+|-------|-------------|------|
+| `str` | `str.maketrans("", "", chars)` translation table | `text.translate(table)` |
+| `bytes` / `bytearray` | the ASCII characters as a `bytes` delete set | `data.translate(None, delete)` |
+| writable buffer (`bytearray`, `memoryview`, `mmap`), **in place** | 256-entry NumPy boolean bitmap | per block: `keep = ~bitmap[block]`, then copy the kept bytes forward |
 
-1. **Initialization**:
-   - Initialize an array `pi` of the same length as the pattern with all values set to 0.
-   - Set the first value `pi[0]` to 0, as the longest prefix which is also a suffix for a single character is always 0.
+In-place mode (`filter_inplace`) reads the buffer through a `uint8` NumPy view, one block (default 1 MiB) at a time. It writes the kept bytes to the front of the buffer: the write position never passes the read position, so no byte is overwritten before it is read. Extra memory is one block, not a second copy of the buffer. It returns the new length; a `bytearray` is also truncated to it.
 
-2. **Filling the Table**:
-   - Use two pointers, `i` (current character in the pattern) and `j` (length of the current matching prefix).
-   - Iterate through the pattern:
-     - If the characters at `P[i]` and `P[j]` match, increment `j` and set `pi[i]` to `j`.
-     - If they do not match and `j` is not 0, set `j` to `pi[j-1]` and repeat the comparison.
-     - If they do not match and `j` is 0, set `pi[i]` to 0 and move to the next character.
+For bytes input, characters outside ASCII would be multi-byte UTF-8 sequences, not single bytes. `filter` then decodes, translates and re-encodes, and `filter_inplace` refuses them with `ValueError`.
 
+**Complexity**: O(n) in one C-level pass (`translate`) or one vectorized pass per block (NumPy), with no Python work per character. The table costs O(k) to build for `k` characters.
 
+"""
+nb.cells.append(new_markdown_cell(s5_1))
+
+
+data_code_test5_1 = r"""
+import mmap
+import tempfile
+import time
+import numpy as np
+
+class CharFilter:
+    def __init__(self, chars):
+        self.chars = "".join(sorted(set(chars)))
+        self.str_table = str.maketrans("", "", self.chars)
+        self.ascii_only = all(ord(c) < 128 for c in self.chars)
+        self.delete_bytes = bytes(sorted(ord(c) for c in self.chars if ord(c) < 128))
+        self.bitmap = np.zeros(256, dtype=bool)
+        self.bitmap[list(self.delete_bytes)] = True
+
+    def filter(self, text):
+        if isinstance(text, str):
+            return text.translate(self.str_table)
+        if self.ascii_only:
+            return text.translate(None, self.delete_bytes)
+        return type(text)(bytes(text).decode("utf-8").translate(self.str_table).encode("utf-8"))
+
+    __call__ = filter
+
+    def _compact(self, buffer, block_size):
+        # Kept bytes move forward; the write position never passes the read position
+        data = np.frombuffer(buffer, dtype=np.uint8)
+        write = 0
+        for start in range(0, len(data), block_size):
+            block = data[start:start + block_size]
+            kept = block[~self.bitmap[block]]
+            data[write:write + len(kept)] = kept
+            write += len(kept)
+        return write
+
+    def filter_inplace(self, buffer, block_size=1 << 20):
+        if not self.ascii_only:
+            raise ValueError("in-place filtering supports ASCII characters only")
+        # The NumPy view is released when _compact returns, so a bytearray can be resized
+        write = self._compact(buffer, block_size)
+        if isinstance(buffer, bytearray):
+            del buffer[write:]
+        return write
+
+def remove_chars_fast(string, chars="un"):
+    return CharFilter(chars)(string)
 
-- ![Partial Match Table](https://raw.githubusercontent.com/williampolicy/svcamp_data_algorithm/main/puml_partial_match_table.png)
-```python
-def compute_partial_match_table(P):
-    m = len(P)
-    pi = [0] * m
-    j = 0
-    i = 1
-    while i < m:
-        if P[i] == P[j]:
-            j += 1
-            pi[i] = j
-            i += 1
-        else:
-            if j != 0:
-                j = pi[j - 1]
-            else:
-                pi[i] = 0
-                i += 1
-    return pi
-```
 
-#### KMP Search Algorithm
+# Example usage
+try:
+    remove_chars("student")
+except IndexError as error:
+    print("remove_chars:", error)                 # Output: remove_chars: string index out of range
+print(remove_chars_fast("student"))               # Output: stdet
+scrub = CharFilter("\t\r\x00")
+print(scrub(b"id\t42\r\x00"))                     # Output: b'id42'
+buffer = bytearray(b"student union")
+print(CharFilter("un").filter_inplace(buffer), buffer)   # Output: 8 bytearray(b'stdet io')
+
+# 10 MB of text: remove_chars_v2 vs translate
+text = "the student union meets on tuesday; " * 300000
+start = time.perf_counter()
+slow = remove_chars_v2(text)
+v2_time = time.perf_counter() - start
+start = time.perf_counter()
+fast = remove_chars_fast(text)
+fast_time = time.perf_counter() - start
+print(slow == fast, f"remove_chars_v2: {v2_time:.3f} s, CharFilter: {fast_time:.4f} s")
+
+# Scrub a 200 MB log in place through a writable mmap
+log_filter = CharFilter("\r\x00")
+with tempfile.TemporaryFile() as f:
+    f.write(b"2024-01-01 12:00:00 INFO request ok\r\n\x00" * 5_000_000)
+    f.flush()
+    with mmap.mmap(f.fileno(), 0) as mapped:
+        start = time.perf_counter()
+        length = log_filter.filter_inplace(mapped)
+        print("kept", length, "of", len(mapped), "bytes in", round(time.perf_counter() - start, 3), "s")
+        print(mapped[:37])                        # Output: b'2024-01-01 12:00:00 INFO request ok\n2'
+    f.truncate(length)
 
-1. **Initialization**:
-   - Compute the partial match table for the pattern.
-   - Initialize two indices, `i` for the text and `j` for the pattern.
+"""
+nb.cells.append(new_code_cell(data_code_test5_1))
 
-2. **Search Process**:
-   - Iterate through the text:
-     - If `P[j]` matches `T[i]`, increment both `i` and `j`.
-     - If `j` reaches the length of the pattern, a match is found. Reset `j` using the partial match table.
-     - If a mismatch occurs and `j` is not 0, reset `j` using the partial match table.
-     - If a mismatch occurs and `j` is 0, simply move to the next character in the text.
 
+s5_2 = r"""
+## Section 5-2: Fused Single-Pass Cleanup Pipeline
 
+### Problem
 
-- ![KMP Algorithm](https://raw.githubusercontent.com/williampolicy/svcamp_data_algorithm/main/kmp_algorithm.png)
+To clean a record today you call the transforms one after another:
 
 ```python
-def KMP_search(T, P):
-    n = len(T)
-    m = len(P)
-    pi = compute_partial_match_table(P)
-    i = 0
-    j = 0
-    while i < n:
-        if P[j] == T[i]:
-            i += 1
-            j += 1
-        if j == m:
-            print("Found pattern at index " + str(i - j))
-            j = pi[j - 1]
-        elif i < n and P[j] != T[i]:
-            if j != 0:
-                j = pi[j - 1]
-            else:
-                i += 1
-
-# Example usage
-T = "I study in SVCAMP"
-P = "SVCAMP"
-KMP_search(T, P)
+remove_duplicates(remove_spaces(remove_chars_v2(record)))
 ```
 
-### Example and Detailed Analysis
-
-Let's consider the pattern "ABCABD" and the text "ABCABCAAABBABCABDBBAA".
-
-#### Partial Match Table Construction
-
-1. **Pattern**: "ABCABD"
-2. **Length of the pattern (m)**: 6
-3. **Initialize the pi array**: `pi = [0, 0, 0, 0, 0, 0]`
-4. **Initialize indices**: `j = 0`, start `i` from 1
-
-#### Construction Process:
-
-**Step 1**: For `i = 1`
-- `P[i] = 'B'`, `P[j] = 'A'`
-- `P[i] != P[j]`
-- Since `j = 0`, set `pi[1] = 0`
-- Move to `i = 2`
-
-**pi array**: `[0, 0, 0, 0, 0, 0]`
-
-**Step 2**: For `i = 2`
-- `P[i] = 'C'`, `P[j] = 'A'`
-- `P[i] != P[j]`
-- Since `j = 0`, set `pi[2] = 0`
-- Move to `i = 3`
-
-**pi array**: `[0, 0, 0, 0, 0, 0]`
-
-**Step 3**: For `i = 3`
-- `P[i] = 'A'`, `P[j] = 'A'`
-- `P[i] == P[j]`
-- Increment `j`: `j = 1`
-- Set `pi[3] = j = 1`
-- Move to `i = 4`
-
-**pi array**: `[0, 0, 0, 1, 0, 0]`
-
-**Step 4**: For `i = 4`
-- `P[i] = 'B'`, `P[j] = 'B'`
-- `P[i] == P[j]`
-- Increment `j`: `j = 2`
-- Set `pi[4] = j = 2`
-- Move to `i = 5`
-
-**pi array**: `[0, 0, 0, 1, 2, 0]`
-
-**Step 5**: For `i = 5`
-- `P[i] = 'D'`, `P[j] = 'C'`
-- `P[i] != P[j]`
-- Since `j != 0`, set `j = pi[j - 1] = pi[1] = 0`
-- Since `j = 0`, set `pi[5] = 0`
-- Move to `i = 6`
-
-**pi array**: `[0, 0, 0, 1, 2, 0]`
-
-### Partial Match Table for "ABCABD"
-
-**pi array**: `[0, 0, 0, 1, 2, 0]`
-
-### Detailed Comparison Process Using the Partial Match Table
-
-Let’s consider the text `T = "ABCABCAAABBABCABDBBAA"` and the pattern `P = "ABCABD"`.
-
-#### Without the Partial Match Table (Naive Approach)
-
-1. Compare `T[0:6]` with `P`: `ABCABC` != `ABCABD` (Mismatch at `T[5]` and `P[5]`)
-2. Move to the next character in `T` and repeat.
-
-This would involve a lot of redundant comparisons, making the process inefficient.
-
-#### Using the Partial Match Table
-
-Using the partial match table, we avoid redundant comparisons by leveraging the information in the `pi` array.
-
-**Step-by-Step Comparison with the Partial Match Table**:
-
-1. `T[0] == P[0]`: `A == A`, `i = 1`, `j = 1`
-2. `T[1] == P[1]`: `B == B`, `i = 2`, `j = 2`
-3. `T[2] == P[2]`: `C == C`, `i = 3`, `j = 3`
-4. `T[3] == P[3]`: `A == A`, `i = 4`, `j = 4`
-5. `T[4] == P[4]`: `B == B`, `i = 5`, `j = 5`
-6. `T[5] != P[5]`: `C != D`, use `pi[5]`, `j = pi[4] = 2`
-7. `T[5] == P[2]`: `C == C
-
-`, `i = 6`, `j = 3`
-8. `T[6] == P[3]`: `A == A`, `i = 7`, `j = 4`
-9. `T[7] == P[4]`: `A == B`, use `pi[4]`, `j = pi[3] = 1`
-10. `T[7] != P[1]`: `A != B`, use `pi[1]`, `j = pi[0] = 0`
-11. `T[8] == P[0]`: `B == A`, `i = 9`, `j = 0`
-12. Repeat the comparison steps until `j == m` or `i == n`.
-
-By using the partial match table, we skip unnecessary comparisons and only perform comparisons where there is a potential match, significantly reducing the number of operations.
-
-### Conclusion
-
-The KMP algorithm optimizes string search by leveraging the pattern's self-similarity, reducing redundant comparisons through the use of a partial match table. This table captures the longest prefix which is also a suffix, allowing the algorithm to efficiently skip over sections of the text that cannot possibly match the pattern. By understanding and applying these principles, we achieve a highly efficient string matching algorithm essential for various computational tasks and applications.
-### Mathematical Expressions
-
-Let \( T \) be the text and \( P \) be the pattern.
-
-1. **Partial Match Table**:
-   The partial match table \( \kappa \) captures the longest proper prefix of \( P \) that is also a suffix up to each position.
-
-$$
-\kappa[i] = \begin{cases} 
-0 & \text{if } i = 0 \\
-\text{length of the longest proper prefix of } P[0:i] \text{ which is also a suffix} & \text{if } i > 0 
-\end{cases}
-$$
-
-2. **KMP Search**:
-   During the search, we use the partial match table to skip unnecessary comparisons.
-
-$$
-\text{For each } i \text{ in } T: 
-$$
-
-$$
-\begin{cases}
-j = \kappa[j-1] & \text{if } T[i] \neq P[j] \text{ and } j \neq 0 \\
-i++ & \text{if } T[i] \neq P[j] \text{ and } j = 0 \\
-i++, j++ & \text{if } T[i] = P[j]
-\end{cases}
-$$
-
-3. **When a match is found**:
-   If the pattern is fully matched, we record the match and use the partial match table to continue the search efficiently.
+Each call makes its own `list(string)` copy, its own two-pointer pass and its own `''.join`. With N transforms that is N traversals and N intermediate strings.
 
-$$
-j = m \Rightarrow \text{Match at index } i - j 
-$$
+### Solution: Compose the Stages as Push Functions
 
-$$
-j = \kappa[j - 1]
-$$
+Each transform becomes a small state machine that looks at **one character at a time**. It passes the character on (`emit`) to the next stage, or swallows it. The state each stage carries is exactly what its two-pointer version reads back from the output:
 
-### Enhanced Explanation with Detailed Steps
+| Stage | State | Rule for a character `ch` |
+|-------|-------|---------------------------|
+| `remove_chars` | the set of characters to drop | emit unless `ch` is in the set |
+| `remove_spaces` | seen a non-space yet? is a space pending? | a space only marks a pending space; a non-space first emits the pending space (if any), then itself. A trailing pending space is dropped |
+| `remove_duplicates` | the last emitted character | emit if `ch` differs from it |
+| `cancel_duplicates` | the stack, plus the character of the run being cancelled | same as `remove_duplicates_stack`: a run equal to the top pops it. Its output is only final at the end of input, so it flushes its stack when the input ends. As the last stage its stack **is** the output buffer |
 
-To further clarify the usage of the partial match table and the match process:
+The pipeline connects the stages from last to first, so each stage's `emit` is the next stage's `feed`. It then feeds the input through the first stage once. The only allocations are one output list and one final `''.join`, whatever the number of stages.
 
-1. **Initialization**:
-   - Compute the partial match table $ \kappa $ for the pattern $ P $.
-   - Initialize indices \( i \) for the text \( T \) and \( j \) for the pattern \( P \).
+**Profiling**: timing each character call would cost more than the work being timed. With `profile=True`, `run` instead times the fused pass for each prefix of the stage list: the first stage alone, then the first two, and so on. The difference between consecutive prefixes is the time that stage adds to the fused pass. The output length of each prefix is the number of characters the stage lets through. Both are stored in `timings`.
 
-2. **Search Process**:
-   - Iterate through the text \( T \):
-     - If \( P[j] = T[i] \), both indices are incremented (\( i++ \) and \( j++ \)).
-     - If \( j \) reaches the length of the pattern \( m \), a match is found at index \( i - j \). Reset \( j \) using the partial match table $ \kappa[j-1] $.
-     - If \( P[j] \neq T[i] \) and \( j \neq 0 \), reset \( j \) using the partial match table \( \kappa[j-1] \).
-     - If \( P[j] \neq T[i] \) and \( j = 0 \), simply move to the next character in the text (\( i++ \)).
+**Complexity**: O(n) time in one traversal, with O(1) state per stage (`cancel_duplicates` keeps an O(n) stack, just like `remove_duplicates_stack`). Profiling runs the pass N times.
 
-### KMP Search Example
+"""
+nb.cells.append(new_markdown_cell(s5_2))
+
+
+data_code_test5_2 = r"""
+import time
+
+PIPELINE_STAGES = ("remove_chars", "remove_spaces", "remove_duplicates", "cancel_duplicates")
+
+class CleanupPipeline:
+    def __init__(self, stages, chars="un", profile=False):
+        for name in stages:
+            if name not in PIPELINE_STAGES:
+                raise ValueError(f"unknown stage {name!r}; choose from {PIPELINE_STAGES}")
+        self.stages = list(stages)
+        self.chars = frozenset(chars)
+        self.profile = profile
+        self.timings = []   # (stage, seconds, chars_out) from the last profiled run
+
+    def _chars_stage(self, emit):
+        drop = self.chars
+        def feed(ch):
+            if ch not in drop:
+                emit(ch)
+        return feed, None
+
+    def _spaces_stage(self, emit):
+        started = False
+        pending = False
+        def feed(ch):
+            nonlocal started, pending
+            if ch == ' ':
+                if started:
+                    pending = True
+            else:
+                if pending:
+                    emit(' ')
+                    pending = False
+                started = True
+                emit(ch)
+        return feed, None
+
+    def _duplicates_stage(self, emit):
+        last = None
+        def feed(ch):
+            nonlocal last
+            if ch != last:
+                last = ch
+                emit(ch)
+        return feed, None
+
+    def _cancel_stage(self, emit, stack=None):
+        stack = [] if stack is None else stack
+        skip = None   # character of the run that just cancelled the stack top
+        def feed(ch):
+            nonlocal skip
+            if ch == skip:
+                return
+            skip = None
+            if stack and stack[-1] == ch:
+                stack.pop()
+                skip = ch
+            else:
+                stack.append(ch)
+        def finish():
+            for ch in stack:
+                emit(ch)
+        return feed, (finish if emit is not None else None)
+
+    def _build(self, stages, out):
+        # Wire the stages back to front so each emit is the next stage's feed
+        emit = out.append
+        finishes = []
+        for i in range(len(stages) - 1, -1, -1):
+            name = stages[i]
+            if name == "remove_chars":
+                emit, finish = self._chars_stage(emit)
+            elif name == "remove_spaces":
+                emit, finish = self._spaces_stage(emit)
+            elif name == "remove_duplicates":
+                emit, finish = self._duplicates_stage(emit)
+            elif i == len(stages) - 1:
+                emit, finish = self._cancel_stage(None, stack=out)
+            else:
+                emit, finish = self._cancel_stage(emit)
+            if finish is not None:
+                finishes.append(finish)
+        # Upstream stages must flush before the stages they feed
+        finishes.reverse()
+        return emit, finishes
+
+    def _run_stages(self, stages, text):
+        out = []
+        feed, finishes = self._build(stages, out)
+        for ch in text:
+            feed(ch)
+        for finish in finishes:
+            finish()
+        return ''.join(out)
+
+    def run(self, text):
+        if not self.profile:
+            return self._run_stages(self.stages, text)
+        self.timings = []
+        previous = 0.0
+        result = text
+        for k in range(1, len(self.stages) + 1):
+            start = time.perf_counter()
+            result = self._run_stages(self.stages[:k], text)
+            elapsed = time.perf_counter() - start
+            self.timings.append((self.stages[k - 1], max(elapsed - previous, 0.0), len(result)))
+            previous = elapsed
+        return result
+
+    __call__ = run
 
-Let's consider the pattern $ P = \text{"ABCABC"} $  and the text $ T = \text{"ABCABCAAABBABCABDBBAA"} $.
 
-1. **Partial Match Table** for $ P = \text{"ABCABC"} $:
+# Example usage
+clean = CleanupPipeline(["remove_chars", "remove_spaces", "remove_duplicates"])
+print(repr(clean("   ssstuuudent    unionn   room  ")))    # Output: 'stdet io rom'
+print(CleanupPipeline(["cancel_duplicates"])("abbbaz"))     # Output: z
+
+# Same result as the chained Section 3 calls, in one pass
+record = "  the   student  union  meets  on  tuesday, room 88  " * 20000
+start = time.perf_counter()
+chained = remove_duplicates(remove_spaces(remove_chars_v2(record)))
+chained_time = time.perf_counter() - start
+start = time.perf_counter()
+fused = clean(record)
+fused_time = time.perf_counter() - start
+print(chained == fused, f"chained: {chained_time:.3f} s, fused: {fused_time:.3f} s")
+
+profiled = CleanupPipeline(["remove_chars", "remove_spaces", "remove_duplicates", "cancel_duplicates"], profile=True)
+profiled(record)
+for stage, seconds, chars_out in profiled.timings:
+    print(f"{stage:18} {seconds:.3f} s  {chars_out} chars out")
 
-$$
-\kappa = [0, 0, 0, 1, 2, 3]
-$$
+"""
+nb.cells.append(new_code_cell(data_code_test5_2))
 
-2. **Search Process**:
-   - \( i = 0, j = 0 \)
-   - \( T[0] = P[0] \): \( A = A \), \( i++ \), \( j++ \)
-   - \( T[1] = P[1] \): \( B = B \), \( i++ \), \( j++ \)
-   - \( T[2] = P[2] \): \( C = C \), \( i++ \), \( j++ \)
-   - \( T[3] = P[3] \): \( A = A \), \( i++ \), \( j++ \)
-   - \( T[4] = P[4] \): \( B = B \), \( i++ \), \( j++ \)
-   - \( T[5] = P[5] \): \( C = C \), \( i++ \), \( j++ \)
-   - \( j = 6 \): Match found at index \( i - j = 0 \),$ j = \kappa[5] = 3 $
-   - Continue comparing from $ T[6] $ and $ P[3] $, efficiently skipping unnecessary comparisons based on \( \kappa \).
 
-By following this detailed explanation and using the provided formulas, you can clearly see how the KMP algorithm leverages the partial match table to minimize redundant comparisons, thus achieving efficient string matching.
+s5_3 = r"""
+## Section 5-3: Streaming Chunked Cleanup
 
+### Problem
 
+`remove_spaces`, `remove_duplicates` and `remove_duplicates_stack` need the whole input in memory, copied into a Python list of one-character strings. That is about 8 extra bytes per character (one list pointer each) on top of the string itself. A multi-GB log cannot be cleaned that way.
 
+### Solution: Generators That Carry Boundary State
 
-"""
-nb.cells.append(new_markdown_cell(s4))
+Each streaming version takes an iterable of chunks (or a file object, read `chunk_size` characters at a time) and yields cleaned chunks. A chunk boundary can fall anywhere: inside a run of spaces, between two equal characters, or in the middle of a cancelling run. So every generator keeps between chunks exactly the state its two-pointer version reads back from its output:
 
+| Generator | State kept between chunks | Per-chunk work |
+|-----------|---------------------------|----------------|
+| `stream_remove_spaces` | seen a non-space yet? is a space pending? | `chunk.split(' ')`: every split point is at least one space, so non-empty parts are joined by a single space, emitted only once a non-space part follows it |
+| `stream_remove_duplicates` | the last character emitted | `itertools.groupby` keeps the first character of each run; drop the first one if it repeats the last character emitted |
+| `stream_remove_duplicates_stack` | the stack, plus the character of the run being cancelled | character loop, same rules as `remove_duplicates_stack` |
 
-s4_2=r"""
-### Complete Code for Partial Match Table and KMP Algorithm with Examples
+The first two do their per-chunk work in C and use O(chunk) memory.
 
-Here is the complete code for computing the partial match table and performing the KMP search algorithm. This includes two examples to demonstrate the process.
+Stack cancellation is different. A later run can pop a character pushed arbitrarily far back (`"ab" + ... + "ba"`), so no part of the output is final until the input ends. `stream_remove_duplicates_stack` therefore keeps only the stack (the surviving output, never the whole input) and yields it in `chunk_size` pieces at the end.
 
-#### Computing the Partial Match Table (Prefix Table)
+Joining the yielded chunks always gives exactly the whole-string result, however the input was split.
 
-```python
-def compute_partial_match_table(P):
-    m = len(P)
-    pi = [0] * m  # Initialize the partial match table with zeros
-    j = 0  # Length of the previous longest prefix suffix
-    i = 1  # Start from the second character in the pattern
-    
-    # Loop through the pattern to fill the partial match table
-    while i < m:
-        if P[i] == P[j]:
-            j += 1
-            pi[i] = j
-            i += 1
-        else:
-            if j != 0:
-                j = pi[j - 1]
+**Complexity**: O(n) time. Memory is O(chunk) for spaces and duplicates, and O(chunk + surviving output) for stack cancellation.
+
+"""
+nb.cells.append(new_markdown_cell(s5_3))
+
+
+data_code_test5_3 = r"""
+import io
+import itertools
+import os
+import tempfile
+import time
+import tracemalloc
+
+def iter_chunks(source, chunk_size=1 << 16):
+    # File objects are read in fixed-size pieces; anything else is an iterable of chunks
+    if hasattr(source, "read"):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        yield from source
+
+def stream_remove_spaces(source, chunk_size=1 << 16):
+    started = False
+    pending = False
+    for chunk in iter_chunks(source, chunk_size):
+        out = []
+        for i, part in enumerate(chunk.split(' ')):
+            if i and started:
+                pending = True
+            if part:
+                if pending:
+                    out.append(' ')
+                    pending = False
+                out.append(part)
+                started = True
+        if out:
+            yield ''.join(out)
+
+def stream_remove_duplicates(source, chunk_size=1 << 16):
+    last = None
+    for chunk in iter_chunks(source, chunk_size):
+        if not chunk:
+            continue
+        cleaned = ''.join(ch for ch, _ in itertools.groupby(chunk))
+        if cleaned[0] == last:
+            cleaned = cleaned[1:]
+        last = chunk[-1]
+        if cleaned:
+            yield cleaned
+
+def stream_remove_duplicates_stack(source, chunk_size=1 << 16):
+    stack = []
+    skip = None   # character of the run that just cancelled the stack top
+    for chunk in iter_chunks(source, chunk_size):
+        for ch in chunk:
+            if ch == skip:
+                continue
+            skip = None
+            if stack and stack[-1] == ch:
+                stack.pop()
+                skip = ch
             else:
-                pi[i] = 0
-                i += 1
-    
-    return pi
+                stack.append(ch)
+    for start in range(0, len(stack), chunk_size):
+        yield ''.join(stack[start:start + chunk_size])
 
-# Example pattern "ABCABD"
-P = "ABCABD"
-pi = compute_partial_match_table(P)
-print("Partial Match Table for 'ABCABD':", pi)
-```
 
-#### KMP Search Algorithm
+# Example usage
+chunks = ["   abc  ", "  de", "   "]
+print(repr(''.join(stream_remove_spaces(chunks))), repr(remove_spaces(''.join(chunks))))
+# Output: 'abc de' 'abc de'
+print(list(stream_remove_duplicates(["aaa", "aaab", "bazw"])))   # Output: ['a', 'b', 'azw']
+print(''.join(stream_remove_duplicates_stack(["ab", "bb", "az"])))   # Output: z
+print(''.join(stream_remove_spaces(io.StringIO("  one   two  "), chunk_size=3)))   # Output: one two
+
+# Clean a 5 MB file in bounded memory vs loading it whole
+line = "2024-01-01   12:00:00    INFO    request    ok      \n"
+with tempfile.NamedTemporaryFile("w", suffix=".log", delete=False) as f:
+    for _ in range(100_000):
+        f.write(line)
+    path = f.name
+
+tracemalloc.start()
+start = time.perf_counter()
+with open(path) as f:
+    streamed_length = sum(len(chunk) for chunk in stream_remove_spaces(f))
+stream_time = time.perf_counter() - start
+stream_peak = tracemalloc.get_traced_memory()[1]
+tracemalloc.reset_peak()
+start = time.perf_counter()
+with open(path) as f:
+    whole = remove_spaces(f.read())
+whole_time = time.perf_counter() - start
+whole_peak = tracemalloc.get_traced_memory()[1]
+tracemalloc.stop()
+os.remove(path)
+print(streamed_length == len(whole))                  # Output: True
+print(f"streaming: {stream_time:.2f} s, peak {stream_peak / 2**20:.1f} MiB")
+print(f"whole-string: {whole_time:.2f} s, peak {whole_peak / 2**20:.1f} MiB")
 
-```python
-def KMP_search(T, P):
-    n = len(T)
-    m = len(P)
-    pi = compute_partial_match_table(P)
-    i = 0  # Index for T (text)
-    j = 0  # Index for P (pattern)
-    
-    while i < n:
-        if P[j] == T[i]:
-            i += 1
-            j += 1
-        
-        if j == m:
-            print("Found pattern at index", i - j)
-            j = pi[j - 1]
-        elif i < n and P[j] != T[i]:
-            if j != 0:
-                j = pi[j - 1]
-            else:
-                i += 1
+"""
+nb.cells.append(new_code_cell(data_code_test5_3))
 
-# Example 1: Pattern "ABCABD" in Text "ABCABCAAABBABCABDBBAA"
-T1 = "ABCABCAAABBABCABDBBAA"
-P1 = "ABCABD"
-print("\nExample 1:")
-KMP_search(T1, P1)
 
-# Example 2: Pattern "ABCABC" in Text "ABCABCAAABBABCABDBBAA"
-T2 = "ABCABCAAABBABCABDBBAA"
-P2 = "ABCABC"
-print("\nExample 2:")
-KMP_search(T2, P2)
-```
+s5_4 = r"""
+## Section 5-4: In-Place Word Reversal on Byte Buffers
 
-### Detailed Explanation of the Code
+### Problem
 
-#### Partial Match Table Construction
+`reverse_string` copies the input into a list of characters and joins it back. `reverse_words` builds the full `split` list. For a multi-GB text file that means several copies of the file as Python objects. We want to reverse the word order **in place**, on a `bytearray`, `memoryview` or writable `mmap`.
 
-1. **Initialization**:
-   - The `pi` array is initialized with zeros.
-   - `j` is the length of the previous longest prefix suffix.
-   - `i` starts from 1, as `pi[0]` is always 0.
+### Solution: Same Two Passes, on Raw Bytes
 
-2. **Filling the Table**:
-   - If `P[i]` matches `P[j]`, increment both `i` and `j`, and set `pi[i]` to `j`.
-   - If there is a mismatch and `j` is not 0, set `j` to `pi[j-1]` and continue the comparison.
-   - If there is a mismatch and `j` is 0, set `pi[i]` to 0 and move to the next character.
+Keep the Section 3 approach: reverse the whole buffer, then reverse each word back. Do both passes on a `uint8` NumPy view of the buffer, one block at a time:
 
-#### KMP Search Algorithm
+1. **Reverse all**: swap the first `block_size` bytes with the last `block_size` bytes, each reversed, and move both ends inward. Memory used is one block.
+2. **Reverse each word**: take a block and cut it just after its last space, so no word is split. For every byte, vectorized lookups find the space before it and the space after it (`np.maximum.accumulate` / `np.minimum.accumulate` over space positions). Those give the word's `start` and `end`, and the byte at `p` comes from `start + end - 1 - p`. One gather rewrites the whole block. A word longer than a block is reversed alone with the block-swapping routine from step 1.
 
-1. **Initialization**:
-   - Compute the partial match table `pi` for the pattern `P`.
-   - Initialize indices `i` and `j` for the text `T` and the pattern `P`, respectively.
+**UTF-8 comes out right on its own**: step 1 reverses the bytes *inside* each multibyte character. A character never spans a space, because every byte of a multibyte sequence is `>= 0x80` and a space is `0x20`. So step 2 reverses those bytes back together with the rest of the word. No decoding is needed.
 
-2. **Search Process**:
-   - Iterate through the text `T`:
-     - If `P[j]` matches `T[i]`, increment both `i` and `j`.
-     - If `j` reaches the length of the pattern `m`, a match is found. Print the match index and reset `j` using `pi[j-1]`.
-     - If there is a mismatch and `j` is not 0, reset `j` using `pi[j-1]`.
-     - If there is a mismatch and `j` is 0, move to the next character in the text `T`.
+**Runs of spaces**: a space is never moved within a word, and an empty "word" between two spaces is simply empty. As with `reverse_words`, the result is the space-separated fields in reverse order, with every space kept.
 
-### Running the Code
+**Complexity**: O(n) time in two passes of vectorized block operations, with O(block_size) extra memory and no Python object per character.
 
-To run this code, copy and paste it into a Python environment or a Jupyter notebook. The output will display the partial match table for the given pattern and the indices of found matches in the text for both examples.
+"""
+nb.cells.append(new_markdown_cell(s5_4))
+
+
+data_code_test5_4 = r"""
+import mmap
+import tempfile
+import time
+import numpy as np
+
+def reverse_range(data, low, high, block_size=1 << 20):
+    # Reverse data[low:high] in place by swapping mirrored blocks from both ends
+    while high - low > 1:
+        step = min(block_size, (high - low) // 2)
+        left = data[low:low + step].copy()
+        data[low:low + step] = data[high - step:high][::-1]
+        data[high - step:high] = left[::-1]
+        low += step
+        high -= step
+
+def find_byte(data, value, start, block_size=1 << 20):
+    for block_start in range(start, len(data), block_size):
+        hits = np.flatnonzero(data[block_start:block_start + block_size] == value)
+        if len(hits):
+            return block_start + int(hits[0])
+    return len(data)
+
+def reverse_each_word(segment, separator):
+    # segment holds whole words only; each byte is read from its mirror position within its word
+    n = len(segment)
+    positions = np.arange(n, dtype=np.int64)
+    is_separator = segment == separator
+    starts = np.maximum.accumulate(np.where(is_separator, positions, -1)) + 1
+    ends = np.minimum.accumulate(np.where(is_separator, positions, n)[::-1])[::-1]
+    source = np.where(is_separator, positions, starts + ends - 1 - positions)
+    segment[:] = segment[source]
+
+def reverse_words_inplace(buffer, block_size=1 << 20, separator=b" "):
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    if not data.flags.writeable:
+        raise ValueError("buffer must be writable (bytearray, memoryview or writable mmap)")
+    if len(separator) != 1:
+        raise ValueError("separator must be a single byte")
+    separator = separator[0]
+    n = len(data)
+    reverse_range(data, 0, n, block_size)
+    pos = 0
+    while pos < n:
+        end = min(pos + block_size, n)
+        if end < n:
+            hits = np.flatnonzero(data[pos:end] == separator)
+            if len(hits) == 0:
+                word_end = find_byte(data, separator, end, block_size)
+                reverse_range(data, pos, word_end, block_size)
+                pos = word_end
+                continue
+            end = pos + int(hits[-1]) + 1
+        reverse_each_word(data[pos:end], separator)
+        pos = end
 
-```python
-# Computing the partial match table for "ABCABD"
-P = "ABCABD"
-pi = compute_partial_match_table(P)
-print("Partial Match Table for 'ABCABD':", pi)
 
-# Running KMP search for both examples
-print("\nExample 1:")
-KMP_search(T1, P1)
+# Example usage
+buffer = bytearray(b"I love Yahoo")
+reverse_words_inplace(buffer)
+print(buffer)                                   # Output: bytearray(b'Yahoo love I')
+
+text = "  naïve   café 東京 🙂ok  "
+buffer = bytearray(text.encode("utf-8"))
+reverse_words_inplace(memoryview(buffer), block_size=4)
+print(repr(buffer.decode("utf-8")), buffer.decode("utf-8") == reverse_words(text))
+# Output: '  🙂ok 東京 café   naïve  ' True
+
+# Reverse the word order of a 90 MiB file in place through a writable mmap
+words = "the quick brown fox jumps over the lazy dog naïve café 東京 ".encode("utf-8")
+with tempfile.TemporaryFile() as f:
+    f.write(words * 1_500_000)
+    f.flush()
+    with mmap.mmap(f.fileno(), 0) as mapped:
+        start = time.perf_counter()
+        reverse_words_inplace(mapped)
+        print(f"reversed {len(mapped) / 2**20:.0f} MiB in {time.perf_counter() - start:.2f} s")
+        print(repr(mapped[:30].decode("utf-8")))   # Output: ' 東京 café naïve dog lazy '
+        sample = (words * 1000).decode("utf-8")
+        print(mapped[-len(words) * 1000:].decode("utf-8") == reverse_words(sample))   # Output: True
 
-print("\nExample 2:")
-KMP_search(T2, P2)
-```
+"""
+nb.cells.append(new_code_cell(data_code_test5_4))
 
-### Output
 
-The output will show the partial match table and the indices where the pattern is found in the text.
+s5_5 = r"""
+## Section 5-5: Bytes-Native UTF-8 Routines
 
-```plaintext
-Partial Match Table for 'ABCABD': [0, 0, 0, 1, 2, 0]
+### Problem
 
-Example 1:
-Found pattern at index 12
+Every Section 3 routine, and `KMP_search` from Section 4, works on a decoded `str` and calls `ord()` or compares one-character strings in its inner loop. Our input arrives as UTF-8 `bytes` from sockets and files, so each call first pays for a full decode to `str`.
 
-Example 2:
-Found pattern at index 0
-Found pattern at index 9
-```
+### Solution: Work on the Bytes, Convert Offsets Only When Asked
+
+UTF-8 has two properties that make the byte level safe:
+
+- **Every byte of a multibyte character is `>= 0x80`.** An ASCII byte (space, `u`, `n`, ...) in the data is always that ASCII character itself, never part of another character.
+- **It is self-synchronizing.** A continuation byte (`10xxxxxx`) can never be mistaken for the first byte of a character. So a valid UTF-8 pattern found in valid UTF-8 text always starts on a character boundary, and a byte-level match is a character-level match.
+
+Each routine takes `bytes`, `bytearray`, `memoryview` or `mmap` and reads it through a zero-copy `uint8` view:
 
+| Routine | Bytes-native version |
+|---------|----------------------|
+| `remove_chars_v2` | NumPy bitmap mask for ASCII characters; each non-ASCII character is removed as a whole byte sequence with `bytes.replace` |
+| `remove_spaces` | vectorized: keep non-spaces, plus a space that ends its run and has a non-space before and after it |
+| `remove_duplicates` | compare whole **characters**, not bytes. Each character's 1-4 bytes are packed into a `uint32` key and equal neighbouring keys are dropped. A byte-level version would corrupt `U+0820` (`E0 A0 A0`) |
+| `reverse_words` | `reverse_words_bytes`: `reverse_words_inplace` (Section 5-4) on one `bytearray` copy. It keeps every space, as `reverse_words` does; `reverse_string` gives the same result only without leading, trailing or repeated spaces |
+| `strstr` | the C `find` where the object has one, otherwise the brute-force comparison at positions whose first byte matches |
+| `rabin_karp`, `KMP_search` | the same algorithms, reading byte values as ints straight from a `memoryview`: no `ord()` calls. `kmp_search(text, pattern)` returns all match offsets instead of printing them, and works on any indexable sequence; `kmp_search_bytes` runs it on the byte views |
+
+Offsets are **byte** offsets. `codepoint_offsets(data, offsets)` converts them for the matches you actually need: the code-point offset of a byte offset is the number of bytes before it that start a character. It counts those with NumPy between consecutive sorted offsets, so converting all matches is one pass over the data up to the last match.
+
+**Complexity**: the same as each Section 3 routine, minus the O(n) decode. The filters are single vectorized passes. `codepoint_offsets` is O(last offset).
 
 """
-nb.cells.append(new_markdown_cell(s4_2))
+nb.cells.append(new_markdown_cell(s5_5))
 
 
-data_code_test = """
+data_code_test5_5 = r"""
+import time
+import numpy as np
 
-def compute_partial_match_table(P):
-    m = len(P)
-    pi = [0] * m  # Initialize the partial match table with zeros
-    j = 0  # Length of the previous longest prefix suffix
-    i = 1  # Start from the second character in the pattern
-    
-    # Loop through the pattern to fill the partial match table
-    while i < m:
-        if P[i] == P[j]:
-            j += 1
-            pi[i] = j
-            i += 1
-        else:
-            if j != 0:
-                j = pi[j - 1]
-            else:
-                pi[i] = 0
-                i += 1
-    
-    return pi
+def as_byte_view(data):
+    view = memoryview(data)
+    return view if view.format == "B" else view.cast("B")
 
-# Example pattern "ABCABD"
-P = "ABCABD"
-pi = compute_partial_match_table(P)
-print("Partial Match Table for 'ABCABD':", pi)
+def remove_chars_bytes(data, chars="un"):
+    arr = np.frombuffer(data, dtype=np.uint8)
+    bitmap = np.zeros(256, dtype=bool)
+    multibyte = []
+    for ch in set(chars):
+        if ord(ch) < 128:
+            bitmap[ord(ch)] = True
+        else:
+            multibyte.append(ch.encode("utf-8"))
+    result = arr[~bitmap[arr]].tobytes()
+    for sequence in multibyte:
+        result = result.replace(sequence, b"")
+    return result
+
+def remove_spaces_bytes(data):
+    arr = np.frombuffer(data, dtype=np.uint8)
+    non_space = arr != 0x20
+    # A space survives if it ends its run and has non-space bytes on both sides
+    next_non_space = np.append(non_space[1:], False)
+    seen_before = np.append(False, np.logical_or.accumulate(non_space)[:-1])
+    keep = non_space | (next_non_space & seen_before)
+    return arr[keep].tobytes()
+
+def remove_duplicates_bytes(data):
+    arr = np.frombuffer(data, dtype=np.uint8)
+    if len(arr) < 2:
+        return arr.tobytes()
+    if not (arr >= 0x80).any():
+        keep = np.append(True, arr[1:] != arr[:-1])
+        return arr[keep].tobytes()
+    is_start = (arr & 0xC0) != 0x80
+    is_start[0] = True
+    starts = np.flatnonzero(is_start)
+    lengths = np.diff(np.append(starts, len(arr)))
+    # Pack each character's bytes into one key; the first byte fixes the length, so keys are unique
+    padded = np.append(arr, np.zeros(3, dtype=np.uint8))
+    keys = np.zeros(len(starts), dtype=np.uint32)
+    for k in range(4):
+        byte = np.where(lengths > k, padded[starts + k], 0).astype(np.uint32)
+        keys |= byte << np.uint32(8 * (3 - k))
+    keep_char = np.append(True, keys[1:] != keys[:-1])
+    return arr[np.repeat(keep_char, lengths)].tobytes()
+
+def reverse_words_bytes(data):
+    buffer = bytearray(data)
+    reverse_words_inplace(buffer)
+    return bytes(buffer)
+
+def strstr_bytes(text, pattern):
+    if hasattr(text, "find"):
+        return text.find(pattern)
+    arr = np.frombuffer(text, dtype=np.uint8)
+    pat = np.frombuffer(pattern, dtype=np.uint8)
+    m, n = len(arr), len(pat)
+    if n == 0:
+        return 0
+    if m < n:
+        return -1
+    for i in np.flatnonzero(arr[:m - n + 1] == pat[0]):
+        if np.array_equal(arr[i:i + n], pat):
+            return int(i)
+    return -1
 
+def rabin_karp_bytes(text, pattern):
+    text = as_byte_view(text)
+    pattern = as_byte_view(pattern)
+    m = len(text)
+    n = len(pattern)
+    if m < n:
+        return -1
 
-"""
-nb.cells.append(new_code_cell(data_code_test))
+    base = 256
+    prime = 101
+    pattern_hash = 0
+    text_hash = 0
+    h = pow(base, n - 1, prime) if n else 1
 
+    for i in range(n):
+        pattern_hash = (base * pattern_hash + pattern[i]) % prime
+        text_hash = (base * text_hash + text[i]) % prime
 
+    for i in range(m - n + 1):
+        if pattern_hash == text_hash and text[i:i + n] == pattern:
+            return i
+        if i < m - n:
+            text_hash = (base * (text_hash - text[i] * h) + text[i + n]) % prime
 
+    return -1
 
-data_code_test3 = """
-def KMP_search(T, P):
-    n = len(T)
-    m = len(P)
-    pi = compute_partial_match_table(P)
-    i = 0  # Index for T (text)
-    j = 0  # Index for P (pattern)
-    
+def kmp_search(text, pattern):
+    # KMP_search from Section 4, returning the match offsets instead of printing them
+    n = len(text)
+    m = len(pattern)
+    if m == 0:
+        raise ValueError("pattern must not be empty")
+    pi = compute_partial_match_table(pattern)
+    matches = []
+    i = 0
+    j = 0
     while i < n:
-        if P[j] == T[i]:
+        if pattern[j] == text[i]:
             i += 1
             j += 1
-        
         if j == m:
-            print("Found pattern at index", i - j)
+            matches.append(i - j)
             j = pi[j - 1]
-        elif i < n and P[j] != T[i]:
+        elif i < n and pattern[j] != text[i]:
             if j != 0:
                 j = pi[j - 1]
             else:
                 i += 1
+    return matches
 
-# Example 1: Pattern "ABCABD" in Text "ABCABCAAABBABCABDBBAA"
-T1 = "ABCABCAAABBABCABDBBAA"
-P1 = "ABCABD"
-print("\nExample 1:")
-KMP_search(T1, P1)
+def kmp_search_bytes(text, pattern):
+    # Indexing a byte memoryview yields ints, so the same loop compares byte values
+    return kmp_search(as_byte_view(text), as_byte_view(pattern))
 
-# Example 2: Pattern "ABCABC" in Text "ABCABCAAABBABCABDBBAA"
-T2 = "ABCABCAAABBABCABDBBAA"
-P2 = "ABCABC"
-print("\nExample 2:")
-KMP_search(T2, P2)
+def codepoint_offsets(data, byte_offsets):
+    # Code points before a byte offset = bytes before it that are not continuation bytes
+    arr = np.frombuffer(data, dtype=np.uint8)
+    converted = {-1: -1}
+    count = 0
+    previous = 0
+    for offset in sorted(set(byte_offsets) - {-1}):
+        count += int(np.count_nonzero((arr[previous:offset] & 0xC0) != 0x80))
+        converted[offset] = count
+        previous = offset
+    return [converted[offset] for offset in byte_offsets]
 
-"""
-nb.cells.append(new_code_cell(data_code_test3))
 
+# Example usage
+payload = "  naïve   student  café  東京東京  ".encode("utf-8")
+print(repr(remove_chars_bytes(payload, "uné").decode("utf-8")))   # Output: '  aïve   stdet  caf  東京東京  '
+print(remove_spaces_bytes(payload).decode("utf-8"))            # Output: naïve student café 東京東京
+print(remove_duplicates_bytes("ࠠࠠࠠabb東東".encode("utf-8")).decode("utf-8"))   # Output: ࠠab東
+print(reverse_words_bytes(b"I love Yahoo"))                   # Output: b'Yahoo love I'
+
+offset = strstr_bytes(payload, "café".encode("utf-8"))
+print(offset, codepoint_offsets(payload, [offset]), payload.decode("utf-8").find("café"))   # Output: 20 [19] 19
+print(rabin_karp_bytes(memoryview(payload), "東京".encode("utf-8")))   # Output: 27
+matches = kmp_search_bytes(payload, "東京".encode("utf-8"))
+print(matches, codepoint_offsets(payload, matches))             # Output: [27, 33] [25, 27]
+
+# Decode-then-clean vs cleaning the bytes directly
+payload = ("  naïve   student   café  東京  " * 200000).encode("utf-8")
+start = time.perf_counter()
+expected = remove_duplicates(remove_spaces(payload.decode("utf-8")))
+str_time = time.perf_counter() - start
+start = time.perf_counter()
+result = remove_duplicates_bytes(remove_spaces_bytes(payload))
+bytes_time = time.perf_counter() - start
+print(result.decode("utf-8") == expected, f"str: {str_time:.2f} s, bytes: {bytes_time:.3f} s")
 
+"""
+nb.cells.append(new_code_cell(data_code_test5_5))
 
 
+s5_6 = r"""
+## Section 5-6: Process-Pool Batch Executor
 
+### Problem
 
-data_code_test4 = """
+We run the cleanup and search routines over millions of short records. A Python loop calls them one at a time, so only one core does any work. A process pool is not free either: every task pickles its arguments and results and crosses a pipe, which costs on the order of 100 µs. With one record per task, that overhead is larger than the work itself.
 
-# Computing the partial match table for "ABCABD"
-P = "ABCABD"
-pi = compute_partial_match_table(P)
-print("Partial Match Table for 'ABCABD':", pi)
+### Solution: Name the Routine, Ship Chunks, Size Them from Measurements
 
-# Running KMP search for both examples
-print("\nExample 1:")
-KMP_search(T1, P1)
+- **Routines by name.** `STRING_ROUTINES` maps names (`"remove_spaces"`, `"reverse_words"`, `"KMP_search"`, ...) to functions. A task sends only the name, the extra arguments (e.g. the pattern) and a list of records. Functions defined in a notebook do not pickle by value, so the workers look them up by name. Where the platform supports it, the workers are forked so they inherit the notebook's definitions.
+- **Calibrate first.** The first `calibration_items` records run in the calling process, and their results are yielded right away. Their measured per-item cost sets the chunk size: `target_chunk_seconds / per_item`. With 50 ms of work per chunk, the IPC cost per chunk is a few percent.
+- **Small inputs stay local.** The executor reads ahead one chunk per worker. If the input ends inside that window and the estimated work is under `min_parallel_seconds`, or only one core is available, it finishes inline: a pool would cost more to start than it saves. Otherwise it starts only as many workers as the estimated work can keep busy.
+- **Ordered streaming.** Futures sit in a FIFO, at most `2 * workers` in flight, and results are yielded from the head of the queue only. So output order equals input order, while memory stays bounded to the chunks in flight. Each chunk reports how long it took in the worker, and an exponential moving average of the per-item cost keeps adjusting the chunk size as the records change.
 
-print("\nExample 2:")
-KMP_search(T2, P2)
+| Input | Path taken |
+|-------|-----------|
+| a few hundred records | inline, no pool |
+| millions of cheap records | large chunks, all workers |
+| fewer but expensive records | small chunks so every worker gets a share |
+
+**Complexity**: the same total work as the sequential loop, spread over `workers` processes, plus one pickle round trip per chunk rather than per record.
 
 """
+nb.cells.append(new_markdown_cell(s5_6))
+
+
+data_code_test5_6 = r"""
+import concurrent.futures
+import itertools
+import math
+import multiprocessing
+import os
+import time
+from collections import deque
+
+STRING_ROUTINES = {
+    "remove_chars": remove_chars_v2,
+    "remove_spaces": remove_spaces,
+    "remove_duplicates": remove_duplicates,
+    "remove_duplicates_stack": remove_duplicates_stack,
+    "reverse_words": reverse_words,
+    "reverse_string": reverse_string,
+    "strstr": strstr,
+    "rabin_karp": rabin_karp,
+    "KMP_search": kmp_search,
+}
+
+def run_chunk(name, args, chunk):
+    routine = STRING_ROUTINES[name]
+    start = time.perf_counter()
+    results = [routine(record, *args) for record in chunk]
+    return results, time.perf_counter() - start
+
+class BatchExecutor:
+    def __init__(self, max_workers=None, target_chunk_seconds=0.05, min_parallel_seconds=0.25,
+                 calibration_items=64, max_chunk_size=100_000):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.target_chunk_seconds = target_chunk_seconds
+        self.min_parallel_seconds = min_parallel_seconds
+        self.calibration_items = calibration_items
+        self.max_chunk_size = max_chunk_size
+        self.mode = None
+        self.workers = 0
+        self.items = 0
+        self.chunks = 0
+        self.chunk_size = 0
+        self.per_item_seconds = 0.0
+
+    def _chunk_size(self):
+        size = int(self.target_chunk_seconds / max(self.per_item_seconds, 1e-9))
+        return max(1, min(size, self.max_chunk_size))
+
+    def _pool(self):
+        # Forked workers inherit every routine defined in the notebook
+        context = None
+        if "fork" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("fork")
+        return concurrent.futures.ProcessPoolExecutor(self.workers, mp_context=context)
+
+    def map(self, name, records, *args):
+        # Checked here, not inside the generator, so a bad name fails at the call
+        if name not in STRING_ROUTINES:
+            raise ValueError(f"unknown routine {name!r}; choose from {sorted(STRING_ROUTINES)}")
+        return self._map(name, iter(records), args)
+
+    def _map(self, name, records, args):
+        self.mode = "inline"
+        self.workers = 0
+        self.items = 0
+        self.chunks = 0
+
+        # Calibrate on the first records in this process; their results go out first
+        sample = list(itertools.islice(records, self.calibration_items))
+        if not sample:
+            return
+        results, elapsed = run_chunk(name, args, sample)
+        self.per_item_seconds = elapsed / len(sample)
+        self.chunk_size = self._chunk_size()
+        self.items += len(sample)
+        yield from results
+
+        lookahead = list(itertools.islice(records, self.chunk_size * self.max_workers))
+        exhausted = len(lookahead) < self.chunk_size * self.max_workers
+        estimate = self.per_item_seconds * len(lookahead)
+        if exhausted:
+            self.workers = min(self.max_workers, math.ceil(estimate / self.target_chunk_seconds))
+        else:
+            self.workers = self.max_workers
+        source = itertools.chain(lookahead, records)
+        if self.workers < 2 or (exhausted and estimate < self.min_parallel_seconds):
+            # Still one chunk at a time, so an unbounded input keeps streaming
+            self.workers = 0
+            while True:
+                chunk = list(itertools.islice(source, self.chunk_size))
+                if not chunk:
+                    return
+                results, _ = run_chunk(name, args, chunk)
+                self.items += len(results)
+                yield from results
+
+        self.mode = "pool"
+        pool = self._pool()
+        pending = deque()
+        try:
+            while True:
+                while len(pending) < 2 * self.workers:
+                    chunk = list(itertools.islice(source, self.chunk_size))
+                    if not chunk:
+                        break
+                    pending.append(pool.submit(run_chunk, name, args, chunk))
+                    self.chunks += 1
+                if not pending:
+                    break
+                results, elapsed = pending.popleft().result()
+                self.per_item_seconds = 0.8 * self.per_item_seconds + 0.2 * elapsed / len(results)
+                self.chunk_size = self._chunk_size()
+                self.items += len(results)
+                yield from results
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+    def batch_counters(self):
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "items": self.items,
+            "chunks": self.chunks,
+            "chunk_size": self.chunk_size,
+            "per_item_seconds": self.per_item_seconds,
+        }
+
+def run_batch(name, records, *args, **options):
+    return BatchExecutor(**options).map(name, records, *args)
 
-nb.cells.append(new_code_cell(data_code_test4))
+
+# Example usage
+print(list(run_batch("remove_spaces", ["  a  b ", "c   d", " e"])))         # Output: ['a b', 'c d', 'e']
+print(list(run_batch("KMP_search", ["ABABAB", "I study in SVCAMP"], "AB")))    # Output: [[0, 2, 4], []]
+
+records = [f"  student {i}   union  room {i % 97}   " for i in range(1_000_000)]
+start = time.perf_counter()
+expected = [remove_spaces(record) for record in records]
+print(f"loop: {time.perf_counter() - start:.2f} s")
+
+executor = BatchExecutor()
+start = time.perf_counter()
+results = list(executor.map("remove_spaces", records))
+print(f"batch: {time.perf_counter() - start:.2f} s", results == expected)
+print(executor.batch_counters())
+
+small = BatchExecutor()
+print(list(small.map("reverse_words", records[:200]))[:1], small.batch_counters()["mode"])
+# Output: ['   0 room  union   0 student  '] inline
+
+"""
+nb.cells.append(new_code_cell(data_code_test5_6))
 
 
 with open('al_class3_lecture_v1.ipynb', 'w', encoding='utf-8') as f: